@@ -4,12 +4,12 @@
 # purpose: Entry point
 # ---------------------------------------------------------------------------
 
+import time
 import argparse
 import logging
-from backend.config import load_config
-from .db.repository import repo
-from .model.archivist import archivist
+from pathlib import Path
 
+started = time.perf_counter()
 logger = logging.getLogger('model_archivist')
 logging.basicConfig(filename='model_archivist.log', level=logging.INFO)
 
@@ -18,15 +18,35 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--config', help='full path of config file', default=None)
     parser.add_argument('--user', help='user folder', default=None)
+    parser.add_argument('--refresh-paths', help='resolve the model folders again, ignoring the snapshot',
+                        action='store_true')
+    parser.add_argument('--export-catalog', help='write a catalog snapshot (JSON lines, .gz to compress) and exit',
+                        default=None)
+    parser.add_argument('--import-catalog', help='restore a catalog snapshot into an empty database before starting',
+                        default=None)
     args = parser.parse_args()
+    # the heavy imports (SQLModel, the scanner) wait until the arguments are known to be good
     try:
-        cfg = load_config(args.config, args.user)
+        from backend.config import load_config
+        cfg = load_config(args.config, args.user, use_snapshot=not args.refresh_paths)
+        configured = time.perf_counter()
+        from .db.repository import repo
+        from .model.archivist import archivist
         first_run = repo.attach(cfg.db_path)
         archivist.attach(cfg, repo)
+        if args.import_catalog:
+            from .model.catalog_snapshot import open_snapshot
+            with open_snapshot(Path(args.import_catalog), 'r') as f:
+                logger.info(f'startup: catalog imported, {archivist.import_catalog(f)}')
+        if args.export_catalog:
+            archivist.export_catalog(Path(args.export_catalog))
+            raise SystemExit(0)
 #        archivist.scan()
     except Exception as e:  # noqa
         logger.critical(f'Could not initialize the back end, aborting.')
         raise e
+    logger.info(f'startup: configuration {configured - started:.3f} s, '
+                f'back end {time.perf_counter() - configured:.3f} s')
 
     # late import because gui requires archivist to be fully initialized
 #    from .server.gui import start_server
@@ -5,11 +5,12 @@
 # ---------------------------------------------------------------------------
 
 from pathlib import Path
+import json
 import logging
-import yaml
 from fancy_dataclass import TOMLDataclass
 from dataclasses import dataclass, field
-from .model.object_types import ArchivistException, ArchivistError
+from .model.object_types import ArchivistException, ArchivistError, DEFAULT_INSTALLATION
+from .model.sidecars import write_json_atomic
 
 logger = logging.getLogger('model_archivist')
 
@@ -28,6 +29,14 @@ class WorkflowFolders(TOMLDataclass):
     active: str
     archive: str
 
+@dataclass
+class InstallationFolders(TOMLDataclass):
+    """
+    A further ComfyUI installation sharing the archive and the database with the one in folders.comfy.
+    """
+    name: str
+    comfy: str
+
 @dataclass
 class ConfigFolders(TOMLDataclass):
     comfy: str
@@ -36,6 +45,7 @@ class ConfigFolders(TOMLDataclass):
     extra_models: list[ExtraModels]
     workflows: list[WorkflowFolders]
     ignore: list[str] = field(default_factory=list)
+    installations: list[InstallationFolders] = field(default_factory=list)
 
 @dataclass
 class WebConfig(TOMLDataclass):
@@ -45,6 +55,41 @@ class WebConfig(TOMLDataclass):
 @dataclass
 class ConfigOptions(TOMLDataclass):
     update_json_metadata: bool = True
+    scan_workers: int = 4
+    scan_batch: int = 200
+    change_log_keep: int = 100000
+    # kept besides the SHA-256, all from the same read: autov2, blake2b, blake3 (with its package), crc32
+    digests: list[str] = field(default_factory=lambda: ['autov2'])
+
+@dataclass
+class ArchivePolicy(TOMLDataclass):
+    """
+    Limits on the space used by active models, in bytes; 0 means no limit. Type budgets are keyed by
+    model type folder, e.g. loras.
+    """
+    active_budget: int = 0
+    type_budgets: dict[str, int] = field(default_factory=dict)
+    auto_archive: bool = False
+
+@dataclass
+class IOOptions(TOMLDataclass):
+    """
+    I/O profiles (ssd, hdd or network) for folders whose device is not detected correctly, keyed by folder;
+    folders may use the {$comfy}-style placeholders. Without probe, undetected devices count as SSDs.
+    """
+    profiles: dict[str, str] = field(default_factory=dict)
+    probe: bool = True
+
+@dataclass
+class ThumbnailOptions(TOMLDataclass):
+    """
+    Where thumbnails of example images are cached, the sizes rendered (longer side, in pixels),
+    the most the cache may hold, in bytes, and the number of threads rendering them.
+    """
+    cache: str = '{$app}/thumbnails'
+    sizes: list[int] = field(default_factory=lambda: [128, 256, 512])
+    max_bytes: int = 256 << 20
+    workers: int = 2
 
 @dataclass
 class Configuration(TOMLDataclass, comment=
@@ -62,8 +107,14 @@ purpose: Application config
     models: ModelOptions
     web: WebConfig
     options: ConfigOptions
+    policy: ArchivePolicy = field(default_factory=ArchivePolicy)
+    io: IOOptions = field(default_factory=IOOptions)
+    thumbnails: ThumbnailOptions = field(default_factory=ThumbnailOptions)
     model_folders: dict[str, set[tuple[Path, Path]]] = field(default_factory=dict, metadata={'suppress': True})
     workflow_folders: set[tuple[Path, Path]] = field(default_factory=set, metadata={'suppress': True})
+    # model folders by installation; the default installation's are model_folders itself
+    installation_folders: dict[str, dict[str, set[tuple[Path, Path]]]] = field(default_factory=dict,
+                                                                                 metadata={'suppress': True})
 
     app_root: Path | None = field(default=None, metadata={'suppress': True})
     user_root: Path | None = field(default=None, metadata={'suppress': True})
@@ -75,53 +126,125 @@ purpose: Application config
         the_dict = self.to_toml_string()
         self.cfg_file.write_text(the_dict, encoding='utf-8')
 
-    def add_model_folders(self, model_type, model_dir, archive_dir):
+    def add_model_folders(self, model_type, model_dir, archive_dir, folders=None):
         if model_type in self.folders.ignore:
             return
+        if folders is None:
+            folders = self.model_folders
         model_dir.mkdir(exist_ok=True, parents=True)
         archive_dir.mkdir(exist_ok=True, parents=True)
-        if model_type not in self.model_folders:
-            self.model_folders[model_type] = {model_dir, archive_dir}
+        if model_type not in folders:
+            folders[model_type] = {(model_dir, archive_dir)}
         else:
-            self.model_folders[model_type].add((model_dir, archive_dir))
+            folders[model_type].add((model_dir, archive_dir))
 
     def path_from_string(self, path_str: str) -> Path:
         if '{$user}' in path_str:
-            return (self.user_root / path_str.replace('{$user}', '')).resolve()
+            return (self.user_root / path_str.replace('{$user}', '').lstrip('/\\')).resolve()
         elif '{$app}' in path_str:
-            return (self.app_root / path_str.replace('{$app}', '')).resolve()
+            return (self.app_root / path_str.replace('{$app}', '').lstrip('/\\')).resolve()
         elif '{$comfy}' in path_str:
-            return (self.comfy_root / path_str.replace('{$comfy}', '')).resolve()
+            return (self.comfy_root / path_str.replace('{$comfy}', '').lstrip('/\\')).resolve()
         elif '{$archive}' in path_str:
-            return (self.archive_root / path_str.replace('{$archive}', '')).resolve()
+            return (self.archive_root / path_str.replace('{$archive}', '').lstrip('/\\')).resolve()
         else:
             return Path(path_str).resolve()
 
-    def resolve_paths(self, app_root: Path, user_root: Path, cfg_file: Path) -> None:
-        self.app_root = app_root
-        self.user_root = user_root
-        self.cfg_file = cfg_file
+    def resolve_paths(self, app_root: Path, user_root: Path | None, cfg_file: Path,
+                      use_snapshot: bool = True) -> None:
+        self.app_root = Path(app_root)
+        # the command line hands the user folder over as a string
+        self.user_root = Path(user_root) if user_root is not None else None
+        self.cfg_file = Path(cfg_file)
         self.comfy_root = self.path_from_string(self.folders.comfy)
         self.archive_root = self.path_from_string(self.folders.archive)
 
+        if use_snapshot and self.load_snapshot(self.resolution_inputs()):
+            logger.info(f'Configuration.resolve_paths: using the resolved folders in {self.snapshot_file()}')
+            return
+        self.resolve_folders()
+        # taken after resolving, because creating the missing type folders changes the roots' mtimes
+        self.save_snapshot(self.resolution_inputs())
+
+    def resolve_folders(self) -> None:
         model_root = self.path_from_string('{$comfy}/models')
         archive_root = Path(self.folders.archive)
 
-        # Start from the active models folder and update the archive models
-        for model_type in (d.stem for d in model_root.iterdir() if d.is_dir()):
-            self.add_model_folders(model_type, model_root / model_type, archive_root / model_type)
-        # Now do the inverse
-        for model_type in (d.stem for d in archive_root.iterdir() if d.is_dir()):
-            self.add_model_folders(model_type, model_root / model_type, archive_root / model_type)
+        self.pair_type_folders(model_root, archive_root, self.model_folders)
+        self.installation_folders = {DEFAULT_INSTALLATION: self.model_folders}
+        for installation in self.folders.installations:
+            if installation.name in self.installation_folders:
+                raise ArchivistException(ArchivistError.DUPLICATE_INSTALLATION, installation.name)
+            self.installation_folders[installation.name] = {}
+            self.pair_type_folders(self.path_from_string(installation.comfy) / 'models', archive_root,
+                                   self.installation_folders[installation.name])
         archive_locations = {archive_root}
-        for yaml_file, extra_archive_root in self.folders.extra_models:
+        for extra in self.folders.extra_models:
+            extra_archive_root = self.path_from_string(extra.archive)
             if extra_archive_root in archive_locations:
                 raise ArchivistException(ArchivistError.DUPLICATE_ARCHIVE, extra_archive_root)
-            self.locate_extra_paths(yaml_file, extra_archive_root)
+            archive_locations.add(extra_archive_root)
+            self.locate_extra_paths(self.path_from_string(extra.yaml), extra_archive_root)
         for wf in self.folders.workflows:
             self.workflow_folders.add((self.path_from_string(wf.active), self.path_from_string(wf.archive)))
 
+    def pair_type_folders(self, model_root: Path, archive_root: Path, folders: dict) -> None:
+        # Start from the active models folder and update the archive models
+        for model_type in (d.stem for d in model_root.iterdir() if d.is_dir()):
+            self.add_model_folders(model_type, model_root / model_type, archive_root / model_type, folders)
+        # Now do the inverse
+        for model_type in (d.stem for d in archive_root.iterdir() if d.is_dir()):
+            self.add_model_folders(model_type, model_root / model_type, archive_root / model_type, folders)
+
+    def snapshot_file(self) -> Path:
+        # in the user folder if there is one, not next to the config, which may sit in the source tree
+        return (self.user_root or self.cfg_file.parent) / f'.{self.cfg_file.stem}.resolved.json'
+
+    def resolution_inputs(self) -> dict[str, int]:
+        """
+        The modification times of everything resolve_folders reads. Adding or removing a type folder changes
+        the mtime of its parent, so the two roots stand in for their listings.
+        """
+        paths = [self.cfg_file, self.path_from_string('{$comfy}/models'), Path(self.folders.archive)]
+        paths += [self.path_from_string(extra.yaml) for extra in self.folders.extra_models]
+        paths += [self.path_from_string(installation.comfy) / 'models' for installation in self.folders.installations]
+        inputs = {}
+        for path in paths:
+            try:
+                inputs[str(path)] = path.stat().st_mtime_ns
+            except OSError:
+                inputs[str(path)] = 0
+        return inputs
+
+    def load_snapshot(self, inputs: dict[str, int]) -> bool:
+        try:
+            snapshot = json.loads(self.snapshot_file().read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return False
+        if snapshot.get('inputs') != inputs:
+            return False
+        self.installation_folders = {name: {model_type: {(Path(active), Path(archive)) for active, archive in pairs}
+                                            for model_type, pairs in folders.items()}
+                                     for name, folders in snapshot['installation_folders'].items()}
+        self.model_folders = self.installation_folders[DEFAULT_INSTALLATION]
+        self.workflow_folders = {(Path(active), Path(archive)) for active, archive in snapshot['workflow_folders']}
+        return True
+
+    def save_snapshot(self, inputs: dict[str, int]) -> None:
+        snapshot = {'inputs': inputs,
+                    'installation_folders': {name: {model_type: sorted([str(active), str(archive)]
+                                                                       for active, archive in pairs)
+                                                    for model_type, pairs in folders.items()}
+                                             for name, folders in self.installation_folders.items()},
+                    'workflow_folders': sorted([str(active), str(archive)]
+                                               for active, archive in self.workflow_folders)}
+        try:
+            write_json_atomic(self.snapshot_file(), snapshot)
+        except OSError as e:
+            logger.warning(f'Configuration.save_snapshot: cannot write {self.snapshot_file()}: {e}')
+
     def locate_extra_paths(self, yaml_file: Path, archive_path: Path) -> None:
+        import yaml  # only needed when the folders are resolved afresh
         extra_config = yaml.safe_load(yaml_file.read_text(encoding='utf-8'))
         config_set = extra_config.get('comfyui', {})
 
@@ -145,17 +268,20 @@ purpose: Application config
 
 _config: Configuration | None = None
 
-def load_config(cfg_file: Path | None = None, user_root: Path | None = None) -> Configuration:
+def load_config(cfg_file: Path | None = None, user_root: Path | None = None,
+                use_snapshot: bool = True) -> Configuration:
     global _config
     app_root = Path(__file__).resolve().parent.parent.parent
     if cfg_file is None:
         cfg_file = app_root / 'config.toml'
     else:
         cfg_file = Path(cfg_file)
+    if user_root is not None:
+        user_root = Path(user_root)
 
     toml_string = cfg_file.read_text(encoding='utf-8')
     _config = Configuration.from_toml_string(toml_string)
-    _config.resolve_paths(app_root, user_root, cfg_file)
+    _config.resolve_paths(app_root, user_root, cfg_file, use_snapshot)
     return _config
 
 def get_config() -> Configuration | None:
@@ -0,0 +1,56 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: directories.py
+# purpose: Interned directory paths
+# ---------------------------------------------------------------------------
+
+import threading
+from sqlmodel import Session, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+class DirectoryCache:
+    """
+    Directory paths by id and ids by path, for the Directory table. Paths are interned on first use, in a
+    short transaction of their own, and then served from memory for the life of the process; a library has
+    a few thousand directories at most, so the cache is never trimmed.
+    """
+
+    def __init__(self) -> None:
+        self.engine = None
+        self.lock = threading.Lock()
+        self.ids: dict[str, int] = {}
+        self.paths: dict[int, str] = {}
+
+    def attach(self, engine) -> None:
+        with self.lock:
+            self.engine = engine
+            self.ids = {}
+            self.paths = {}
+
+    def intern(self, path: str) -> int:
+        dir_id = self.ids.get(path)
+        if dir_id is not None:
+            return dir_id
+        from .tables import Directory
+        with self.lock, Session(self.engine) as session:
+            session.execute(sqlite_insert(Directory).values(path=path).on_conflict_do_nothing())
+            session.commit()
+            dir_id = session.exec(select(Directory.id).where(Directory.path == path)).one()
+            self.ids[path] = dir_id
+            self.paths[dir_id] = path
+        return dir_id
+
+    def path(self, dir_id: int) -> str:
+        path = self.paths.get(dir_id)
+        if path is not None:
+            return path
+        from .tables import Directory
+        with self.lock, Session(self.engine) as session:
+            path = session.exec(select(Directory.path).where(Directory.id == dir_id)).one()
+            self.ids[path] = dir_id
+            self.paths[dir_id] = path
+        return path
+
+
+directories = DirectoryCache()
@@ -0,0 +1,199 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: generations.py
+# purpose: Catalog reads isolated from running scans
+# ---------------------------------------------------------------------------
+
+import logging
+import threading
+from functools import wraps
+from pathlib import Path
+from contextlib import contextmanager
+from sqlmodel import Session
+
+logger = logging.getLogger('model_archivist')
+
+
+class Snapshot:
+    """
+    A few connections, each in a read transaction opened on the same state of the database; in WAL mode,
+    SQLite lets them go on seeing that state without blocking writers or waiting for them. Each reader takes
+    a connection of its own for the length of its session, so readers only wait for each other when there
+    are more of them than connections.
+    """
+
+    def __init__(self, engine, size: int) -> None:
+        self.available = threading.Condition()
+        self.idle = []
+        self.busy = 0
+        self.retired = False
+        # while the write lock is held no commit can slip in between the connections' first reads
+        with engine.connect() as writer:
+            writer.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                for _ in range(size):
+                    connection = engine.connect()
+                    connection.exec_driver_sql('BEGIN')
+                    # a deferred transaction takes its snapshot at the first read
+                    connection.exec_driver_sql('SELECT count(*) FROM model').all()
+                    self.idle.append(connection)
+            finally:
+                writer.exec_driver_sql('ROLLBACK')
+
+    def take(self):
+        """
+        A connection for one reader, None if the snapshot has been retired meanwhile.
+        """
+        with self.available:
+            while not self.idle and not self.retired:
+                self.available.wait()
+            if self.retired:
+                return None
+            self.busy += 1
+            return self.idle.pop()
+
+    def give_back(self, connection) -> None:
+        with self.available:
+            self.busy -= 1
+            if self.retired:
+                close(connection)
+            else:
+                self.idle.append(connection)
+                self.available.notify()
+
+    def retire(self) -> None:
+        """
+        Close the connections, those in use once they are given back; the snapshot's WAL frames can then
+        be checkpointed.
+        """
+        with self.available:
+            self.retired = True
+            for connection in self.idle:
+                close(connection)
+            self.idle = []
+            self.available.notify_all()
+
+
+def close(connection) -> None:
+    connection.rollback()
+    connection.close()
+
+
+class Generations:
+    """
+    Reads that see the catalog as of the last complete scan. When a scan starts, a Snapshot of the catalog
+    is published, and readers use it until the last running scan ends; they then move on to the database
+    itself, with the scan's additions and its cleanup. A new snapshot is published before that in two cases,
+    and then shows what the scans have saved so far, updated models and all, though not their cleanup:
+    - after a user's own change (a retag, a move), which would otherwise not be seen until the scans end;
+    - when the write-ahead log, which cannot be checkpointed past the oldest open snapshot, has grown
+      beyond wal_limit bytes.
+    """
+
+    def __init__(self, readers: int = 4, wal_limit: int = 256 << 20) -> None:
+        self.engine = None
+        self.wal_file: Path | None = None
+        self.readers = readers
+        self.wal_limit = wal_limit
+        # guards the fields below; never held while reading
+        self.lock = threading.Lock()
+        self.snapshot: Snapshot | None = None
+        self.holders = 0
+
+    def attach(self, engine) -> None:
+        with self.lock:
+            self.drop()
+            self.engine = engine
+            database = engine.url.database
+            self.wal_file = Path(f'{database}-wal') if database else None
+            self.holders = 0
+
+    def hold(self) -> None:
+        """
+        Keep readers on the current generation until release() has been called as often as hold().
+        """
+        with self.lock:
+            self.holders += 1
+            if self.snapshot is None:
+                self.snapshot = Snapshot(self.engine, self.readers)
+                logger.info('Generations.hold: readers kept on the current generation')
+
+    def release(self) -> None:
+        with self.lock:
+            self.holders = max(0, self.holders - 1)
+            if self.holders == 0 and self.snapshot is not None:
+                self.drop()
+                logger.info('Generations.release: new generation published')
+
+    def advance(self, reason: str, checkpoint: bool = False) -> None:
+        """
+        Publish the database as it is now to readers while scans go on. With checkpoint, the WAL is copied
+        into the database and truncated in between, while no snapshot holds on to it; readers meanwhile go to
+        the database itself, which already shows what the new snapshot will.
+        """
+        with self.lock:
+            old, self.snapshot = self.snapshot, None
+        if old is None:
+            return
+        old.retire()
+        if checkpoint:
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').all()
+        fresh = Snapshot(self.engine, self.readers)
+        with self.lock:
+            # the scans may have ended, or a new one have published a snapshot, in the meantime
+            if self.holders == 0 or self.snapshot is not None:
+                fresh.retire()
+                return
+            self.snapshot = fresh
+        logger.info(f'Generations.advance: new generation published, {reason}')
+
+    def bound_wal(self) -> None:
+        """
+        Called by scans as they write: publish a new generation once the WAL is over its limit.
+        """
+        if self.snapshot is None or self.wal_file is None:
+            return
+        try:
+            size = self.wal_file.stat().st_size
+        except OSError:
+            return
+        if size > self.wal_limit:
+            self.advance(f'the WAL had grown to {size} bytes', checkpoint=True)
+
+    def publishes(self, write):
+        """
+        Decorate a repository method that makes a user's change, so that readers see it even while scans run.
+        """
+        @wraps(write)
+        def wrapper(*args, **kwargs):
+            result = write(*args, **kwargs)
+            self.advance(f'after {write.__name__}')
+            return result
+        return wrapper
+
+    def drop(self) -> None:
+        if self.snapshot is not None:
+            self.snapshot.retire()
+            self.snapshot = None
+
+    @contextmanager
+    def session(self):
+        """
+        A session on the published generation: a snapshot connection while scans run, the database otherwise.
+        """
+        with self.lock:
+            snapshot = self.snapshot
+        connection = snapshot.take() if snapshot is not None else None
+        if connection is None:
+            with Session(self.engine) as session:
+                yield session
+            return
+        try:
+            with Session(bind=connection) as session:
+                yield session
+        finally:
+            snapshot.give_back(connection)
+
+
+generations = Generations()
@@ -4,17 +4,37 @@
 # purpose: Database operations
 # ---------------------------------------------------------------------------
 
-from sqlmodel import SQLModel, Session, create_engine, select, or_
-from pathlib import Path
+from sqlmodel import SQLModel, Session, create_engine, select, or_, and_, func
+from sqlalchemy import literal, update, insert, delete, case, true, false, event
+from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from pathlib import Path, PurePosixPath
 from typing import Iterable, Set
-from .tables import Model, Component, Tag
-from ..model.object_types import ArchivistError, ArchivistException, Taggable
+from .tables import Model, Component, Tag, Collection, CollectionCollectionLink, ModelCollectionLink, \
+    Workflow, WorkflowModelReference, SidecarCache, ScanRun, ScanCheckpoint, ModelInstallation, ModelDigest, \
+    TagModelLink, TagWorkflowLink, TagCollectionLink, WorkflowCollectionLink, Directory, ModelChange
+from .directories import directories
+from .generations import generations
+from ..model.metrics import metrics
+from ..model.file_handler import TYPE_ALIASES
+from ..model.object_types import ArchivistError, ArchivistException, Taggable, ComponentFileType, SizeGroup, \
+    ChangeKind, DEFAULT_INSTALLATION
 
+import json
 import logging
+import time
 
 logger = logging.getLogger('model_archivist')
 
 
+def set_sqlite_pragmas(dbapi_connection, _) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
 class Repository:
     def __init__(self) -> None:
         self.db_path = None
@@ -24,71 +44,469 @@ class Repository:
     def attach(self, db_path: Path, verbose: bool = False) -> None:
         self.db_path = db_path
         self.is_first_run = not db_path.is_file()
-        self.engine = create_engine(f'sqlite:///{db_path}', echo=verbose)
+        # the engine is shared by the scan threads and the API executor; WAL lets readers go on while a scan writes
+        self.engine = create_engine(f'sqlite:///{db_path}', echo=verbose,
+                                    connect_args={'check_same_thread': False, 'timeout': 30})
+        event.listen(self.engine, 'connect', set_sqlite_pragmas)
         SQLModel.metadata.create_all(self.engine)
+        directories.attach(self.engine)
+        generations.attach(self.engine)
 
-    def save_model(self, model: Model, tag_names: list[str]) -> None:
+    @metrics.timed('archivist_save_model_seconds', 'Time to save one scanned model')
+    def save_model(self, model: Model, tag_names: list[str], resumed: bool = False,
+                   installation: str = DEFAULT_INSTALLATION, digests: dict[str, str] | None = None,
+                   sidecar_tags: bool = True) -> None:
         """
-        Save a full model record. We have the following possibilities:
-        - the model is not known: add the model,
-        - the model is known, but has not been seen in this scan: update it,
-        - the model is known and has already been seen in this scan: raise an exception.
+        Save a full model record, as scanned in one installation, with the digests it is known by. See
+        merge_model for how it is combined with what is known already.
         """
         with Session(self.engine) as session:
-            known_models = session.exec(select(Model).where(Model.hash == model.hash)).all()
-            if len(known_models) == 0:
-                logger.info(f'Repository.save_model:adding model {model.name}')
-                model.tags = resolve_tags(session, tag_names)
-                session.add(model)
-                session.commit()
+            try:
+                merge_model(session, model, tag_names, resumed, installation, digests, sidecar_tags)
+            except IntegrityError:
+                # a scan of another installation has just added the same model
+                session.rollback()
+                merge_model(session, model, tag_names, resumed, installation, digests, sidecar_tags)
+            session.commit()
+
+    @metrics.timed('archivist_save_batch_seconds', 'Time to save one batch of scanned models')
+    def save_models(self, batch: list[tuple[Model, list[str], dict[str, str] | None]], resumed: bool = False,
+                    installation: str = DEFAULT_INSTALLATION, sidecar_tags: bool = True) -> list[str]:
+        """
+        Save a batch of scanned models, given as (model, tag names, digests), in one transaction. Models that
+        cannot be saved (see merge_model) are left out; returns their errors. Raises IntegrityError, with
+        nothing saved, if another session has added one of the models meanwhile.
+        """
+        errors = []
+        with Session(self.engine) as session:
+            for model, tag_names, digests in batch:
+                try:
+                    merge_model(session, model, tag_names, resumed, installation, digests, sidecar_tags)
+                except ArchivistException as e:
+                    logger.warning(f'Repository.save_models: {e}')
+                    errors.append(str(e))
+            session.commit()
+        return errors
+
+    def save_workflow(self, workflow: Workflow, tag_names: list[str], references: dict[str, str | None],
+                      resumed: bool = False) -> None:
+        """
+        Save a full workflow record, replacing its components and model references, given with their type
+        folders.
+        """
+        with Session(self.engine) as session:
+            old_workflow = session.get(Workflow, workflow.id)
+            if old_workflow is None:
+                logger.info(f'Repository.save_workflow:adding workflow {workflow.name}')
+                session.add(workflow)
             else:
-                logger.info(f'Repository.save_model:updating model {model.name}')
-                if len(known_models) > 1:
-                    all_names = ', '.join(m.name for m in known_models)
-                    raise ArchivistException(ArchivistError.DUPLICATE_MODEL,
-                                             f'{model.hash}, {all_names}')
-                old_model = known_models[0]
-                if old_model.last_scan_id == model.last_scan_id:
-                    raise ArchivistException(ArchivistError.DUPLICATE_MODEL,
-                                             f'{model.name} {model.hash}, {old_model.last_scan_id}')
-                # see which components no longer exist and remove them
-                known_components = {(c.file_name, c.component_type, c.is_archive): c.id for c in old_model.components}
-                # update the old model
-                old_model.update_from(model)
-                old_model.tags = resolve_tags(session, tag_names)
-                session.add(old_model)
-                session.commit()
-                # add new components
-                for c in model.components:
-                    if (c.file_name, c.component_type, c.is_archive) in known_components:
-                        del known_components[(c.file_name, c.component_type, c.is_archive)]
-                    else:
-                        c.model = old_model
-                        session.add(c)
-                # remove components that no longer exist
-                for c_id in known_components.values():
-                    c = session.exec(select(Component).where(Component.id == c_id)).one()
-                    session.delete(c)
-                session.commit()
-
-    def clean_repository(self, scan_id: str):
-        with Session(self.engine) as session:
-            models = session.exec(select(Model).where(Model.last_scan_id != scan_id))
-            for model in models:
-                session.delete(model)
+                logger.info(f'Repository.save_workflow:updating workflow {workflow.name}')
+                if old_workflow.last_scan_id == workflow.last_scan_id and not resumed:
+                    raise ArchivistException(ArchivistError.DUPLICATE_WORKFLOW,
+                                             f'{workflow.name} {workflow.id}, {old_workflow.last_scan_id}')
+                # updated in place, as replacing the row would take the workflow out of its collections
+                session.execute(delete(Component).where(Component.workflow_id == workflow.id))
+                session.execute(delete(WorkflowModelReference).where(WorkflowModelReference.workflow_id == workflow.id))
+                session.expire(old_workflow, ['components', 'references'])
+                components = list(workflow.components)
+                # detached first, or the components would bring the new row into the session with them
+                workflow.components = []
+                old_workflow.update_from(workflow)
+                old_workflow.components = components
+                workflow = old_workflow
+            workflow.tags = resolve_tags(session, tag_names)
+            workflow.references = [WorkflowModelReference(**reference_fields(r, model_type))
+                                   for r, model_type in references.items()]
+            session.commit()
+
+    def resolve_workflow_references(self) -> None:
+        """
+        Link workflow references to the model whose model file has the referenced name and relative path,
+        in the referenced type folder if known, and carry the workflows' usage over to the models. A
+        reference that several models match is left unresolved rather than linked to any of them.
+        """
+        model_type = case(TYPE_ALIASES, value=Model.type, else_=Model.type)
+        model_file = (select(func.min(Component.model_id))
+                      .join(Model, Model.hash == Component.model_id)
+                      .where(Component.component_type == ComponentFileType.MODEL,
+                             Component.file_name == WorkflowModelReference.file_name,
+                             Model.relative_path == WorkflowModelReference.relative_path,
+                             or_(WorkflowModelReference.model_type == None,  # noqa: E711
+                                 model_type == WorkflowModelReference.model_type))
+                      .having(func.count(Component.model_id.distinct()) == 1)
+                      .scalar_subquery())
+        workflow_used = (select(func.max(Workflow.last_used))
+                         .join(WorkflowModelReference, WorkflowModelReference.workflow_id == Workflow.id)
+                         .where(WorkflowModelReference.model_id == Model.hash)
+                         .scalar_subquery())
+        with Session(self.engine) as session:
+            session.execute(update(WorkflowModelReference).values(model_id=model_file))
+            # a model is as recently used as the most recently used workflow that needs it
+            session.execute(update(Model).values(last_used=func.max(Model.last_used, func.coalesce(workflow_used, 0))))
             session.commit()
 
-    def get_models(self, ordered) -> Iterable:
+    def get_workflow_models(self, workflow_id: str) -> list[Model]:
         with Session(self.engine) as session:
+            statement = (select(Model)
+                         .join(WorkflowModelReference, WorkflowModelReference.model_id == Model.hash)
+                         .where(WorkflowModelReference.workflow_id == workflow_id)
+                         .options(selectinload(Model.components))
+                         .distinct())
+            return list(session.exec(statement).all())
+
+    def get_unresolved_references(self, workflow_id: str) -> list[str]:
+        with Session(self.engine) as session:
+            statement = (select(WorkflowModelReference.reference)
+                         .where(WorkflowModelReference.workflow_id == workflow_id,
+                                WorkflowModelReference.model_id == None))  # noqa: E711
+            return list(session.exec(statement).all())
+
+    def get_model_workflows(self, model_hash: str) -> list[Workflow]:
+        with generations.session() as session:
+            statement = (select(Workflow)
+                         .join(WorkflowModelReference, WorkflowModelReference.workflow_id == Workflow.id)
+                         .where(WorkflowModelReference.model_id == model_hash)
+                         .distinct())
+            return list(session.exec(statement).all())
+
+    @metrics.timed('archivist_clean_repository_seconds', 'Time to remove stale rows after a scan')
+    def clean_repository(self, scan_id: str, scope: list[tuple[str, str, str | None]] | None = None,
+                         workflows: bool = True, installation: str = DEFAULT_INSTALLATION, recursive: bool = True):
+        """
+        Remove what an installation's scan did not see. For a partial scan, scope lists the scanned
+        (type, active type folder, subpath) combinations and only models within them are considered;
+        without recursive, only models right in the subpath, not in folders below it.
+        A model that was not seen loses the installation's active files and its archive files; it is
+        removed once no installation has files of it left. Cached sidecars of files no longer catalogued go too.
+        """
+        with Session(self.engine) as session:
+            statement = (select(ModelInstallation)
+                         .join(Model, Model.hash == ModelInstallation.model_id)
+                         .where(ModelInstallation.installation == installation,
+                                ModelInstallation.last_scan_id != scan_id))
+            if scope is not None:
+                statement = statement.where(or_(false(), *(model_in_scope(*s, recursive) for s in scope)))
+            stale = session.exec(statement).all()
+            stale_hashes = [seen.model_id for seen in stale]
+            for seen in stale:
+                session.delete(seen)
+            removed = {}
+            for component in session.exec(select(Component).where(Component.model_id.in_(stale_hashes),
+                                                                   Component.installation.in_((installation, '')))):
+                removed.setdefault(component.model_id, []).append(component.file_name)
+                session.delete(component)
+            session.flush()
+            for model in session.exec(select(Model).where(Model.hash.in_(stale_hashes))):
+                if not model.components:
+                    session.delete(model)
+                    record_change(session, model.hash, ChangeKind.REMOVED)
+                    continue
+                flags = (model.is_active, model.is_archived)
+                update_flags(model)
+                session.add(model)
+                if model.hash in removed:
+                    record_change(session, model.hash, ChangeKind.FILES, {'added': [], 'removed': removed[model.hash]})
+                if (model.is_active, model.is_archived) != flags:
+                    record_change(session, model.hash, ChangeKind.STATE)
+            if workflows:
+                for workflow in session.exec(select(Workflow).where(Workflow.last_scan_id != scan_id)):
+                    session.delete(workflow)
+            # cached sidecars that no model has any more
+            session.execute(delete(SidecarCache).where(~(
+                select(Component.id)
+                .where(Component.dir_id == SidecarCache.dir_id, Component.file_name == SidecarCache.file_name)
+                .exists())))
+            session.commit()
+
+    def get_installation_models(self, installation: str) -> list[Model]:
+        """
+        The models active in an installation.
+        """
+        with generations.session() as session:
+            statement = (select(Model)
+                         .join(Component, Component.model_id == Model.hash)
+                         .where(Component.installation == installation,
+                                Component.is_archive == False)  # noqa: E712
+                         .order_by(Model.type, Model.name)
+                         .distinct())
+            return list(session.exec(statement).all())
+
+    def find_model_files(self, file_name: str, size: int) -> list[tuple[str, Path, int]]:
+        """
+        (hash, path, mtime_ns) of the known model files with this name and size, in any installation or archive.
+        """
+        with Session(self.engine) as session:
+            statement = (select(Component.model_id, Directory.path, Component.file_mtime_ns)
+                         .join(Directory, Directory.id == Component.dir_id)
+                         .where(Component.component_type == ComponentFileType.MODEL,
+                                Component.file_name == file_name,
+                                Component.file_size == size))
+            return [(model_hash, Path(file_dir) / file_name, mtime_ns)
+                    for model_hash, file_dir, mtime_ns in session.exec(statement)]
+
+    def get_components_under(self, path: str) -> list[Component]:
+        """
+        The components in a directory or anywhere below it, found through the directory index.
+        """
+        path = path.rstrip('/') or '/'
+        with Session(self.engine) as session:
+            statement = select(Component).where(Component.dir_id.in_(under_directory(path)))
+            return list(session.exec(statement).all())
+
+    def get_model_digests(self, model_hash: str) -> dict[str, str]:
+        with Session(self.engine) as session:
+            rows = session.exec(select(ModelDigest.algorithm, ModelDigest.digest)
+                                .where(ModelDigest.model_id == model_hash)).all()
+            return {algorithm: digest for algorithm, digest in rows} | {'sha256': model_hash}
+
+    def find_by_digest(self, value: str, algorithm: str | None = None, limit: int = 50) -> list[tuple[str, str, str]]:
+        """
+        (hash, algorithm, digest) of the models with a digest equal to or starting with value, one per model:
+        where several digests of a model match (a SHA-256 and the AutoV2 cut from it), the longest.
+        """
+        prefix = value.strip().lower()
+        with Session(self.engine) as session:
+            # a range rather than LIKE, which SQLite cannot serve from the index; digests are hex, and 'g'
+            # sorts after every hex digit
+            rank = func.row_number().over(partition_by=ModelDigest.model_id,
+                                          order_by=func.length(ModelDigest.digest).desc())
+            matches = (select(ModelDigest.model_id, ModelDigest.algorithm, ModelDigest.digest, rank.label('rank'))
+                       .where(ModelDigest.digest >= prefix, ModelDigest.digest < prefix + 'g'))
+            if algorithm is not None:
+                matches = matches.where(ModelDigest.algorithm == algorithm)
+            matches = matches.subquery()
+            statement = (select(matches.c.model_id, matches.c.algorithm, matches.c.digest)
+                         .where(matches.c.rank == 1)
+                         .order_by(matches.c.digest).limit(limit))
+            return list(session.exec(statement).all())
+
+    def get_models(self, ordered, architecture: str | None = None, precision: str | None = None,
+                   hashes: list[str] | None = None) -> Iterable:
+        with generations.session() as session:
             if ordered:
                 statement = select(Model).order_by(Model.type, Model.name)
             else:
                 statement = select(Model).order_by(Model.type)
+            if hashes is not None:
+                statement = statement.where(Model.hash.in_(hashes))
+            if architecture is not None:
+                statement = statement.where(Model.architecture == architecture)
+            if precision is not None:
+                statement = statement.where(Model.precision == precision)
             for model in session.exec(statement).all():
                 yield model
 
-    def get_tags(self, target_types: Set[Taggable] | None, offset: int, limit: int) -> Iterable:
+    def start_scan_run(self, scan_id: str, status: str, rehash: bool, scope: str = '',
+                       installation: str = DEFAULT_INSTALLATION) -> None:
+        with Session(self.engine) as session:
+            session.add(ScanRun(id=scan_id, status=status, rehash=rehash, scope=scope, started=time.time(),
+                                installation=installation))
+            session.commit()
+
+    def get_scan_run(self, scan_id: str) -> tuple[ScanRun, set[str]] | None:
+        """
+        A scan run and the directories it has completed.
+        """
+        with Session(self.engine) as session:
+            run = session.get(ScanRun, scan_id)
+            if run is None:
+                return None
+            return run, {c.directory for c in run.checkpoints}
+
+    def add_checkpoints(self, scan_id: str, directories: list[str]) -> None:
+        if not directories:
+            return
+        with Session(self.engine) as session:
+            session.add_all(ScanCheckpoint(scan_id=scan_id, directory=d) for d in directories)
+            session.commit()
+
+    def finish_scan_run(self, scan_id: str, status: str, in_flight: list[str], keep_checkpoints: bool) -> None:
+        with Session(self.engine) as session:
+            run = session.get(ScanRun, scan_id)
+            run.status = status
+            run.in_flight = json.dumps(in_flight)
+            if not keep_checkpoints:
+                run.checkpoints = []
+            session.add(run)
+            session.commit()
+
+    def load_sidecar_cache(self, directory: str) -> dict[str, tuple[int, int, dict]]:
+        """
+        The cached sidecars of one directory, by path.
+        """
+        with Session(self.engine) as session:
+            rows = session.exec(select(SidecarCache.file_name, SidecarCache.mtime_ns, SidecarCache.size,
+                                       SidecarCache.content)
+                                .where(SidecarCache.dir_id == directories.intern(directory))).all()
+            return {str(Path(directory) / file_name): (mtime_ns, size, json.loads(content))
+                    for file_name, mtime_ns, size, content in rows}
+
+    def save_sidecar_cache(self, entries: dict[str, tuple[int, int, dict]], batch_size: int = 500) -> None:
+        items = [{'dir_id': directories.intern(str(Path(path).parent)), 'file_name': Path(path).name,
+                  'mtime_ns': mtime_ns, 'size': size, 'content': json.dumps(data)}
+                 for path, (mtime_ns, size, data) in entries.items()]
+        with Session(self.engine) as session:
+            for start in range(0, len(items), batch_size):
+                statement = sqlite_insert(SidecarCache).values(items[start:start + batch_size])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[SidecarCache.dir_id, SidecarCache.file_name],
+                    set_={'mtime_ns': statement.excluded.mtime_ns,
+                          'size': statement.excluded.size,
+                          'content': statement.excluded.content})
+                session.execute(statement)
+            session.commit()
+
+    def catalog_records(self) -> Iterable[dict]:
+        """
+        The whole catalog as plain records: models with their components, tags, digests and installations,
+        then workflows, then collections, which refer to both.
+        """
+        component_fields = {'file_name', 'component_type', 'is_archive', 'file_size', 'file_mtime_ns', 'installation'}
+
+        def component_record(c: Component) -> dict:
+            return {**c.model_dump(include=component_fields), 'file_dir': c.file_dir}
         with Session(self.engine) as session:
+            models = session.exec(select(Model).order_by(Model.hash).options(
+                selectinload(Model.components), selectinload(Model.tags), selectinload(Model.digests),
+                selectinload(Model.installations))).all()
+            for model in models:
+                yield {'kind': 'model',
+                       **model.model_dump(exclude={'is_active', 'is_archived', 'last_scan_id', 'active_dir_id',
+                                                   'archive_dir_id'}),
+                       'active_type_dir': model.active_type_dir,
+                       'archive_type_dir': model.archive_type_dir,
+                       'tags': [tag.tag for tag in model.tags],
+                       'digests': {d.algorithm: d.digest for d in model.digests},
+                       'installations': {i.installation: i.active_type_dir for i in model.installations},
+                       'components': [component_record(c) for c in model.components]}
+            workflows = session.exec(select(Workflow).order_by(Workflow.id).options(
+                selectinload(Workflow.components), selectinload(Workflow.tags),
+                selectinload(Workflow.references))).all()
+            for workflow in workflows:
+                yield {'kind': 'workflow',
+                       **workflow.model_dump(exclude={'is_active', 'is_archived', 'last_scan_id', 'scan_errors'}),
+                       'tags': [tag.tag for tag in workflow.tags],
+                       'references': {r.reference: r.file_name for r in workflow.references},
+                       'reference_types': {r.reference: r.model_type for r in workflow.references},
+                       'components': [component_record(c) for c in workflow.components]}
+            collections = session.exec(select(Collection).order_by(Collection.id).options(
+                selectinload(Collection.tags), selectinload(Collection.models), selectinload(Collection.workflows),
+                selectinload(Collection.child_collections))).all()
+            for collection in collections:
+                yield {'kind': 'collection',
+                       **collection.model_dump(),
+                       'tags': [tag.tag for tag in collection.tags],
+                       'models': [m.hash for m in collection.models],
+                       'workflows': [w.id for w in collection.workflows],
+                       'children': [c.id for c in collection.child_collections]}
+
+    def restore_catalog(self, records: Iterable[dict], scan_id: str) -> None:
+        """
+        Bulk insert catalog records into an empty catalog, in one transaction. Flags are worked out from the
+        components present; everything is marked as seen by scan_id. Directories are interned as the records
+        are read, before the transaction starts.
+        """
+        rows = {table: [] for table in (Tag, Model, ModelDigest, ModelInstallation, TagModelLink, Workflow,
+                                        TagWorkflowLink, WorkflowModelReference, Component, Collection,
+                                        TagCollectionLink, ModelCollectionLink, WorkflowCollectionLink,
+                                        CollectionCollectionLink)}
+        tags = set()
+        with Session(self.engine) as session:
+            if session.exec(select(func.count()).select_from(Model)).one() or \
+                    session.exec(select(func.count()).select_from(Workflow)).one():
+                raise ArchivistException(ArchivistError.CATALOG_NOT_EMPTY, str(self.db_path))
+            for record in records:
+                components = [{**pick(Component, c), 'component_type': ComponentFileType(c['component_type']),
+                               'dir_id': directories.intern(c['file_dir'])}
+                              for c in record.pop('components', [])]
+                flags = {'is_active': any(not c['is_archive'] for c in components),
+                         'is_archived': any(c['is_archive'] for c in components),
+                         'last_scan_id': scan_id}
+                tags.update(record['tags'])
+                match record.pop('kind'):
+                    case 'model':
+                        key = record['hash']
+                        rows[Model].append({**pick(Model, record), **flags,
+                                            'active_dir_id': directories.intern(record['active_type_dir']),
+                                            'archive_dir_id': directories.intern(record['archive_type_dir'])})
+                        rows[ModelDigest].extend({'model_id': key, 'algorithm': algorithm, 'digest': digest}
+                                                 for algorithm, digest in record['digests'].items())
+                        active = {c['installation'] for c in components if not c['is_archive']}
+                        rows[ModelInstallation].extend(
+                            {'model_id': key, 'installation': name, 'active_dir_id': directories.intern(type_dir),
+                             'last_scan_id': scan_id}
+                            for name, type_dir in record['installations'].items() if name in active)
+                        rows[TagModelLink].extend({'model_id': key, 'tag': tag} for tag in record['tags'])
+                        rows[Component].extend({**c, 'model_id': key, 'last_scan_id': scan_id} for c in components)
+                    case 'workflow':
+                        key = record['id']
+                        rows[Workflow].append({**pick(Workflow, record), **flags, 'scan_errors': ''})
+                        rows[TagWorkflowLink].extend({'workflow_id': key, 'tag': tag} for tag in record['tags'])
+                        reference_types = record.get('reference_types', {})
+                        rows[WorkflowModelReference].extend(
+                            {'workflow_id': key, **reference_fields(reference, reference_types.get(reference))}
+                            for reference in record['references'])
+                        rows[Component].extend({**c, 'workflow_id': key, 'last_scan_id': scan_id}
+                                               for c in components)
+                    case 'collection':
+                        key = record['id']
+                        rows[Collection].append(pick(Collection, record))
+                        rows[TagCollectionLink].extend({'collection_id': key, 'tag': tag} for tag in record['tags'])
+                        rows[ModelCollectionLink].extend({'collection_id': key, 'model_id': model_hash}
+                                                         for model_hash in record['models'])
+                        rows[WorkflowCollectionLink].extend({'collection_id': key, 'workflow_id': workflow_id}
+                                                            for workflow_id in record['workflows'])
+                        rows[CollectionCollectionLink].extend({'master_collection_id': key, 'child_collection_id': c}
+                                                              for c in record['children'])
+            rows[Tag] = [{'tag': tag} for tag in tags]
+            # models and workflows left out of the import drop out of the collections that held them
+            models = {row['hash'] for row in rows[Model]}
+            workflows = {row['id'] for row in rows[Workflow]}
+            rows[ModelCollectionLink] = [row for row in rows[ModelCollectionLink] if row['model_id'] in models]
+            rows[WorkflowCollectionLink] = [row for row in rows[WorkflowCollectionLink]
+                                            if row['workflow_id'] in workflows]
+            for table, table_rows in rows.items():
+                if table_rows:
+                    session.execute(insert(table), table_rows)
+            added = select(Model.hash, literal(ChangeKind.ADDED, ModelChange.kind.type))
+            session.execute(insert(ModelChange).from_select(['model_id', 'kind'], added))
+            session.commit()
+        self.resolve_workflow_references()
+
+    def get_changes(self, since: int, limit: int) -> tuple[list[ModelChange], int, int]:
+        """
+        Change log entries after a sequence number, oldest first, with the first and last sequence numbers
+        the log holds (0 for an empty log).
+        """
+        with generations.session() as session:
+            first, last = session.exec(select(func.min(ModelChange.seq), func.max(ModelChange.seq))).one()
+            statement = select(ModelChange).where(ModelChange.seq > since).order_by(ModelChange.seq).limit(limit)
+            return list(session.exec(statement).all()), first or 0, last or 0
+
+    def last_change(self) -> int:
+        with generations.session() as session:
+            return session.exec(select(func.max(ModelChange.seq))).one() or 0
+
+    def compact_changes(self, keep: int) -> int:
+        """
+        Drop all but the last keep entries of the change log. Returns the number of entries dropped.
+        """
+        with Session(self.engine) as session:
+            last = session.exec(select(func.max(ModelChange.seq))).one()
+            if last is None:
+                return 0
+            dropped = session.execute(delete(ModelChange).where(ModelChange.seq <= last - keep)).rowcount
+            session.commit()
+        if dropped:
+            logger.info(f'Repository.compact_changes: {dropped} entries dropped')
+        return dropped
+
+    def count_components(self) -> int:
+        with Session(self.engine) as session:
+            return session.exec(select(func.count()).select_from(Component)).one()
+
+    def get_tags(self, target_types: Set[Taggable] | None, offset: int, limit: int) -> Iterable:
+        with generations.session() as session:
             if target_types is not None:
                 cond = []
                 if Taggable.MODEL in target_types:
@@ -110,9 +528,468 @@ class Repository:
         with Session(self.engine) as session:
             return session.get(Model, hash)
 
+    def get_collection_plan(self, collection_id: int, exclusive: bool,
+                            installation: str = DEFAULT_INSTALLATION) -> tuple[list[Model], list[Model]]:
+        """
+        Work out which models must be moved to activate a collection in an installation. Returns two lists:
+        - models required by the collection or its child collections that are not yet active there,
+        - if exclusive, models active there that are not required by any active collection or by this one.
+        Models are returned detached, with their components loaded.
+        """
+        with Session(self.engine) as session:
+            if session.get(Collection, collection_id) is None:
+                raise ArchivistException(ArchivistError.UNKNOWN_COLLECTION, str(collection_id))
+            active_here = active_in(installation)
+            required = collection_models(select(literal(collection_id).label('id')))
+            statement = (select(Model)
+                         .where(Model.hash.in_(required), Model.hash.not_in(active_here))
+                         .options(selectinload(Model.components)))
+            to_activate = list(session.exec(statement).all())
+            to_archive = []
+            if exclusive:
+                roots = select(Collection.id).where(or_(Collection.id == collection_id,
+                                                        Collection.is_active == True))  # noqa: E712
+                statement = (select(Model)
+                             .where(Model.hash.not_in(collection_models(roots)), Model.hash.in_(active_here))
+                             .options(selectinload(Model.components)))
+                to_archive = list(session.exec(statement).all())
+            return to_activate, to_archive
+
+    @generations.publishes
+    def set_collection_active(self, collection_id: int, is_active: bool) -> None:
+        with Session(self.engine) as session:
+            collection = session.get(Collection, collection_id)
+            if collection is None:
+                raise ArchivistException(ArchivistError.UNKNOWN_COLLECTION, str(collection_id))
+            collection.is_active = is_active
+            session.add(collection)
+            session.commit()
+
+    @generations.publishes
+    def relocate_components(self, model_hash: str, moved: dict[int, Path], to_archive: bool,
+                            installation: str = DEFAULT_INSTALLATION) -> None:
+        """
+        Record that the given components (by id) now live in new directories, in the archive or in the
+        installation's active folders, and update the active/archived flags of their model.
+        """
+        dir_ids = {component_id: directories.intern(str(path)) for component_id, path in moved.items()}
+        with Session(self.engine) as session:
+            model = session.get(Model, model_hash)
+            if model is None:
+                raise ArchivistException(ArchivistError.MODEL_MISSING, model_hash)
+            flags = (model.is_active, model.is_archived)
+            for c in model.components:
+                if c.id in moved:
+                    c.dir_id = dir_ids[c.id]
+                    c.is_archive = to_archive
+                    c.installation = '' if to_archive else installation
+                    session.add(c)
+            update_flags(model)
+            record_change(session, model_hash, ChangeKind.FILES,
+                          {'moved': [c.file_name for c in model.components if c.id in moved]})
+            if (model.is_active, model.is_archived) != flags:
+                record_change(session, model_hash, ChangeKind.STATE)
+            if not to_archive:
+                model.last_used = max(model.last_used, time.time())
+            session.add(model)
+            session.commit()
+
+    def get_model_file_components(self, path: Path) -> tuple[str | None, list[Component]]:
+        """
+        The model of a model file and that model's components in the file's folder sharing its stem: the file
+        itself, its sidecar, preview and extras. Components are returned detached.
+        """
+        stem = path.stem
+        with Session(self.engine) as session:
+            component = session.exec(select(Component)
+                                     .join(Directory, Directory.id == Component.dir_id)
+                                     .where(Directory.path == str(path.parent), Component.file_name == path.name,
+                                            Component.model_id != None)).first()  # noqa: E711
+            if component is None:
+                return None, []
+            statement = select(Component).where(Component.model_id == component.model_id,
+                                                Component.dir_id == component.dir_id)
+            # another model file starting with the stem is a copy of its own, not one of this file's extras
+            return component.model_id, [c for c in session.exec(statement)
+                                        if c.file_name == path.name or (c.file_name.startswith(stem + '.') and
+                                                                        c.component_type != ComponentFileType.MODEL)]
+
+    @generations.publishes
+    def remove_components(self, model_hash: str, component_ids: list[int]) -> None:
+        """
+        Drop the catalog entries of deleted files and update the flags of their model, removing the model
+        if it has no files left.
+        """
+        with Session(self.engine) as session:
+            model = session.get(Model, model_hash)
+            if model is None:
+                raise ArchivistException(ArchivistError.MODEL_MISSING, model_hash)
+            flags = (model.is_active, model.is_archived)
+            removed = [c for c in model.components if c.id in component_ids]
+            for component in removed:
+                model.components.remove(component)
+                session.delete(component)
+            if not model.components:
+                session.delete(model)
+                record_change(session, model_hash, ChangeKind.REMOVED)
+            else:
+                update_flags(model)
+                session.add(model)
+                record_change(session, model_hash, ChangeKind.FILES,
+                              {'added': [], 'removed': [c.file_name for c in removed]})
+                if (model.is_active, model.is_archived) != flags:
+                    record_change(session, model_hash, ChangeKind.STATE)
+            session.commit()
+
+    def get_active_usage(self, installation: str = DEFAULT_INSTALLATION) -> dict[str, int]:
+        """
+        Bytes used in an installation's active branch, per model type.
+        """
+        with Session(self.engine) as session:
+            statement = (select(Model.type, func.sum(Component.file_size))
+                         .join(Component, Component.model_id == Model.hash)
+                         .where(Component.is_archive == False,  # noqa: E712
+                                Component.installation == installation)
+                         .group_by(Model.type))
+            return {model_type: size or 0 for model_type, size in session.exec(statement).all()}
+
+    def iter_least_recently_used(self, installation: str = DEFAULT_INSTALLATION,
+                                 page_size: int = 100) -> Iterable[tuple[str, str, int]]:
+        """
+        Yield (hash, type, active bytes) of the models active in an installation, counting only the bytes
+        active there, least recently used first. Models in active
+        collections are pinned and never yielded. Models are read a page at a time along the last_used index,
+        each page starting after the last (last_used, hash) seen, so callers that stop early do not pay for
+        the whole table; the sizes are summed for one page at a time.
+        """
+        pinned = collection_models(select(Collection.id).where(Collection.is_active == True))  # noqa: E712
+        after = None
+        while True:
+            statement = (select(Model.hash, Model.type, Model.last_used)
+                         .where(Model.hash.in_(active_in(installation)), Model.hash.not_in(pinned))
+                         .order_by(Model.last_used, Model.hash)
+                         .limit(page_size))
+            if after is not None:
+                statement = statement.where(or_(Model.last_used > after[0],
+                                                and_(Model.last_used == after[0], Model.hash > after[1])))
+            with Session(self.engine) as session:
+                page = session.exec(statement).all()
+                sizes = dict(session.exec(
+                    select(Component.model_id, func.sum(Component.file_size))
+                    .where(Component.model_id.in_([row[0] for row in page]),
+                           Component.is_archive == False,  # noqa: E712
+                           Component.installation == installation)
+                    .group_by(Component.model_id)).all())
+            for model_hash, model_type, last_used in page:
+                if model_hash in sizes:
+                    yield model_hash, model_type, sizes[model_hash] or 0
+            if len(page) < page_size:
+                return
+            after = page[-1][2], page[-1][0]
+
+    def get_sizes(self, group: SizeGroup, roots: dict[str, list[str]] | None = None) -> list[dict]:
+        """
+        Active and archived bytes, aggregated per model, model type, root folder or collection. Collection
+        totals include child collections and count each model once. Root folders are given in roots; see
+        get_root_sizes.
+        """
+        active = func.sum(case((Component.is_archive == False, Component.file_size), else_=0))  # noqa: E712
+        archived = func.sum(case((Component.is_archive == True, Component.file_size), else_=0))  # noqa: E712
+        match group:
+            case SizeGroup.MODEL:
+                key = Model.hash
+                statement = select(key, active, archived).join(Component, Component.model_id == Model.hash)
+            case SizeGroup.TYPE:
+                key = Model.type
+                statement = select(key, active, archived).join(Component, Component.model_id == Model.hash)
+            case SizeGroup.ROOT:
+                return self.get_root_sizes(roots or {})
+            case SizeGroup.COLLECTION:
+                closure = select(Collection.id.label('root_id'), Collection.id.label('id')).cte(
+                    'collection_closure', recursive=True)
+                closure = closure.union(
+                    select(closure.c.root_id, CollectionCollectionLink.child_collection_id)
+                    .where(CollectionCollectionLink.master_collection_id == closure.c.id))
+                members = (select(closure.c.root_id, ModelCollectionLink.model_id)
+                           .join(ModelCollectionLink, ModelCollectionLink.collection_id == closure.c.id)
+                           .distinct()
+                           .subquery())
+                key = members.c.root_id
+                statement = select(key, active, archived).join(Component, Component.model_id == members.c.model_id)
+            case _:
+                raise ValueError(group)
+        with generations.session() as session:
+            rows = session.exec(statement.group_by(key)).all()
+        return [{'key': k, 'active': a or 0, 'archived': b or 0} for k, a, b in rows]
+
+    def get_root_sizes(self, roots: dict[str, list[str]]) -> list[dict]:
+        """
+        Active and archived bytes under each configured root folder of each installation; roots maps an
+        installation, or '' for the archive, to its root folders. Model files are summed per directory in the
+        database, and the directories, a few thousand at most, are then matched to the deepest root holding
+        them. Files under no root are counted under their own directory.
+        """
+        statement = (select(Component.installation, Component.is_archive, Component.dir_id,
+                            func.sum(Component.file_size))
+                     .where(Component.model_id != None)  # noqa: E711
+                     .group_by(Component.installation, Component.is_archive, Component.dir_id))
+        with generations.session() as session:
+            rows = session.exec(statement).all()
+        deepest_first = {installation: sorted(map(Path, paths), key=lambda p: -len(p.parts))
+                         for installation, paths in roots.items()}
+        totals = {}
+        for installation, is_archive, dir_id, size in rows:
+            place = '' if is_archive else installation
+            directory = Path(directories.path(dir_id))
+            root = next((r for r in deepest_first.get(place, []) if directory.is_relative_to(r)), directory)
+            entry = totals.setdefault((place, root), {'key': str(root), 'installation': place,
+                                                      'active': 0, 'archived': 0})
+            entry['archived' if is_archive else 'active'] += size or 0
+        return list(totals.values())
+
+    @generations.publishes
+    @metrics.timed('archivist_retag_seconds', 'Time to add or remove tags on a selection of models')
+    def retag_models(self, add: list[str], remove: list[str], replace: bool = False, hashes: list[str] | None = None,
+                     tag: str | None = None, model_type: str | None = None) -> list[str]:
+        """
+        Add and remove tags on many models in one transaction, with one statement per change rather than one
+        per model. The models are those with the given hashes, further limited to those with the given tag
+        and/or type. With replace, the models keep only the added tags. Returns the hashes of the models whose
+        tags changed; only those get a change log entry, and their tags win over their sidecars' in scans until
+        take_sidecar_tags has handed them out.
+        """
+        add = clean_tag_names(add)
+        # a tag both removed and added stays
+        remove = [t for t in clean_tag_names(remove) if t not in add]
+        with Session(self.engine) as session:
+            statement = select(Model.hash)
+            if hashes is not None:
+                statement = statement.where(Model.hash.in_(hashes))
+            if model_type is not None:
+                statement = statement.where(Model.type == model_type)
+            if tag is not None:
+                statement = statement.where(Model.hash.in_(select(TagModelLink.model_id)
+                                                           .where(TagModelLink.tag == tag.strip())))
+            targets = list(session.exec(statement).all())
+            if not targets:
+                return []
+            # the models whose tags change: those losing a tag, and those lacking one of the added tags
+            changed = set()
+            if replace or remove:
+                # with replace, the added tags a model already has are kept rather than unlinked and linked again
+                dropped = TagModelLink.tag.not_in(add) if replace else TagModelLink.tag.in_(remove)
+                changed.update(session.exec(select(TagModelLink.model_id)
+                                            .where(TagModelLink.model_id.in_(targets), dropped).distinct()))
+                session.execute(delete(TagModelLink).where(TagModelLink.model_id.in_(targets), dropped))
+            if add:
+                complete = (select(TagModelLink.model_id)
+                            .where(TagModelLink.model_id.in_(targets), TagModelLink.tag.in_(add))
+                            .group_by(TagModelLink.model_id)
+                            .having(func.count() == len(add)))
+                changed.update(set(targets) - set(session.exec(complete)))
+                session.execute(sqlite_insert(Tag).values([{'tag': t} for t in add]).on_conflict_do_nothing())
+                # every selected model with every added tag
+                links = select(Model.hash, Tag.tag).join(Tag, true()).where(Model.hash.in_(targets), Tag.tag.in_(add))
+                session.execute(sqlite_insert(TagModelLink).from_select(['model_id', 'tag'], links)
+                                .on_conflict_do_nothing())
+            if changed:
+                session.execute(update(Model).where(Model.hash.in_(changed)).values(tags_pending=True))
+                session.execute(insert(ModelChange), [{'model_id': model_hash, 'kind': ChangeKind.TAGS, 'detail': ''}
+                                                      for model_hash in sorted(changed)])
+            session.commit()
+        logger.info(f'Repository.retag_models: +{add} -{remove} {"(replace) " if replace else ""}'
+                    f'on {len(targets)} models, {len(changed)} changed')
+        return sorted(changed)
+
+    def take_sidecar_tags(self, hashes: list[str]) -> list[tuple[Path, list[str]]]:
+        """
+        The metadata sidecars of the given models, active and archived, each with its model's tags, which from
+        then on count as written to the sidecars. Read and marked in one transaction, so that a retag coming
+        in meanwhile stays pending.
+        """
+        with Session(self.engine) as session:
+            # written first, so that the write lock keeps retags out until the tags have been read
+            session.execute(update(Model).where(Model.hash.in_(hashes)).values(tags_pending=False))
+            tags = {}
+            links = select(TagModelLink.model_id, TagModelLink.tag).where(TagModelLink.model_id.in_(hashes))
+            for model_id, tag in session.exec(links):
+                tags.setdefault(model_id, []).append(tag)
+            sidecars = select(Component.model_id, Directory.path, Component.file_name) \
+                .join(Directory, Component.dir_id == Directory.id) \
+                .where(Component.model_id.in_(hashes), Component.component_type == ComponentFileType.METADATA)
+            found = [(Path(folder) / name, sorted(tags.get(model_id, [])))
+                     for model_id, folder, name in session.exec(sidecars)]
+            session.commit()
+            return found
+
+    def get_models_by_hash(self, hashes: list[str]) -> list[Model]:
+        with Session(self.engine) as session:
+            statement = select(Model).where(Model.hash.in_(hashes)).options(selectinload(Model.components))
+            return list(session.exec(statement).all())
+
+
+def update_flags(model: Model) -> None:
+    model.is_archived = any(c.is_archive for c in model.components)
+    model.is_active = any(not c.is_archive for c in model.components)
+
+
+def under_directory(path: str):
+    """
+    The ids of a directory and all directories below it: a range scan of the path index, as every path below
+    starts with path + '/' and '0' is the character after '/'.
+    """
+    prefix = path if path.endswith('/') else path + '/'
+    return select(Directory.id).where(or_(Directory.path == path,
+                                          and_(Directory.path >= prefix, Directory.path < prefix[:-1] + '0')))
+
+
+def reference_fields(reference: str, model_type: str | None) -> dict:
+    """
+    The columns of a workflow's model reference, a path relative to the type folder.
+    """
+    path = PurePosixPath(reference)
+    return {'reference': reference, 'file_name': path.name, 'relative_path': str(Path(path.parent)),
+            'model_type': model_type}
+
+
+def pick(table, record: dict) -> dict:
+    return {name: record[name] for name in table.model_fields if name in record}
+
+
+def merge_model(session: Session, model: Model, tag_names: list[str], resumed: bool, installation: str,
+                digests: dict[str, str] | None, sidecar_tags: bool = True) -> None:
+    """
+    Add a scanned model to the session, flushed but not committed. We have the following possibilities:
+    - the model is not known: add the model,
+    - the model is known, but has not been seen in this scan: update it,
+    - the model is known and has already been seen in this scan: raise an exception, unless the scan
+      was resumed, in which case it may have been saved before the interruption.
+    Only the components this installation can see, its own active files and the shared archive, are
+    replaced; active files of other installations stay as they are. A known model takes the tags of its
+    sidecar only with sidecar_tags (write-through of tags to sidecars) and unless its catalogued tags have
+    changed since they were last written to the sidecars; otherwise the catalog's tags stay. Raises
+    IntegrityError if another session has added the same model meanwhile.
+    """
+    known_models = session.exec(select(Model).where(Model.hash == model.hash)).all()
+    seen = ModelInstallation(model_id=model.hash, installation=installation,
+                             active_dir_id=model.active_dir_id, last_scan_id=model.last_scan_id)
+    if len(known_models) == 0:
+        logger.info(f'Repository.save_model:adding model {model.name}')
+        model.tags = resolve_tags(session, tag_names)
+        model.installations = [seen]
+        session.add(model)
+        store_digests(session, model.hash, digests)
+        record_change(session, model.hash, ChangeKind.ADDED)
+        session.flush()
+        return
+    logger.info(f'Repository.save_model:updating model {model.name}')
+    if len(known_models) > 1:
+        all_names = ', '.join(m.name for m in known_models)
+        raise ArchivistException(ArchivistError.DUPLICATE_MODEL,
+                                 f'{model.hash}, {all_names}')
+    old_model = known_models[0]
+    if old_model.last_scan_id == model.last_scan_id and not resumed:
+        raise ArchivistException(ArchivistError.DUPLICATE_MODEL,
+                                 f'{model.name} {model.hash}, {old_model.last_scan_id}')
+    flags = (old_model.is_active, old_model.is_archived)
+    old_tags = {t.tag for t in old_model.tags}
+    # see which components no longer exist and remove them
+    known_components = {(c.file_name, c.component_type, c.is_archive): c for c in old_model.components
+                        if c.installation in (installation, '')}
+    # the model's own active folder is the default installation's, whoever saw the model first
+    if installation != DEFAULT_INSTALLATION:
+        model.active_dir_id = old_model.active_dir_id
+    # update the old model
+    old_model.update_from(model)
+    take_tags = sidecar_tags and not old_model.tags_pending
+    if take_tags:
+        old_model.tags = resolve_tags(session, tag_names)
+    session.add(old_model)
+    session.merge(seen)
+    store_digests(session, model.hash, digests)
+    # add new components; reassigning c.model takes it out of model.components, so iterate over a copy
+    added = []
+    for c in list(model.components):
+        if (c.file_name, c.component_type, c.is_archive) in known_components:
+            old_component = known_components.pop((c.file_name, c.component_type, c.is_archive))
+            old_component.file_size = c.file_size
+            old_component.file_mtime_ns = c.file_mtime_ns
+            session.add(old_component)
+        else:
+            c.model = old_model
+            session.add(c)
+            added.append(c.file_name)
+    # remove components that no longer exist
+    for c in known_components.values():
+        session.delete(c)
+    session.flush()
+    session.refresh(old_model)
+    update_flags(old_model)
+    session.add(old_model)
+    if take_tags and set(clean_tag_names(tag_names)) != old_tags:
+        record_change(session, model.hash, ChangeKind.TAGS)
+    if added or known_components:
+        record_change(session, model.hash, ChangeKind.FILES,
+                      {'added': added, 'removed': [c.file_name for c in known_components.values()]})
+    if (old_model.is_active, old_model.is_archived) != flags:
+        record_change(session, model.hash, ChangeKind.STATE)
+    session.flush()
+
+
+def record_change(session: Session, model_hash: str, kind: ChangeKind, detail: dict | None = None) -> None:
+    session.add(ModelChange(model_id=model_hash, kind=kind, detail=json.dumps(detail) if detail else ''))
+
+
+def store_digests(session: Session, model_hash: str, digests: dict[str, str] | None) -> None:
+    rows = [{'model_id': model_hash, 'algorithm': algorithm, 'digest': digest.lower()}
+            for algorithm, digest in ({'sha256': model_hash} | (digests or {})).items()]
+    statement = sqlite_insert(ModelDigest).values(rows)
+    session.execute(statement.on_conflict_do_update(index_elements=[ModelDigest.model_id, ModelDigest.algorithm],
+                                                    set_={'digest': statement.excluded.digest}))
+
+
+def model_in_scope(model_type: str, active_type_dir: str, subpath: str | None, recursive: bool = True):
+    # used on ModelInstallation joined with Model: the active folder is the installation's
+    type_dir = select(Directory.id).where(Directory.path == active_type_dir).scalar_subquery()
+    condition = and_(Model.type == model_type, ModelInstallation.active_dir_id == type_dir)
+    if not recursive:
+        return and_(condition, Model.relative_path == (subpath or '.'))
+    if subpath is None or subpath == '.':
+        return condition
+    return and_(condition, or_(Model.relative_path == subpath, Model.relative_path.startswith(subpath + '/')))
+
+
+def active_in(installation: str):
+    """
+    Subquery of the hashes of the models with active files in an installation.
+    """
+    return (select(Component.model_id)
+            .where(Component.installation == installation, Component.is_archive == False,  # noqa: E712
+                   Component.model_id != None)  # noqa: E711
+            .distinct())
+
+
+def collection_models(root_ids):
+    """
+    Build a subquery returning the hashes of all models in the collections selected by root_ids
+    (a select with a single column labelled 'id') and, transitively, in all their child collections.
+    UNION (rather than UNION ALL) in the recursive CTE makes cycles in the collection graph harmless.
+    """
+    closure = root_ids.cte('collection_closure', recursive=True)
+    closure = closure.union(
+        select(CollectionCollectionLink.child_collection_id)
+        .where(CollectionCollectionLink.master_collection_id == closure.c.id))
+    return (select(ModelCollectionLink.model_id)
+            .where(ModelCollectionLink.collection_id.in_(select(closure.c.id)))
+            .distinct())
+
+
+def clean_tag_names(tag_names: list[str]) -> list[str]:
+    return sorted({t.strip() for t in tag_names if len(t.strip()) > 0})
+
 
 def resolve_tags(session: Session, tag_names: list[str]) -> list[Tag]:
-    cleaned = list({t.strip() for t in tag_names if len(t.strip()) > 0})
+    cleaned = clean_tag_names(tag_names)
     if len(cleaned) == 0:
         return []
     known = {t.tag: t for t in session.exec(select(Tag).where(Tag.tag.in_(cleaned))).all()}
@@ -4,8 +4,49 @@
 # purpose: Database tables
 # ---------------------------------------------------------------------------
 
+from typing import ClassVar
 from sqlmodel import Field, Relationship, SQLModel, CheckConstraint
-from ..model.object_types import ComponentFileType
+from ..model.object_types import ComponentFileType, ChangeKind, DEFAULT_INSTALLATION
+from .directories import directories
+
+
+# ---------------------------------------------------------------------------
+# Directories
+# ---------------------------------------------------------------------------
+
+class Directory(SQLModel, table=True):
+    """
+    An interned directory path. Models and components refer to their directories by id, so that each path
+    is stored once; the unique index on path also serves "everything under a directory" as a range scan.
+    """
+    id: int | None = Field(default=None, primary_key=True)
+    path: str = Field(unique=True)
+
+
+def interned_path(id_field: str) -> property:
+    """
+    A directory path attribute stored as the id of its Directory row in id_field.
+    """
+    def get(instance) -> str | None:
+        dir_id = getattr(instance, id_field)
+        return None if dir_id is None else directories.path(dir_id)
+
+    def set(instance, value) -> None:
+        setattr(instance, id_field, directories.intern(str(value)))
+    return property(get, set)
+
+
+class InternedPaths:
+    """
+    Lets table models take their interned paths as constructor arguments, as if they were columns.
+    """
+    interned: ClassVar[tuple[str, ...]] = ()
+
+    def __init__(self, **data) -> None:
+        paths = {name: data.pop(name) for name in self.interned if name in data}
+        super().__init__(**data)
+        for name, value in paths.items():
+            setattr(self, name, value)
 
 
 # ---------------------------------------------------------------------------
@@ -46,29 +87,75 @@ class CollectionCollectionLink(SQLModel, table=True):
 # Models
 # ---------------------------------------------------------------------------
 
-class Model(SQLModel, table=True):
+class Model(InternedPaths, SQLModel, table=True):
+    interned: ClassVar[tuple[str, ...]] = ('active_type_dir', 'archive_type_dir')
     hash: str = Field(primary_key=True)
     name: str
     type: str
     relative_path: str
-    active_type_dir: str
-    archive_type_dir: str
+    active_dir_id: int | None = Field(default=None, foreign_key="directory.id", index=True)
+    archive_dir_id: int | None = Field(default=None, foreign_key="directory.id", index=True)
     is_active: bool
     is_archived: bool
     last_scan_id: str
+    last_used: float = Field(default=0.0, index=True)
+    # from the model file's header, where the format has one
+    architecture: str = Field(default='', index=True)
+    precision: str = Field(default='', index=True)
+    parameters: int = Field(default=0, index=True)
+    # tags changed in the catalog and not yet written to the model's sidecars; scans keep them meanwhile
+    tags_pending: bool = False
     components: list['Component'] = Relationship(back_populates="model", cascade_delete=True)
+    installations: list['ModelInstallation'] = Relationship(back_populates="model", cascade_delete=True)
+    digests: list['ModelDigest'] = Relationship(back_populates="model", cascade_delete=True)
 
     tags: list['Tag'] = Relationship(back_populates="models", link_model=TagModelLink)
     collections: list['Collection'] = Relationship(back_populates="models", link_model=ModelCollectionLink)
 
+    active_type_dir = interned_path('active_dir_id')
+    archive_type_dir = interned_path('archive_dir_id')
+
     def update_from(self, other) -> None:
         self.last_scan_id = other.last_scan_id
         self.name = other.name
         self.relative_path = other.relative_path
         self.is_active = other.is_active
-        self.active_type_dir = other.active_type_dir
-        self.archive_type_dir = other.archive_type_dir
+        self.active_dir_id = other.active_dir_id
+        self.archive_dir_id = other.archive_dir_id
         self.type = other.type
+        self.last_used = max(self.last_used, other.last_used)
+        self.architecture = other.architecture
+        self.precision = other.precision
+        self.parameters = other.parameters
+
+
+class ModelInstallation(InternedPaths, SQLModel, table=True):
+    """
+    A model as seen from one ComfyUI installation: the type folder it activates into there and the last
+    scan of the installation that found it. The model is active in the installation while it has active
+    components there.
+    """
+    interned: ClassVar[tuple[str, ...]] = ('active_type_dir',)
+    model_id: str = Field(primary_key=True, foreign_key="model.hash", ondelete="CASCADE")
+    installation: str = Field(primary_key=True)
+    active_dir_id: int | None = Field(default=None, foreign_key="directory.id", index=True)
+    last_scan_id: str = Field(index=True)
+
+    model: Model = Relationship(back_populates="installations")
+
+    active_type_dir = interned_path('active_dir_id')
+
+
+class ModelDigest(SQLModel, table=True):
+    """
+    A digest by which other tools know the model: its SHA-256 (also the model's key), AutoV2, BLAKE2b,
+    CRC32 and the like. Digests are lowercase hex, indexed so that a prefix is a range scan.
+    """
+    model_id: str = Field(primary_key=True, foreign_key="model.hash", ondelete="CASCADE")
+    algorithm: str = Field(primary_key=True)
+    digest: str = Field(index=True)
+
+    model: Model = Relationship(back_populates="digests")
 
 
 # ---------------------------------------------------------------------------
@@ -84,10 +171,38 @@ class Workflow(SQLModel, table=True):
     is_active: bool
     last_scan_id: str
     scan_errors: str
-    components: list['Component'] = Relationship(back_populates="workflow")
+    last_used: float = 0.0
+    components: list['Component'] = Relationship(back_populates="workflow", cascade_delete=True)
 
     tags: list['Tag'] = Relationship(back_populates="workflows", link_model=TagWorkflowLink)
     collections: list['Collection'] = Relationship(back_populates="workflows", link_model=WorkflowCollectionLink)
+    references: list['WorkflowModelReference'] = Relationship(back_populates="workflow", cascade_delete=True)
+
+    def update_from(self, other) -> None:
+        self.last_scan_id = other.last_scan_id
+        self.name = other.name
+        self.relative_path = other.relative_path
+        self.is_archived = other.is_archived
+        self.is_active = other.is_active
+        self.scan_errors = other.scan_errors
+        self.last_used = max(self.last_used, other.last_used)
+
+
+class WorkflowModelReference(SQLModel, table=True):
+    """
+    A model file referenced by a workflow node. The reference is kept as it appears in the workflow, a path
+    relative to the type folder, and resolved after each scan to the model with that file name and relative
+    path, in the reference's type folder where the node tells it; model_id stays empty until exactly one
+    model is found.
+    """
+    workflow_id: str = Field(primary_key=True, foreign_key="workflow.id", ondelete="CASCADE")
+    reference: str = Field(primary_key=True)
+    file_name: str = Field(index=True)
+    relative_path: str = '.'
+    model_type: str | None = None
+    model_id: str | None = Field(default=None, index=True, foreign_key="model.hash", ondelete="SET NULL")
+
+    workflow: Workflow = Relationship(back_populates="references")
 
 
 # ---------------------------------------------------------------------------
@@ -126,24 +241,32 @@ class Collection(SQLModel, table=True):
 # Component files
 # ---------------------------------------------------------------------------
 
-class Component(SQLModel, table=True):
+class Component(InternedPaths, SQLModel, table=True):
     """
     A file, part of a model or of a workflow.
     """
     __table_args__ = (CheckConstraint(
         "(model_id IS NOT NULL AND workflow_id IS NULL) OR (model_id IS NULL AND workflow_id IS NOT NULL)"),)
+    interned: ClassVar[tuple[str, ...]] = ('file_dir',)
     id: int | None = Field(default=None, primary_key=True)
     is_archive: bool
-    file_name: str
-    file_dir: str
+    file_name: str = Field(index=True)
+    dir_id: int | None = Field(default=None, foreign_key="directory.id", index=True)
     component_type: ComponentFileType
     last_scan_id: str
+    file_size: int = 0
+    # with the size, the stat signature under which the file's recorded hash is trusted without reading it
+    file_mtime_ns: int = 0
+    # the installation whose active folders hold the file; empty for archive files, which are shared
+    installation: str = Field(default='', index=True)
     model_id: int | None = Field(default=None, foreign_key="model.hash")
     workflow_id: int | None = Field(default=None, foreign_key="workflow.id")
 
     model: Model | None = Relationship(back_populates="components")
     workflow: Workflow | None = Relationship(back_populates="components")
 
+    file_dir = interned_path('dir_id')
+
 
 # ---------------------------------------------------------------------------
 # Tags
@@ -154,3 +277,63 @@ class Tag(SQLModel, table=True):
     models: list['Model'] | None = Relationship(back_populates="tags", link_model=TagModelLink)
     workflows: list['Workflow'] | None = Relationship(back_populates="tags", link_model=TagWorkflowLink)
     collections: list['Collection'] | None = Relationship(back_populates="tags", link_model=TagCollectionLink)
+
+
+# ---------------------------------------------------------------------------
+# Sidecar cache
+# ---------------------------------------------------------------------------
+
+class SidecarCache(SQLModel, table=True):
+    """
+    Last known contents of a metadata sidecar, valid while the file's mtime and size are unchanged. Keyed by
+    directory, as scans look up the sidecars of one directory at a time.
+    """
+    dir_id: int = Field(primary_key=True, foreign_key="directory.id")
+    file_name: str = Field(primary_key=True)
+    mtime_ns: int
+    size: int
+    content: str
+
+
+# ---------------------------------------------------------------------------
+# Scan runs and checkpoints
+# ---------------------------------------------------------------------------
+
+class ScanRun(SQLModel, table=True):
+    """
+    A scan that has been started. Until it completes, its checkpoints record the directories that are
+    fully saved, so that a cancelled or interrupted scan can be resumed.
+    """
+    id: str = Field(primary_key=True)
+    status: str
+    rehash: bool
+    started: float
+    scope: str = ''
+    in_flight: str = ''
+    installation: str = DEFAULT_INSTALLATION
+    checkpoints: list['ScanCheckpoint'] = Relationship(back_populates="scan", cascade_delete=True)
+
+
+class ScanCheckpoint(SQLModel, table=True):
+    scan_id: str = Field(primary_key=True, foreign_key="scanrun.id", ondelete="CASCADE")
+    directory: str = Field(primary_key=True)
+
+    scan: ScanRun = Relationship(back_populates="checkpoints")
+
+
+# ---------------------------------------------------------------------------
+# Change log
+# ---------------------------------------------------------------------------
+
+class ModelChange(SQLModel, table=True):
+    """
+    An entry of the append-only log of model changes, for clients that poll for what changed since the
+    sequence number they last saw. Removed models keep their entries, so there is no foreign key; sequence
+    numbers are never reused, even after old entries have been compacted away.
+    """
+    __table_args__ = {'sqlite_autoincrement': True}
+    seq: int | None = Field(default=None, primary_key=True)
+    model_id: str = Field(index=True)
+    kind: ChangeKind
+    # JSON: the files added and removed for FILES changes, empty otherwise
+    detail: str = ''
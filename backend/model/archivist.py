@@ -4,10 +4,23 @@
 # purpose: Main service
 # ---------------------------------------------------------------------------
 
+import json
 import logging
+import threading
+from pathlib import Path
 
 from ..db.repository import Repository
-from .scanner import scanner, ScanStatus
+from .scanner import scanner, Scanner, ScanStatus, ScanScope
+from .file_handler import plan_model_move, move_files, check_capacity, check_destinations
+from .io_profiles import io_profiles
+from .digests import validate
+from .thumbnails import thumbnails, IMAGE_SUFFIXES
+from .object_types import ArchivistException, ArchivistError, DEFAULT_INSTALLATION, ComponentFileType
+from .policy import select_for_archiving
+from .duplicates import iter_model_files, find_duplicates, redundant_copies, deduplicate
+from .catalog_snapshot import snapshot_lines, export_catalog, import_catalog, open_snapshot
+from .sidecars import SidecarStore, sidecar_writers
+from .jobs import jobs
 
 logger = logging.getLogger('model_archivist')
 
@@ -21,26 +34,99 @@ class ArchivistService:
         self.repo = None
         self.is_first_run = None
         self.model_types = None
+        self.installations = None
+        self.scanners = {DEFAULT_INSTALLATION: scanner}
         self.workflow_locations = None
         self.file_handler = None
         self.scan_id = None
+        self.sidecar_lock = threading.Lock()
 
     def attach(self, config, repo: Repository) -> None:
         self.config = config
         self.repo = repo
         self.is_first_run = repo.is_first_run
+        self.model_types = config.model_folders
+        self.installations = config.installation_folders or {DEFAULT_INSTALLATION: config.model_folders}
+        self.scanners = {name: scanner if name == DEFAULT_INSTALLATION else Scanner(name)
+                         for name in self.installations}
+        self.workflow_locations = config.workflow_folders
+        validate(config.options.digests)
+        io_profiles.configure({config.path_from_string(path): name for path, name in config.io.profiles.items()},
+                              config.io.probe)
+        thumbnails.attach(config.path_from_string(config.thumbnails.cache), config.thumbnails.sizes,
+                          config.thumbnails.max_bytes, config.thumbnails.workers)
+        if config.policy.auto_archive:
+            for name, installation_scanner in self.scanners.items():
+                installation_scanner.on_complete = lambda scan_id, name=name: self.apply_policy(False, name)
 
-    def scan(self, rehash: bool = False):
-        self.scan_id = scanner.start(self.model_types, self.workflow_locations, rehash)
+    def scan(self, rehash: bool = False, scope: ScanScope | None = None,
+             installation: str = DEFAULT_INSTALLATION) -> str | None:
+        """
+        Start a scan of one installation. Only the default installation's scan covers the workflows.
+        """
+        self.scan_id = self.get_scanner(installation).start(self.installations[installation],
+                                                            self.installation_workflows(installation),
+                                                            rehash, scope=scope)
+        return self.scan_id
 
-    def get_models(self, ordered=True, tags=False, components=False) -> list:
+    def get_scanner(self, installation: str) -> Scanner:
+        if installation not in self.scanners:
+            raise ArchivistException(ArchivistError.UNKNOWN_INSTALLATION, installation)
+        return self.scanners[installation]
+
+    def installation_workflows(self, installation: str):
+        return self.workflow_locations if installation == DEFAULT_INSTALLATION else None
+
+    def prioritise_scan(self, scan_id: str, types: list[str]) -> bool:
+        return any(s.prioritise(scan_id, types) for s in self.scanners.values())
+
+    def status(self, scan_id: str) -> dict | None:
+        return next((status for status in (s.get_status(scan_id) for s in self.scanners.values())
+                     if status is not None), None)
+
+    def pause_scan(self, scan_id: str) -> bool:
+        return any(s.pause(scan_id) for s in self.scanners.values())
+
+    def cancel_scan(self, scan_id: str) -> bool:
+        return any(s.cancel(scan_id) for s in self.scanners.values())
+
+    def resume_scan(self, scan_id: str) -> bool:
+        """
+        Continue a paused scan, or restart a cancelled or interrupted one from its checkpoints.
+        """
+        if any(s.resume(scan_id) for s in self.scanners.values()):
+            return True
+        found = self.repo.get_scan_run(scan_id)
+        if found is None or found[0].installation not in self.scanners:
+            return False
+        installation = found[0].installation
+        self.scan_id = self.scanners[installation].start(self.installations[installation],
+                                                         self.installation_workflows(installation),
+                                                         resume_id=scan_id)
+        return self.scan_id is not None
+
+    def get_installations(self) -> list[dict]:
+        return [{'name': name, 'types': sorted(folders),
+                 'scanning': self.scanners[name].status != ScanStatus.INACTIVE}
+                for name, folders in self.installations.items()]
+
+    def get_installation_models(self, installation: str) -> list[dict]:
+        self.get_scanner(installation)
+        return [{'hash': model.hash, 'name': model.name, 'type': model.type}
+                for model in self.repo.get_installation_models(installation)]
+
+    def get_models(self, ordered=True, tags=False, components=False, architecture: str | None = None,
+                   precision: str | None = None, hashes: list[str] | None = None) -> list:
         result = []
-        for model in self.repo.get_models(ordered):
+        for model in self.repo.get_models(ordered, architecture, precision, hashes):
             json_model = {'hash': model.hash,
                           'name': model.name,
                           'type': self.config.model_types.get(model.type, model.type),
                           'active': model.is_active,
-                          'archived': model.is_archived}
+                          'archived': model.is_archived,
+                          'architecture': model.architecture,
+                          'precision': model.precision,
+                          'parameters': model.parameters}
             if tags:
                 json_model['tags'] = [_.tag for _ in model.tags]
             if components:
@@ -53,8 +139,284 @@ class ArchivistService:
             result.append(json_model)
         return result
 
+    def last_change(self) -> int:
+        return self.repo.last_change()
+
+    def get_changes(self, since: int, limit: int) -> dict:
+        """
+        What changed in the catalog after a sequence number (see the X-Change-Seq header of /models): the
+        change log entries, and the current state, with tags, of the models they concern that still exist.
+        A client updates or adds the models returned and drops the other models named in the changes, then
+        asks again from the last sequence number. If the log no longer reaches back to the given number, or
+        comes from another database, the answer is not complete and the client has to fetch /models again.
+        """
+        changes, first, last = self.repo.get_changes(since, limit)
+        if since > last or since < first - 1:
+            return {'complete': False, 'last': last, 'more': False, 'changes': [], 'models': []}
+        hashes = list(dict.fromkeys(change.model_id for change in changes))
+        return {'complete': True,
+                'last': changes[-1].seq if changes else since,
+                'more': len(changes) == limit,
+                'changes': [{'seq': change.seq, 'hash': change.model_id, 'kind': str(change.kind),
+                             'detail': json.loads(change.detail) if change.detail else None} for change in changes],
+                'models': self.get_models(tags=True, hashes=hashes) if hashes else []}
+
+    def get_model_examples(self, model_hash: str) -> list[dict]:
+        """
+        The model's example images, each with the digest that names its thumbnails. Thumbnails that are
+        missing are queued, so that they are usually ready by the time the browser asks for them.
+        """
+        examples = []
+        for model in self.repo.get_models_by_hash([model_hash]):
+            for component in model.components:
+                path = Path(component.file_dir) / component.file_name
+                if component.component_type != ComponentFileType.EXAMPLE or path.suffix.lower() not in IMAGE_SUFFIXES:
+                    continue
+                try:
+                    digest = thumbnails.register(path)
+                except OSError:
+                    continue
+                thumbnails.prefetch(digest)
+                examples.append({'name': component.file_name, 'digest': digest, 'sizes': thumbnails.sizes})
+        return examples
+
+    def find_by_digest(self, value: str, algorithm: str | None = None) -> list[dict]:
+        """
+        The models known by a digest of any algorithm, or a prefix of one, as other tools report them.
+        """
+        if algorithm is not None:
+            validate([algorithm])
+        matches = self.repo.find_by_digest(value, algorithm)
+        models = {model.hash: model for model in self.repo.get_models_by_hash(list({m[0] for m in matches}))}
+        return [{'hash': model_hash, 'name': models[model_hash].name, 'type': models[model_hash].type,
+                 'algorithm': matched, 'digest': digest}
+                for model_hash, matched, digest in matches if model_hash in models]
+
+    def get_sizes(self, group: str) -> list:
+        """
+        Bytes per model, type, root or collection. The roots are the folders holding the type folders of each
+        installation, and of the archive.
+        """
+        roots = {}
+        for installation, folders in self.installations.items():
+            for pairs in folders.values():
+                for active, archive in pairs:
+                    roots.setdefault(installation, set()).add(str(Path(active).parent))
+                    roots.setdefault('', set()).add(str(Path(archive).parent))
+        return self.repo.get_sizes(group, {place: sorted(paths) for place, paths in roots.items()})
+
     def get_tags(self, target: str, offset: int, limit: int) -> list:
         return [tag.tag for tag in self.repo.get_tags(target, offset, limit)]
 
+    def retag_models(self, add: list[str], remove: list[str], replace: bool = False, hashes: list[str] | None = None,
+                     tag: str | None = None, model_type: str | None = None) -> dict:
+        """
+        Add and remove tags on a selection of models; see Repository.retag_models. With update_json_metadata,
+        the models' sidecars are brought in line by a background job, so that a rescan keeps the new tags.
+        """
+        # only the models whose tags changed need their sidecars written
+        changed = self.repo.retag_models(add, remove, replace, hashes, tag, model_type)
+        result = {'models': len(changed), 'job': None}
+        if changed and self.config.options.update_json_metadata:
+            result['job'] = jobs.submit('sidecar-tags', self.write_sidecar_tags, changed)
+        return result
+
+    def write_sidecar_tags(self, hashes: list[str]) -> dict:
+        """
+        Write the catalogued tags of the given models to their sidecars, in atomic batched writes. Jobs may run
+        side by side, but sidecar writes are serialized by the sidecar lock and the tags are read under it, so
+        the sidecars end up with the latest tags even if retag requests overtake each other. The job waits for
+        running scans, and scans starting meanwhile wait for it, as they write sidecars too.
+        """
+        with sidecar_writers.job(), self.sidecar_lock:
+            store = SidecarStore()
+            written = 0
+            for path, tags in self.repo.take_sidecar_tags(hashes):
+                data = store.read(path)
+                if data is None or data.get('tags') == tags:
+                    continue
+                data['tags'] = tags
+                store.write(path, data)
+                written += 1
+            store.flush()
+            self.repo.save_sidecar_cache(store.take_changed())
+        logger.info(f'ArchivistService.write_sidecar_tags: {written} sidecars updated')
+        return {'sidecars': written}
+
+    def activate_collection(self, collection_id: int, exclusive: bool = False, dry_run: bool = False,
+                            installation: str = DEFAULT_INSTALLATION) -> dict:
+        """
+        Make every model in a collection and its child collections active in an installation, moving only
+        the models that are not active there yet. With exclusive, also archive the installation's active
+        models that do not belong to an active collection.
+        """
+        self.get_scanner(installation)
+        to_activate, to_archive = self.repo.get_collection_plan(collection_id, exclusive, installation)
+        result = self.execute_plan(to_activate, to_archive, dry_run, installation)
+        result['collection'] = collection_id
+        if not dry_run:
+            self.repo.set_collection_active(collection_id, True)
+        return result
+
+    def get_workflow_models(self, workflow_id: str) -> dict:
+        return {'models': [model.hash for model in self.repo.get_workflow_models(workflow_id)],
+                'unresolved': self.repo.get_unresolved_references(workflow_id)}
+
+    def get_model_workflows(self, model_hash: str) -> list:
+        return [{'id': workflow.id, 'name': workflow.name} for workflow in self.repo.get_model_workflows(model_hash)]
+
+    def activate_workflow(self, workflow_id: str, dry_run: bool = False) -> dict:
+        """
+        Make every model referenced by a workflow active.
+        """
+        to_activate = [model for model in self.repo.get_workflow_models(workflow_id)
+                       if not is_active_in(model, DEFAULT_INSTALLATION)]
+        result = self.execute_plan(to_activate, [], dry_run)
+        result['workflow'] = workflow_id
+        return result
+
+    def move_models(self, hashes: list[str], to_archive: bool, dry_run: bool = False,
+                    installation: str = DEFAULT_INSTALLATION) -> dict:
+        """
+        Move the given models to the archive or to an installation's active branch. A dry run reports the
+        moves and whether each destination filesystem has room for them.
+        """
+        self.get_scanner(installation)
+        models = [model for model in self.repo.get_models_by_hash(hashes)
+                  if is_active_in(model, installation) == to_archive]
+        if to_archive:
+            return self.execute_plan([], models, dry_run, installation)
+        return self.execute_plan(models, [], dry_run, installation)
+
+    def active_type_dir(self, model, installation: str) -> str | None:
+        """
+        The installation's type folder paired with the model's archive folder.
+        """
+        if installation == DEFAULT_INSTALLATION:
+            return None
+        for active, archive in self.installations[installation].get(model.type, ()):
+            if str(archive) == model.archive_type_dir:
+                return str(active)
+        raise ArchivistException(ArchivistError.UNKNOWN_INSTALLATION,
+                                 f'{installation} has no {model.type} folder for {model.archive_type_dir}')
+
+    def find_duplicates(self, action: str | None = None) -> dict:
+        """
+        Look for identical model files across all active, archive and extra model folders. A model active in
+        an installation and also archived is kept that way on purpose; only further copies within the same
+        installation, or within the archive, are reported. With an action ('hardlink' or 'delete'), every
+        copy but the first of each group is replaced by a hard link or removed, along with its other files
+        and its catalog entries; active folders come first, so the active copy is the one kept.
+        """
+        places = [(Path(active), installation) for installation, folders in self.installations.items()
+                  for pairs in folders.values() for active, archive in pairs]
+        places += [(Path(archive), '') for folders in self.installations.values()
+                   for pairs in folders.values() for active, archive in pairs]
+        roots = list(dict.fromkeys(root for root, place in places))
+        places = sorted(((root.resolve(), place) for root, place in places), key=lambda p: -len(p[0].parts))
+
+        def place_of(path: Path) -> str:
+            return next((place for root, place in places if path.is_relative_to(root)), '')
+
+        duplicates = redundant_copies(find_duplicates(iter_model_files(roots, self.config.models.extensions)),
+                                      place_of)
+        result = {'groups': [{'size': group['size'], 'hash': group['hash'], 'files': [str(f) for f in group['files']]}
+                             for group in duplicates],
+                  'wasted': sum(group['size'] * (len(group['files']) - 1) for group in duplicates)}
+        if action is not None:
+            result['changed'] = deduplicate(duplicates, action, self.remove_model_file)
+        return result
+
+    def remove_model_file(self, path: Path) -> list[str]:
+        """
+        Delete a model file together with the other files of its model in that folder (sidecar, preview,
+        extras), and drop their catalog entries. Returns the paths deleted.
+        """
+        model_hash, components = self.repo.get_model_file_components(path)
+        files = [Path(c.file_dir) / c.file_name for c in components] or [path]
+        with self.sidecar_lock:
+            for file in files:
+                logger.info(f'ArchivistService.remove_model_file: deleting {file}')
+                file.unlink(missing_ok=True)
+        if components:
+            self.repo.remove_components(model_hash, [c.id for c in components])
+        return [str(file) for file in files]
+
+    def catalog_lines(self):
+        return snapshot_lines(self.repo)
+
+    def export_catalog(self, path: Path) -> int:
+        return export_catalog(self.repo, path)
+
+    def import_catalog(self, lines) -> dict:
+        """
+        Restore a catalog snapshot into the empty database; see catalog_snapshot.import_catalog. The next scan
+        takes the hashes of unchanged model files from the catalog instead of reading the files.
+        """
+        return import_catalog(self.repo, lines)
+
+    def import_catalog_file(self, path: Path, remove: bool = False) -> dict:
+        """
+        Restore a catalog snapshot from a file, read line by line; with remove, the file is deleted afterwards.
+        """
+        try:
+            with open_snapshot(path, 'r') as f:
+                return self.import_catalog(f)
+        finally:
+            if remove:
+                path.unlink(missing_ok=True)
+
+    def apply_policy(self, dry_run: bool = True, installation: str = DEFAULT_INSTALLATION) -> dict:
+        """
+        Archive the least recently used models until an installation's active branch is within the configured
+        budgets, which hold for each installation on its own. Models in active collections are never archived.
+        With dry_run, only report what would be moved.
+        """
+        self.get_scanner(installation)
+        policy = self.config.policy
+        usage = self.repo.get_active_usage(installation)
+        selected = select_for_archiving(usage, policy.type_budgets, policy.active_budget,
+                                        self.repo.iter_least_recently_used(installation))
+        result = self.execute_plan([], self.repo.get_models_by_hash(selected), dry_run, installation)
+        result['installation'] = installation
+        result['usage'] = usage
+        return result
+
+    def execute_plan(self, to_activate: list, to_archive: list, dry_run: bool,
+                     installation: str = DEFAULT_INSTALLATION) -> dict:
+        """
+        Move the files of the given models to the installation's active branch or to the archive and
+        record the moves.
+        """
+        plan = [(model, False, plan_model_move(model, False, installation, self.active_type_dir(model, installation)))
+                for model in to_activate]
+        plan += [(model, True, plan_model_move(model, True, installation)) for model in to_archive]
+        result = {'activate': [model.hash for model in to_activate],
+                  'archive': [model.hash for model in to_archive],
+                  'moves': [{'hash': model.hash, 'source': str(source), 'destination': str(destination)}
+                            for model, is_archive, moves in plan
+                            for component_id, source, destination, size in moves]}
+        result['capacity'] = check_capacity([move for model, is_archive, moves in plan for move in moves])
+        if dry_run:
+            return result
+        short = [entry for entry in result['capacity'] if not entry['ok']]
+        if short:
+            raise ArchivistException(ArchivistError.INSUFFICIENT_SPACE,
+                                     ', '.join(f'{e["path"]} needs {e["required"]}, has {e["free"]}' for e in short))
+        check_destinations([move for model, is_archive, moves in plan for move in moves])
+        for model, is_archive, moves in plan:
+            logger.info(f'ArchivistService.execute_plan: {"archiving" if is_archive else "activating"} {model.name}')
+            moved = {}
+            try:
+                move_files(moves, moved)
+            finally:
+                # whatever has moved is recorded, even if a later move failed
+                if moved:
+                    self.repo.relocate_components(model.hash, moved, is_archive, installation)
+        return result
+
+
+def is_active_in(model, installation: str) -> bool:
+    return any(not c.is_archive and c.installation == installation for c in model.components)
 
 archivist = ArchivistService()
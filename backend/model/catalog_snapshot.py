@@ -0,0 +1,109 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: catalog_snapshot.py
+# purpose: Exporting and importing the catalog as JSON lines
+# ---------------------------------------------------------------------------
+
+import os
+import gzip
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Iterable
+from .object_types import ArchivistException, ArchivistError, ComponentFileType
+
+logger = logging.getLogger('model_archivist')
+
+FORMAT = 'model-archivist-catalog'
+VERSION = 1
+
+
+def open_snapshot(path: Path, mode: str):
+    # .gz snapshots are compressed; a 10k model catalog shrinks to a few MB
+    if path.suffix == '.gz':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return path.open(mode, encoding='utf-8')
+
+
+def snapshot_lines(repo) -> Iterable[str]:
+    """
+    The catalog as JSON lines: a header, then one record per model, workflow and collection. Files are
+    described by their stat signature as of the scan that hashed them; nothing is read from disk.
+    """
+    yield json.dumps({'kind': 'header', 'format': FORMAT, 'version': VERSION, 'created': time.time()}) + '\n'
+    for record in repo.catalog_records():
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def export_catalog(repo, path: Path) -> int:
+    # the suffix is kept, as it decides on compression
+    temp = path.with_name(f'.{os.getpid()}.{path.name}')
+    count = 0
+    try:
+        with open_snapshot(temp, 'w') as f:
+            for line in snapshot_lines(repo):
+                f.write(line)
+                count += 1
+        os.replace(temp, path)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+    logger.info(f'CatalogSnapshot.export_catalog: {count - 1} records written to {path}')
+    return count - 1
+
+
+def import_catalog(repo, lines: Iterable[str]) -> dict:
+    """
+    Restore a catalog snapshot into an empty database. A model file is trusted, with the hashes recorded for
+    it, if its size and mtime on disk are those in the snapshot; other files only have to exist. Files that
+    fail the check are left out, as are models left without a model file, so that the next scan finds and
+    hashes them. Returns counts of what was restored and left out.
+    """
+    scan_id = f'import-{int(time.time())}'
+    report = {'models': 0, 'workflows': 0, 'collections': 0, 'changed': 0, 'missing': 0}
+    records = iter_records(lines)
+
+    def verified():
+        for record in records:
+            if record['kind'] in ('model', 'workflow'):
+                main_type = ComponentFileType.MODEL if record['kind'] == 'model' else ComponentFileType.WORKFLOW
+                record['components'] = verify_components(record['components'], report)
+                if not any(c['component_type'] == main_type for c in record['components']):
+                    continue
+            report[record['kind'] + 's'] += 1
+            yield record
+
+    repo.restore_catalog(verified(), scan_id)
+    logger.info(f'CatalogSnapshot.import_catalog: {report}')
+    return report
+
+
+def iter_records(lines: Iterable[str]) -> Iterable[dict]:
+    lines = iter(lines)
+    header = json.loads(next(lines, '{}') or '{}')
+    if header.get('format') != FORMAT or header.get('version', 0) > VERSION:
+        raise ArchivistException(ArchivistError.INVALID_SNAPSHOT, f'{header.get("format")} {header.get("version")}')
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def verify_components(components: list[dict], report: dict) -> list[dict]:
+    kept = []
+    for component in components:
+        try:
+            stat = os.stat(Path(component['file_dir']) / component['file_name'])
+        except OSError:
+            report['missing'] += 1
+            continue
+        if component['component_type'] == ComponentFileType.MODEL:
+            if stat.st_size != component['file_size'] or stat.st_mtime_ns != component['file_mtime_ns']:
+                report['changed'] += 1
+                continue
+        else:
+            # sidecars, extras and workflows change without affecting a hash; they are taken as they are now
+            component['file_size'] = stat.st_size
+            component['file_mtime_ns'] = stat.st_mtime_ns
+        kept.append(component)
+    return kept
@@ -0,0 +1,77 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: digests.py
+# purpose: The digests a model file can be known by in other tools
+# ---------------------------------------------------------------------------
+
+import zlib
+import hashlib
+from .object_types import ArchivistException, ArchivistError
+
+# the catalog's own key; always computed
+PRIMARY = 'sha256'
+
+
+class CRC32:
+    """
+    zlib.crc32 behind the hashlib interface, so that it can be fed like the other hashers.
+    """
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def update(self, data) -> None:
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return f'{self.value:08x}'
+
+
+def blake3():
+    # an optional package; BLAKE2b from the standard library is the fallback for tools that accept either
+    try:
+        from blake3 import blake3 as hasher
+    except ImportError:
+        raise ArchivistException(ArchivistError.UNKNOWN_DIGEST, 'blake3 (install the blake3 package)')
+    return hasher(max_threads=1)
+
+
+HASHERS = {
+    'sha256': hashlib.sha256,
+    'blake2b': hashlib.blake2b,
+    'blake3': blake3,
+    'crc32': CRC32,
+}
+
+# digests that are a function of another one and cost no extra read: (source, derivation)
+DERIVED = {
+    # the short hash of A1111 and Civitai: the first ten hex digits of the SHA-256
+    'autov2': (PRIMARY, lambda digest: digest[:10]),
+}
+
+
+def validate(algorithms: list[str]) -> list[str]:
+    for name in algorithms:
+        if name not in HASHERS and name not in DERIVED:
+            raise ArchivistException(ArchivistError.UNKNOWN_DIGEST, name)
+    return algorithms
+
+
+def hashers_for(algorithms) -> dict:
+    """
+    Fresh hashers for everything that has to be read to produce the given digests.
+    """
+    names = {DERIVED[name][0] if name in DERIVED else name for name in validate(list(algorithms))}
+    return {name: HASHERS[name]() for name in sorted(names)}
+
+
+def derive(digests: dict[str, str], algorithms) -> dict[str, str]:
+    """
+    Add the derived digests that can be worked out from those given.
+    """
+    digests = dict(digests)
+    for name in algorithms:
+        if name in DERIVED and name not in digests and DERIVED[name][0] in digests:
+            source, derivation = DERIVED[name]
+            digests[name] = derivation(digests[source])
+    return digests
@@ -0,0 +1,139 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: duplicates.py
+# purpose: Duplicate model detection
+# ---------------------------------------------------------------------------
+
+import os
+import logging
+import hashlib
+from collections import defaultdict
+from typing import Callable, Iterable
+from pathlib import Path
+from .file_handler import compute_sha256
+from .io_profiles import keep_atime
+
+logger = logging.getLogger('model_archivist')
+
+PARTIAL_SPAN = 4 << 20
+
+
+def iter_model_files(roots: Iterable[Path], extensions: list[str]) -> Iterable[tuple[Path, os.stat_result]]:
+    """
+    Walk the roots and yield every model file with its stat result. Each root is visited once even if
+    several model types share it.
+    """
+    seen = set()
+    for root in roots:
+        root = root.resolve()
+        if root in seen or not root.is_dir():
+            continue
+        seen.add(root)
+        stack = [root]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False) and Path(entry.name).suffix in extensions:
+                        yield Path(entry.path), entry.stat(follow_symlinks=False)
+
+
+def partial_hash(path: Path, size: int, span: int = PARTIAL_SPAN) -> str:
+    """
+    Hash the first and the last span bytes of a file. For files up to twice the span this covers the
+    whole file.
+    """
+    h = hashlib.sha256()
+    with keep_atime(path), path.open('rb') as f:
+        h.update(f.read(span))
+        if size > 2 * span:
+            f.seek(size - span)
+        h.update(f.read(span))
+    return h.hexdigest()
+
+
+def find_duplicates(files: Iterable[tuple[Path, os.stat_result]], span: int = PARTIAL_SPAN) -> list[dict]:
+    """
+    Group identical files in three stages: by size, then by a hash of the head and tail of the file,
+    and only then by a full hash. Each stage only reads the files still in contention. Hard links to
+    the same inode count as one file.
+    """
+    by_size = defaultdict(list)
+    inodes = set()
+    for path, stat in files:
+        if stat.st_size == 0 or (stat.st_dev, stat.st_ino) in inodes:
+            continue
+        inodes.add((stat.st_dev, stat.st_ino))
+        by_size[stat.st_size].append(path)
+
+    duplicates = []
+    for size, same_size in by_size.items():
+        if len(same_size) < 2:
+            continue
+        by_partial = defaultdict(list)
+        for path in same_size:
+            by_partial[partial_hash(path, size, span)].append(path)
+        for partial, candidates in by_partial.items():
+            if len(candidates) < 2:
+                continue
+            if size <= 2 * span:
+                by_full = {partial: candidates}
+            else:
+                by_full = defaultdict(list)
+                for path in candidates:
+                    by_full[compute_sha256(path)].append(path)
+            for digest, paths in by_full.items():
+                if len(paths) > 1:
+                    logger.info(f'Duplicates.find_duplicates: {len(paths)} copies of {paths[0].name}')
+                    duplicates.append({'size': size,
+                                       'hash': digest if size > 2 * span else None,
+                                       'files': paths})
+    return duplicates
+
+
+def redundant_copies(duplicates: list[dict], place: Callable[[Path], str]) -> list[dict]:
+    """
+    Leave out the copies a library keeps on purpose: a model may be active in each installation and also
+    archived. Only further copies within one place (as named by place, e.g. an installation's active folders
+    or the archive) are redundant, so each group is split by place and places with a single copy are dropped.
+    """
+    redundant = []
+    for group in duplicates:
+        by_place = defaultdict(list)
+        for path in group['files']:
+            by_place[place(path)].append(path)
+        redundant += [group | {'files': paths} for paths in by_place.values() if len(paths) > 1]
+    return redundant
+
+
+def deduplicate(duplicates: list[dict], action: str,
+                remove: Callable[[Path], list[str]] | None = None) -> list[str]:
+    """
+    Keep the first file of each group and either delete the other copies or replace them with hard
+    links to the kept file. Copies on a different filesystem cannot be hard linked and are left alone.
+    A deleted copy is handed to remove, if given, to be taken out together with its other files.
+    Returns the paths that were changed.
+    """
+    changed = []
+    for group in duplicates:
+        keep, *copies = group['files']
+        for copy in copies:
+            if action == 'delete':
+                logger.info(f'Duplicates.deduplicate: deleting {copy}, keeping {keep}')
+                if remove is not None:
+                    changed += remove(copy)
+                    continue
+                copy.unlink()
+            elif action == 'hardlink':
+                if copy.stat().st_dev != keep.stat().st_dev:
+                    logger.warning(f'Duplicates.deduplicate: {copy} is on another filesystem than {keep}')
+                    continue
+                logger.info(f'Duplicates.deduplicate: linking {copy} to {keep}')
+                temp = copy.with_name(copy.name + '.archivist-link')
+                os.link(keep, temp)
+                os.replace(temp, copy)
+            else:
+                raise ValueError(action)
+            changed.append(str(copy))
+    return changed
@@ -7,10 +7,18 @@
 import logging
 from typing import Iterable
 from pathlib import Path
-import hashlib
+import os
+import time
 import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from itertools import chain
 from .object_types import ComponentFileType, ArchivistException, ArchivistError
+from .metrics import metrics
+from .sidecars import write_json_atomic
+from .io_profiles import io_profiles, keep_atime
+from .model_headers import read_header
+from .digests import PRIMARY, DERIVED, hashers_for, derive
 
 logger = logging.getLogger('model_archivist')
 
@@ -30,115 +38,337 @@ def match_folders(root_1: Path, root_2: Path, dir_1: Path, sub_dirs: list[str])
     return relative_path
 
 
-def scan_models(active_root: Path, archive_root: Path, extensions: list[str], rehash: bool) -> Iterable:
+class ScannedModel:
     """
-    Scan a directory with subdirectories and return all model and sidecar files found.
-    The active and archive directories are scanned in parallel.
+    A model found by scan_models: the sidecar's view of it and its files, as (path, type, is_archive) tuples.
+    Slotted, as scans create one per model file and hand them on to the database stage.
+    """
+    __slots__ = ('hash', 'name', 'tags', 'header', 'digests', 'relative_path', 'files')
+
+    def __init__(self, model_hash: str, name: str, tags: list[str], header: dict, digests: dict[str, str],
+                 relative_path: str) -> None:
+        self.hash = model_hash
+        self.name = name
+        self.tags = tags
+        self.header = header
+        self.digests = digests
+        self.relative_path = relative_path
+        self.files: list[tuple[Path, ComponentFileType, bool]] = []
+
+
+def list_files(directory: Path) -> list[tuple[str, int]]:
+    """
+    (name, inode) of the files in a directory, in the order they should be read: by inode on devices whose
+    profile asks for it. Both come from the directory listing, without a stat per file.
+    """
+    with os.scandir(directory) as entries:
+        files = [(entry.name, entry.inode()) for entry in entries if entry.is_file()]
+    return io_profiles.order(directory, files)
+
+
+def scan_models(active_root: Path, archive_root: Path, extensions: list[str], rehash: bool,
+                progress=None, sidecars=None, completed: set[str] | None = None,
+                subpath: Path | None = None, known=None, algorithms: list[str] | None = None,
+                directory_done=None, errors: list[str] | None = None,
+                recheck: set[str] | None = None) -> Iterable[ScannedModel]:
+    """
+    Scan a directory with subdirectories and yield the models found, one at a time: a directory is held
+    as the names of its files, and each model is hashed, yielded and forgotten before the next one is read.
+    If given, progress (a ScanProgress) is updated as directories are walked and files hashed; sidecars
+    (a SidecarStore) caches sidecar reads and batches sidecar writes. Once all models of a directory have
+    been consumed, directory_done is called with it (by default, progress.directory_done). Directories
+    listed in completed are walked through but not scanned again. With subpath, only that part of the type
+    folder (relative to both roots) is scanned. known and algorithms are passed on to ensure_metadata.
+    Problems that concern no single model, such as a copy of a model under another name, go to errors.
+    Files in recheck, typically those whose hashing an earlier run cut off, are hashed again whatever their
+    sidecar says, and taken out of the set once done.
     """
     active_examples = active_root.parent / 'examples'
     archive_examples = archive_root.parent / 'examples'
+    if directory_done is None and progress is not None:
+        directory_done = progress.directory_done
+    start = active_root
+    if subpath is not None:
+        start = active_root / subpath
+        start.mkdir(parents=True, exist_ok=True)
+        (archive_root / subpath).mkdir(parents=True, exist_ok=True)
 
-    logger.info(f'FileHandler.scan_models: scanning from {active_root}')
-    for active_dir, subdirs, filenames in active_root.walk():
-        relative_path = match_folders(active_root, archive_root, active_dir, subdirs)
-        archive_dir = archive_root / relative_path
-
-        # Make a list of all files. Model files in archive and active folders match by hash, but they
-        # must also match by filename. Extra files are matched by file stem, examples also by hash, but they
-        # are in a different branch of the directory tree.
-        models = {}
-        others = {}
+    logger.info(f'FileHandler.scan_models: scanning from {start}')
+    for active_dir, subdirs, filenames in start.walk():
+        if progress is not None:
+            progress.checkpoint()
+        if completed is not None and str(active_dir) in completed:
+            continue
+        with metrics.timer('archivist_walk_seconds', 'Time to list and match one active/archive directory pair'):
+            relative_path = match_folders(active_root, archive_root, active_dir, subdirs)
+            archive_dir = archive_root / relative_path
+            listing = [(name, False) for name, inode in list_files(active_dir)] + \
+                      [(name, True) for name, inode in list_files(archive_dir)]
 
+        # Group the files by stem; a stem with model files makes a model of each distinct hash among them,
+        # with the stem's other files as extras. Model files in archive and active folders match by hash, but
+        # they must also match by filename; examples also match by hash, in a different branch of the tree.
         logger.info(f'FileHandler.scan_models: current dir {active_dir}')
-        for file_path, is_archive in chain(((active_dir / fn, False) for fn in filenames),
-                                           ((f.resolve(), True) for f in archive_dir.iterdir() if f.is_file())):
-            stem = file_path.stem
-            if file_path.suffix in extensions:
+        if progress is not None:
+            progress.directory(active_dir)
+        groups: dict[str, list[tuple[str, bool]]] = {}
+        stems = {}
+        for name, is_archive in listing:
+            stem, suffix = os.path.splitext(name)
+            groups.setdefault(stem, []).append((name, is_archive))
+            if suffix in extensions:
+                stems.setdefault(stem, None)
+        if progress is not None:
+            progress.file(len(listing) - sum(len(groups[stem]) for stem in stems))
+
+        # the stem each hash was first seen under, to catch copies under another name
+        seen: dict[str, str] = {}
+        for stem in stems:
+            records: dict[str, ScannedModel] = {}
+            for name, is_archive in groups[stem]:
+                if progress is not None:
+                    progress.checkpoint()
+                    progress.file()
+                if os.path.splitext(name)[1] not in extensions:
+                    continue
+                file_path = (archive_dir / name).resolve() if is_archive else active_dir / name
                 metadata_file = file_path.with_suffix('.metadata.json')
-                metadata = ensure_metadata(file_path, metadata_file, rehash)
+                again = recheck is not None and str(file_path) in recheck
+                metadata = ensure_metadata(file_path, metadata_file, rehash or again, progress, sidecars, known,
+                                           algorithms)
+                if again:
+                    recheck.discard(str(file_path))
                 model_hash = metadata['sha256']
-                if model_hash not in models:
-                    models[model_hash] = {'stem': stem,
-                                          'hash': model_hash,
-                                          'name': metadata.get('model_name', stem),
-                                          'tags': metadata.get('tags', []),
-                                          'relative_path': str(relative_path),
-                                          'files': []}
-                elif models[model_hash]['stem'] != stem:
-                    raise ArchivistException(ArchivistError.INCONSISTENT_FILENAME, str(file_path))
-                models[model_hash]['files'].append((file_path, ComponentFileType.MODEL, is_archive))
-                models[model_hash]['files'].append((metadata_file, ComponentFileType.METADATA, is_archive))
-            elif not file_path.name.endswith('.metadata.json'):
-                if stem not in others:
-                    others[stem] = [(file_path, ComponentFileType.EXTRA, is_archive)]
-                else:
-                    others[stem].append((file_path, ComponentFileType.EXTRA, is_archive))
-
-        # Complete and return all models collected
-        for model_hash, model_dict in models.items():
-            stem = model_dict['stem']
-            logger.info(f'FileHandler.scan_models: finalizing model {stem}')
-            if stem in others:
-                for file_path, component_type, is_archive in others[stem]:
-                    model_dict['files'].append((file_path, component_type, is_archive))
-            examples_dir = active_examples / model_hash
-            if examples_dir.is_dir():
-                for example in examples_dir.iterdir():
-                    model_dict['files'].append((example.resolve(), ComponentFileType.EXAMPLE, False))
-            examples_dir = archive_examples / model_hash
-            if examples_dir.is_dir():
-                for example in examples_dir.iterdir():
-                    model_dict['files'].append((example.resolve(), ComponentFileType.EXAMPLE, True))
-
-            yield model_dict
-
-
-def scan_workflows(active_root: Path, archive_root: Path) -> Iterable:
+                if seen.setdefault(model_hash, stem) != stem:
+                    # a copy under another name: report it and leave it to the duplicate finder
+                    error = ArchivistException(ArchivistError.INCONSISTENT_FILENAME, str(file_path))
+                    logger.warning(f'FileHandler.scan_models: {error}')
+                    if errors is not None:
+                        errors.append(str(error))
+                    continue
+                if model_hash not in records:
+                    records[model_hash] = ScannedModel(model_hash, metadata.get('model_name', stem),
+                                                       metadata.get('tags', []), metadata.get('header') or {},
+                                                       derive(sidecar_digests(metadata), algorithms or []),
+                                                       str(relative_path))
+                records[model_hash].files.append((file_path, ComponentFileType.MODEL, is_archive))
+                records[model_hash].files.append((metadata_file, ComponentFileType.METADATA, is_archive))
+
+            for model_hash, record in records.items():
+                logger.info(f'FileHandler.scan_models: finalizing model {stem}')
+                for name, is_archive in groups[stem]:
+                    if os.path.splitext(name)[1] not in extensions and not name.endswith('.metadata.json'):
+                        file_path = (archive_dir / name).resolve() if is_archive else active_dir / name
+                        record.files.append((file_path, ComponentFileType.EXTRA, is_archive))
+                for examples_root, is_archive in ((active_examples, False), (archive_examples, True)):
+                    examples_dir = examples_root / model_hash
+                    if examples_dir.is_dir():
+                        for example in examples_dir.iterdir():
+                            record.files.append((example.resolve(), ComponentFileType.EXAMPLE, is_archive))
+                yield record
+
+        if directory_done is not None:
+            directory_done(active_dir)
+
+
+def scan_workflows(active_root: Path, archive_root: Path, extensions: list[str], max_workers: int = 4,
+                   progress=None, completed: set[str] | None = None) -> Iterable:
+    """
+    Scan the workflow folders and return every workflow found, together with the model files it
+    references. Files within a directory are parsed in parallel.
+    """
     logger.info(f'FileHandler.scan_workflows: scanning from {active_root}')
-    for active_dir, subdirs, filenames in active_root.walk():
-        relative_path = match_folders(active_root, archive_root, active_dir, subdirs)
-        archive_dir = archive_root / relative_path
-        workflows = {}
-        for file_path, is_archive in chain(((active_dir / fn, False) for fn in filenames),
-                                           ((f.resolve(), True) for f in archive_dir.iterdir() if f.is_file())):
-            stem = file_path.stem
-            if file_path.suffix in ('json',):
-                data = json.loads(file_path.read_text(encoding='utf-8'))
-                # sanity check that this is a workflow file
-                if 'id' not in data or 'revision' not in data or 'version' not in data:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for active_dir, subdirs, filenames in active_root.walk():
+            if progress is not None:
+                progress.checkpoint()
+            if completed is not None and str(active_dir) in completed:
+                continue
+            relative_path = match_folders(active_root, archive_root, active_dir, subdirs)
+            archive_dir = archive_root / relative_path
+            candidates = [(file_path, is_archive) for file_path, is_archive in
+                          chain(((active_dir / fn, False) for fn in filenames),
+                                ((f.resolve(), True) for f in archive_dir.iterdir() if f.is_file()))
+                          if file_path.suffix == '.json']
+            if progress is not None:
+                progress.directory(active_dir)
+                progress.file(len(candidates))
+            workflows = {}
+            parsed = executor.map(lambda fp: read_workflow(fp, extensions), (fp for fp, _ in candidates))
+            for (file_path, is_archive), data in zip(candidates, parsed):
+                if data is None:
                     continue
-                model_id = data['id']
-                conf = data['config'] if 'config' in data else {}
-                name = conf['name'] if 'name' in conf else stem
-                tags = conf['tags'] if 'tags' in conf else []
-                if model_id not in workflows:
-                    workflows[model_id] = {'stem': stem,
-                                           'id': model_id,
-                                           'name': name,
-                                           'tags': tags,
-                                           'relative_path': str(relative_path),
-                                           'files': []}
-
-
-def compute_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
-    h = hashlib.sha256()
-    with path.open('rb') as f:
+                workflow_id = data['id']
+                if workflow_id not in workflows:
+                    workflows[workflow_id] = {'stem': file_path.stem,
+                                              'id': workflow_id,
+                                              'name': data['name'],
+                                              'tags': data['tags'],
+                                              'relative_path': str(relative_path),
+                                              'models': {},
+                                              'files': []}
+                for reference, model_type in data['models'].items():
+                    add_reference(workflows[workflow_id]['models'], reference, model_type)
+                workflows[workflow_id]['files'].append((file_path, ComponentFileType.WORKFLOW, is_archive))
+            yield from workflows.values()
+            if progress is not None:
+                progress.directory_done(active_dir)
+
+
+def read_workflow(file_path: Path, extensions: list[str]) -> dict | None:
+    """
+    Parse a workflow file and pick out the model files it references. Returns None if the file is
+    not a workflow.
+    """
+    try:
+        with keep_atime(file_path), file_path.open('rb') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as exc:
+        logger.warning(f'FileHandler.read_workflow: cannot parse {file_path}: {exc}')
+        return None
+    # sanity check that this is a workflow file
+    if not isinstance(data, dict) or 'id' not in data or 'version' not in data or 'nodes' not in data:
+        return None
+    conf = data.get('extra', {}).get('config', data.get('config', {}))
+    return {'id': data['id'],
+            'name': conf.get('name', file_path.stem),
+            'tags': conf.get('tags', []),
+            'models': workflow_model_references(data, extensions)}
+
+
+# the type folder core loader nodes pick their model from, by node type and, for nodes whose widgets are saved
+# by name, by widget name
+LOADER_TYPES = {'CheckpointLoaderSimple': 'checkpoints', 'CheckpointLoader': 'checkpoints',
+                'unCLIPCheckpointLoader': 'checkpoints', 'ImageOnlyCheckpointLoader': 'checkpoints',
+                'LoraLoader': 'loras', 'LoraLoaderModelOnly': 'loras', 'VAELoader': 'vae',
+                'UNETLoader': 'diffusion_models', 'UnetLoaderGGUF': 'diffusion_models',
+                'CLIPLoader': 'text_encoders', 'DualCLIPLoader': 'text_encoders', 'TripleCLIPLoader': 'text_encoders',
+                'CLIPVisionLoader': 'clip_vision', 'ControlNetLoader': 'controlnet',
+                'DiffControlNetLoader': 'controlnet', 'UpscaleModelLoader': 'upscale_models',
+                'StyleModelLoader': 'style_models', 'GLIGENLoader': 'gligen', 'HypernetworkLoader': 'hypernetworks',
+                'PhotoMakerLoader': 'photomaker'}
+WIDGET_TYPES = {'ckpt_name': 'checkpoints', 'lora_name': 'loras', 'vae_name': 'vae', 'unet_name': 'diffusion_models',
+                'clip_name': 'text_encoders', 'clip_name1': 'text_encoders', 'clip_name2': 'text_encoders',
+                'control_net_name': 'controlnet', 'style_model_name': 'style_models'}
+# older names ComfyUI still reads the same models from
+TYPE_ALIASES = {'unet': 'diffusion_models', 'clip': 'text_encoders'}
+
+
+def workflow_model_references(data: dict, extensions: list[str]) -> dict[str, str | None]:
+    """
+    Collect the model files used by the nodes of a workflow, including nodes in subgraphs, each with the
+    type folder it is read from, None where the node does not tell. Loader nodes keep the selected file in
+    widgets_values; nodes can also declare the models they need in properties.models.
+    """
+    nodes = list(data.get('nodes', []))
+    for subgraph in data.get('definitions', {}).get('subgraphs', []):
+        nodes.extend(subgraph.get('nodes', []))
+    references = {}
+    for node in nodes:
+        node_type = LOADER_TYPES.get(node.get('type'))
+        values = node.get('widgets_values', [])
+        widgets = values.items() if isinstance(values, dict) else ((None, value) for value in values)
+        for widget, value in widgets:
+            if isinstance(value, str) and Path(value).suffix.lower() in extensions:
+                add_reference(references, value, node_type or WIDGET_TYPES.get(widget))
+        for declared in node.get('properties', {}).get('models', []):
+            if isinstance(declared, dict) and isinstance(declared.get('name'), str):
+                directory = declared.get('directory')
+                add_reference(references, declared['name'], directory if isinstance(directory, str) else None)
+    return references
+
+
+def add_reference(references: dict[str, str | None], reference: str, model_type: str | None) -> None:
+    """
+    Add a model reference, keeping the type folder of the first node that tells it.
+    """
+    reference = reference.replace('\\', '/')
+    if references.get(reference) is None:
+        references[reference] = TYPE_ALIASES.get(model_type, model_type)
+
+
+@metrics.timed('archivist_hash_seconds', 'Time to hash one model file')
+def compute_digests(path: Path, algorithms=(PRIMARY,), chunk_size: int | None = None, progress=None) -> dict[str, str]:
+    """
+    Hash a file with several algorithms in a single read, each chunk going to every hasher in turn. Chunks
+    are sized by the device's I/O profile and one of the device's reader slots is held throughout, so that
+    a spinning disk is read by one thread at a time. Returns the hex digest of each algorithm asked for.
+    """
+    hashers = hashers_for(algorithms)
+    profile = io_profiles.for_path(path)
+    chunk_size = chunk_size or profile.read_size
+    with keep_atime(path), io_profiles.limit(path), path.open('rb') as f:
+        if profile.sequential and hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
         while True:
+            started = time.perf_counter()
             chunk = f.read(chunk_size)
             if not chunk:
                 break
-            h.update(chunk)
-    return h.hexdigest()
+            for h in hashers.values():
+                h.update(chunk)
+            if progress is not None:
+                progress.hashed(len(chunk), time.perf_counter() - started)
+                progress.checkpoint()
+    metrics.counter('archivist_hashed_bytes_total', 'Bytes read for hashing').inc(path.stat().st_size)
+    digests = derive({name: h.hexdigest() for name, h in hashers.items()}, algorithms)
+    return {name: digests[name] for name in algorithms}
+
+
+def compute_sha256(path: Path, chunk_size: int | None = None, progress=None) -> str:
+    return compute_digests(path, (PRIMARY,), chunk_size, progress)[PRIMARY]
+
+
+def sidecar_digests(data: dict) -> dict[str, str]:
+    """
+    All digests recorded in a sidecar: the SHA-256 at the top level, where other tools expect it, the rest
+    under 'digests'.
+    """
+    digests = dict(data.get('digests') or {})
+    if PRIMARY in data:
+        digests[PRIMARY] = data[PRIMARY]
+    return digests
 
 
-def ensure_metadata(model_file: Path, metadata_file: Path, rehash: bool) -> dict:
-    if metadata_file.is_file():
-        data = json.loads(metadata_file.read_text(encoding='utf-8'))
+def ensure_metadata(model_file: Path, metadata_file: Path, rehash: bool, progress=None, sidecars=None,
+                    known=None, algorithms: list[str] | None = None) -> dict:
+    """
+    Read the model's sidecar, filling in and saving whatever is missing. With a SidecarStore, unchanged
+    sidecars come from its cache and writes are batched; without one, the sidecar is read and written
+    directly, though still atomically. known, if given, maps a model file to the digests of a copy that is
+    already catalogued, or None. algorithms lists the digests to keep besides the SHA-256; the file is only
+    read if some of them are neither in the sidecar nor known, and then once for all of them.
+    """
+    if sidecars is not None:
+        data = sidecars.read(metadata_file) or {}
     else:
-        data = {}
+        with metrics.timer('archivist_sidecar_read_seconds', 'Time to read one metadata sidecar'):
+            if metadata_file.is_file():
+                data = json.loads(metadata_file.read_text(encoding='utf-8'))
+            else:
+                data = {}
     is_changed = False
-    if 'sha256' not in data or rehash:
-        data['sha256'] = compute_sha256(model_file)
+    wanted = [PRIMARY] + [name for name in algorithms or [] if name != PRIMARY]
+    digests = {} if rehash else derive(sidecar_digests(data), wanted)
+    if any(name not in digests for name in wanted):
+        found = known(model_file) if known is not None and not rehash else None
+        if found:
+            digests = derive(found | digests, wanted)
+        missing = [name for name in wanted if name not in digests]
+        if missing:
+            if progress is not None:
+                progress.worker('hashing', file=str(model_file))
+            digests |= compute_digests(model_file, missing, progress=progress)
+            if progress is not None:
+                progress.worker('scanning')
+    # derived digests cost nothing to work out again, so the sidecar only keeps those that were read
+    read = {name: digest for name, digest in digests.items() if name not in DERIVED}
+    if read != sidecar_digests(data):
+        data[PRIMARY] = read.pop(PRIMARY)
+        if read:
+            data['digests'] = read
+        else:
+            data.pop('digests', None)
         is_changed = True
     if 'model_name' not in data:
         data['model_name'] = model_file.stem
@@ -146,7 +376,104 @@ def ensure_metadata(model_file: Path, metadata_file: Path, rehash: bool) -> dict
     if 'tags' not in data:
         data['tags'] = []
         is_changed = True
+    if 'header' not in data or rehash:
+        # a few KB from the start of the file; empty for formats without a readable header
+        data['header'] = read_header(model_file)
+        is_changed = True
     if is_changed:
         logger.info(f'Updating metadata for {model_file}')
-        metadata_file.write_text(json.dumps(data), encoding='utf-8')
+        if sidecars is not None:
+            sidecars.write(metadata_file, data)
+        else:
+            with metrics.timer('archivist_sidecar_write_seconds', 'Time to write one metadata sidecar'):
+                write_json_atomic(metadata_file, data)
     return data
+
+
+def component_destination(model, component, to_archive: bool, active_type_dir: str | None = None) -> Path:
+    """
+    Where a model component lives when the model is in the archive or active branch. Examples are
+    kept under examples/<hash> next to the model type folders, everything else mirrors the
+    model's relative path. active_type_dir overrides the model's own, for other installations.
+    """
+    type_dir = Path(model.archive_type_dir if to_archive else active_type_dir or model.active_type_dir)
+    if component.component_type == ComponentFileType.EXAMPLE:
+        return type_dir.parent / 'examples' / model.hash / component.file_name
+    return type_dir / model.relative_path / component.file_name
+
+
+def plan_model_move(model, to_archive: bool, installation: str | None = None,
+                    active_type_dir: str | None = None) -> list[tuple[int, Path, Path, int]]:
+    """
+    List the (component id, source, destination, size) moves needed to bring a model into the archive
+    or active branch. Components that are already on the target side are left alone. With installation,
+    only that installation's active files are archived, and activation goes to active_type_dir.
+    """
+    moves = []
+    for component in model.components:
+        if component.is_archive == to_archive:
+            continue
+        if to_archive and installation is not None and component.installation != installation:
+            continue
+        source = Path(component.file_dir) / component.file_name
+        moves.append((component.id, source, component_destination(model, component, to_archive, active_type_dir),
+                      component.file_size))
+    return moves
+
+
+def existing_ancestor(path: Path) -> Path:
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def check_capacity(moves: list[tuple[int, Path, Path, int]], reserve: int = 0) -> list[dict]:
+    """
+    Work out how many bytes each destination filesystem has to take in and compare that with its
+    free space. Moves within one filesystem are renames and need no space. Returns one entry per
+    destination filesystem; 'ok' is False if the moves would not fit.
+    """
+    devices = {}
+    for component_id, source, destination, size in moves:
+        anchor = existing_ancestor(destination.parent)
+        device = anchor.stat().st_dev
+        if source.exists() and source.stat().st_dev == device:
+            continue
+        if device not in devices:
+            devices[device] = {'path': str(anchor), 'required': 0}
+        devices[device]['required'] += size
+    report = []
+    for entry in devices.values():
+        entry['free'] = shutil.disk_usage(entry['path']).free
+        entry['ok'] = entry['required'] + reserve <= entry['free']
+        report.append(entry)
+    return report
+
+
+def check_destinations(moves: list[tuple[int, Path, Path, int]]) -> None:
+    """
+    Raise if any destination of a plan is taken, before anything has been moved.
+    """
+    taken = [str(destination) for component_id, source, destination, size in moves if destination.exists()]
+    if taken:
+        raise ArchivistException(ArchivistError.DESTINATION_EXISTS, ', '.join(taken))
+
+
+def move_files(moves: list[tuple[int, Path, Path, int]], moved: dict[int, Path] | None = None) -> dict[int, Path]:
+    """
+    Physically move the files. Returns the new directory of each component that was moved; with moved, that
+    dict is filled in as the files go, so that a caller still knows what has moved if a later move fails.
+    """
+    moved = moved if moved is not None else {}
+    for component_id, source, destination, size in moves:
+        if not source.is_file():
+            logger.warning(f'FileHandler.move_files: source missing, skipping {source}')
+            continue
+        if destination.exists():
+            raise ArchivistException(ArchivistError.DESTINATION_EXISTS, str(destination))
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        logger.info(f'FileHandler.move_files: {source} -> {destination}')
+        with io_profiles.limit(source, destination.parent):
+            shutil.move(source, destination)
+        moved[component_id] = destination.parent
+    return moved
@@ -0,0 +1,244 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: io_profiles.py
+# purpose: Per-device I/O profiles for hashing, walking and moving files
+# ---------------------------------------------------------------------------
+
+import os
+import time
+import random
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager, ExitStack
+from dataclasses import dataclass
+from statistics import median
+from .object_types import ArchivistException, ArchivistError
+
+logger = logging.getLogger('model_archivist')
+
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'fuse.sshfs', 'fuse.rclone', 'davfs'}
+# a random 4 KiB read slower than this is a seek, not a flash lookup
+HDD_LATENCY_MS = 3.0
+
+
+@dataclass(frozen=True)
+class IOProfile:
+    """
+    How hard to drive one device. Concurrency is the number of files read at once on the device,
+    read_size the size of each read; sequential asks the kernel for aggressive readahead and
+    inode_order visits the files of a directory in inode order, a fair proxy for their position on disk.
+    """
+    name: str
+    concurrency: int
+    read_size: int
+    sequential: bool
+    inode_order: bool
+
+
+PROFILES = {
+    'ssd': IOProfile('ssd', concurrency=8, read_size=1 << 20, sequential=False, inode_order=False),
+    'hdd': IOProfile('hdd', concurrency=1, read_size=8 << 20, sequential=True, inode_order=True),
+    'network': IOProfile('network', concurrency=2, read_size=4 << 20, sequential=True, inode_order=False),
+}
+
+
+def mount_type(path: Path) -> str | None:
+    """
+    The file system type of the mount holding path, from /proc/mounts; None where that is not available.
+    """
+    try:
+        lines = Path('/proc/mounts').read_text(encoding='utf-8').splitlines()
+    except OSError:
+        return None
+    best, fs_type = '', None
+    target = str(path)
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        mount_point = fields[1].replace('\\040', ' ')
+        if (target == mount_point or target.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) > len(best):
+            best, fs_type = mount_point, fields[2]
+    return fs_type
+
+
+def is_rotational(device: int) -> bool | None:
+    """
+    What the kernel says about the block device; partitions keep the flag in their parent's queue.
+    """
+    block = Path(f'/sys/dev/block/{os.major(device)}:{os.minor(device)}')
+    for queue in (block / 'queue', block / '..' / 'queue'):
+        try:
+            return (queue / 'rotational').read_text().strip() == '1'
+        except OSError:
+            continue
+    return None
+
+
+def sample_files(root: Path, min_size: int = 64 << 20, limit: int = 8, max_dirs: int = 64) -> list[tuple[Path, int]]:
+    found = []
+    pending = [root]
+    while pending and len(found) < limit and max_dirs > 0:
+        max_dirs -= 1
+        try:
+            with os.scandir(pending.pop(0)) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(Path(entry.path))
+                    elif entry.is_file() and entry.stat().st_size >= min_size:
+                        found.append((Path(entry.path), entry.stat().st_size))
+        except OSError:
+            continue
+    return found[:limit]
+
+
+def probe(root: Path, samples: int = 32, block: int = 4096, stream: int = 16 << 20) -> dict | None:
+    """
+    Time random small reads across the largest files under root, then one sequential read. Returns the
+    median random read latency and the sequential throughput, or None if root holds no large files.
+    """
+    files = sample_files(root)
+    if not files:
+        return None
+    rng = random.Random(0)
+    latencies = []
+    for i in range(samples):
+        path, size = files[i % len(files)]
+        offset = rng.randrange(0, size - block) & ~(block - 1)
+        with keep_atime(path):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(fd, offset, block, os.POSIX_FADV_RANDOM)
+                started = time.perf_counter()
+                os.pread(fd, block, offset)
+                latencies.append(time.perf_counter() - started)
+            finally:
+                os.close(fd)
+    path, size = max(files, key=lambda f: f[1])
+    started = time.perf_counter()
+    with keep_atime(path), path.open('rb') as f:
+        read = len(f.read(min(stream, size)))
+    elapsed = time.perf_counter() - started
+    return {'latency_ms': median(latencies) * 1000,
+            'throughput_mb_s': read / elapsed / (1 << 20) if elapsed > 0 else None}
+
+
+class IOProfiles:
+    """
+    Profiles by device. A device gets its profile, in order of preference, from the configuration (by path),
+    from its mount (network file systems), from the kernel's rotational flag, or from a probe; failing all
+    of these it is treated as an SSD. Each device also gets a semaphore that caps concurrent readers.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.overrides: dict[Path, str] = {}
+        self.use_probe = True
+        self.devices: dict[int, dict] = {}
+
+    def configure(self, overrides: dict[Path, str], use_probe: bool = True) -> None:
+        for path, name in overrides.items():
+            if name not in PROFILES:
+                raise ArchivistException(ArchivistError.UNKNOWN_IO_PROFILE, f'{name} for {path}')
+        with self.lock:
+            self.overrides = {Path(path).resolve(): name for path, name in overrides.items()}
+            self.use_probe = use_probe
+            self.devices = {}
+
+    def for_path(self, path: Path) -> IOProfile:
+        return self.device(path)['profile']
+
+    def device(self, path: Path) -> dict:
+        path = existing(path)
+        device = path.stat().st_dev
+        with self.lock:
+            entry = self.devices.get(device)
+        if entry is None:
+            # detection may probe the disk, so it happens outside the lock; a racing thread only repeats it
+            profile, source, measured = self.detect(path, device)
+            entry = {'path': str(path), 'profile': profile, 'source': source, 'probe': measured,
+                     'semaphore': threading.BoundedSemaphore(profile.concurrency)}
+            with self.lock:
+                entry = self.devices.setdefault(device, entry)
+            logger.info(f'IOProfiles.device: {path} is {profile.name} ({source})')
+        return entry
+
+    def detect(self, path: Path, device: int) -> tuple[IOProfile, str, dict | None]:
+        resolved = path.resolve()
+        # profiles belong to devices, so a folder configured anywhere on the device decides for all of it
+        configured = [(p, name) for p, name in self.overrides.items() if existing(p).stat().st_dev == device]
+        if configured:
+            return PROFILES[max(configured, key=lambda c: len(c[0].parts))[1]], 'config', None
+        if mount_type(resolved) in NETWORK_FILESYSTEMS:
+            return PROFILES['network'], 'mount', None
+        rotational = is_rotational(device)
+        if rotational is not None:
+            return PROFILES['hdd' if rotational else 'ssd'], 'sysfs', None
+        if self.use_probe:
+            measured = probe(resolved)
+            if measured is not None:
+                return PROFILES['hdd' if measured['latency_ms'] > HDD_LATENCY_MS else 'ssd'], 'probe', measured
+        return PROFILES['ssd'], 'default', None
+
+    @contextmanager
+    def limit(self, *paths: Path):
+        """
+        Hold a reader slot on the devices of all paths. Slots are taken in device order so that two
+        callers needing the same pair of devices cannot deadlock.
+        """
+        entries = {}
+        for path in paths:
+            entry = self.device(path)
+            entries[id(entry['semaphore'])] = entry
+        with ExitStack() as stack:
+            for entry in sorted(entries.values(), key=lambda e: e['path']):
+                stack.enter_context(entry['semaphore'])
+            yield
+
+    def order(self, directory: Path, files: list[tuple[str, int]]) -> list[tuple[str, int]]:
+        """
+        The (name, inode) files of a directory in the order they should be read: by inode on devices whose
+        profile asks for it.
+        """
+        if files and self.for_path(directory).inode_order:
+            return sorted(files, key=lambda f: f[1])
+        return files
+
+    def describe(self) -> list[dict]:
+        with self.lock:
+            return [{'path': entry['path'], 'profile': entry['profile'].name, 'source': entry['source'],
+                     'concurrency': entry['profile'].concurrency, 'read_size': entry['profile'].read_size,
+                     'probe': entry['probe']} for entry in self.devices.values()]
+
+
+@contextmanager
+def keep_atime(path: Path):
+    """
+    Read a file without making it look used: its access time, our best guess at when the model was last
+    loaded, is put back afterwards. A file modified meanwhile, or one we may not touch, is left as it is.
+    """
+    try:
+        before = os.stat(path)
+    except OSError:
+        before = None
+    try:
+        yield
+    finally:
+        if before is not None:
+            try:
+                after = os.stat(path)
+                if after.st_atime_ns != before.st_atime_ns and after.st_mtime_ns == before.st_mtime_ns:
+                    os.utime(path, ns=(before.st_atime_ns, before.st_mtime_ns))
+            except OSError:
+                pass
+
+
+def existing(path: Path) -> Path:
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+io_profiles = IOProfiles()
@@ -0,0 +1,65 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: jobs.py
+# purpose: Background jobs for long operations
+# ---------------------------------------------------------------------------
+
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+logger = logging.getLogger('model_archivist')
+
+
+class JobRunner:
+    """
+    Runs long operations (moves, archiving, deduplication) on a small pool of threads, so that a request
+    only has to start a job and report its id. Finished jobs are kept, up to a limit, for their results.
+    """
+
+    def __init__(self, max_workers: int = 2, keep: int = 100) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='archivist-job')
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.jobs: dict[str, dict] = {}
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> str:
+        job_id = str(uuid.uuid1())
+        with self.lock:
+            self.jobs[job_id] = {'id': job_id, 'kind': kind, 'status': 'queued', 'result': None, 'error': None,
+                                 'submitted': time.time(), 'finished': None}
+            self.forget_old()
+        self.executor.submit(self.run, job_id, fn, args, kwargs)
+        return job_id
+
+    def run(self, job_id: str, fn: Callable, args: tuple, kwargs: dict) -> None:
+        with self.lock:
+            self.jobs[job_id]['status'] = 'running'
+        try:
+            result = fn(*args, **kwargs)
+            update = {'status': 'done', 'result': result}
+        except Exception as e:  # noqa
+            logger.exception(f'JobRunner: job {job_id} failed')
+            update = {'status': 'failed', 'error': str(e)}
+        with self.lock:
+            self.jobs[job_id].update(update, finished=time.time())
+
+    def get(self, job_id: str) -> dict | None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list(self) -> list[dict]:
+        with self.lock:
+            return [{k: v for k, v in job.items() if k != 'result'} for job in self.jobs.values()]
+
+    def forget_old(self) -> None:
+        finished = sorted((job['finished'], job_id) for job_id, job in self.jobs.items() if job['finished'])
+        for _, job_id in finished[:max(0, len(self.jobs) - self.keep)]:
+            del self.jobs[job_id]
+
+
+jobs = JobRunner()
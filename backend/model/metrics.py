@@ -0,0 +1,125 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: metrics.py
+# purpose: Timing histograms and counters in Prometheus text format
+# ---------------------------------------------------------------------------
+
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0)
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # per label set: [bucket counts..., +Inf count], sum
+        self.series: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            if key not in self.series:
+                self.series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            counts, total = self.series[key]
+            counts[index] += 1
+            total[0] += value
+
+    def expose(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {key: (list(counts), total[0]) for key, (counts, total) in self.series.items()}
+        for key, (counts, total) in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(key + (("le", bound),))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(key)} {total}')
+            lines.append(f'{self.name}_count{format_labels(key)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.lock = threading.Lock()
+        self.series: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def expose(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self.lock:
+            series = dict(self.series)
+        lines += [f'{self.name}{format_labels(key)} {value}' for key, value in series.items()]
+        return lines
+
+
+class Metrics:
+    """
+    Registry of all metrics, created on first use.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.metrics: dict[str, Histogram | Counter] = {}
+
+    def histogram(self, name: str, description: str = '') -> Histogram:
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(name, description)
+            return self.metrics[name]
+
+    def counter(self, name: str, description: str = '') -> Counter:
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Counter(name, description)
+            return self.metrics[name]
+
+    @contextmanager
+    def timer(self, name: str, description: str = '', **labels):
+        histogram = self.histogram(name, description)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, name: str, description: str = ''):
+        """
+        Decorator that records the duration of every call in a histogram.
+        """
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, description):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def expose(self) -> str:
+        with self.lock:
+            registered = list(self.metrics.values())
+        lines = []
+        for metric in registered:
+            lines += metric.expose()
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
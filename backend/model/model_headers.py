@@ -0,0 +1,212 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: model_headers.py
+# purpose: Architecture, precision and size of a model from its file header
+# ---------------------------------------------------------------------------
+
+import json
+import mmap
+import struct
+import logging
+from collections import Counter
+from math import prod
+from pathlib import Path
+from .io_profiles import keep_atime
+
+logger = logging.getLogger('model_archivist')
+
+# a safetensors header lists every tensor; even very large models stay well below this
+MAX_SAFETENSORS_HEADER = 64 << 20
+
+# tensor name prefixes that identify an architecture, most specific first
+SAFETENSORS_ARCHITECTURES = [
+    ('lora_unet_double_blocks', 'flux-lora'),
+    ('lora_transformer_single_transformer_blocks', 'flux-lora'),
+    ('lora_te2_', 'sdxl-lora'),
+    ('lora_unet_', 'sd1-lora'),
+    ('model.diffusion_model.double_blocks', 'flux'),
+    ('double_blocks.', 'flux'),
+    ('model.diffusion_model.joint_blocks', 'sd3'),
+    ('joint_blocks.', 'sd3'),
+    ('conditioner.embedders.1', 'sdxl'),
+    ('cond_stage_model.model.', 'sd2'),
+    ('cond_stage_model.transformer.', 'sd1'),
+    ('first_stage_model.', 'sd1'),
+    ('encoder.down_blocks.', 'vae'),
+    ('encoder.down.', 'vae'),
+    ('text_model.encoder.', 'clip'),
+    ('encoder.block.', 't5'),
+]
+
+# architecture names found in metadata and GGUF headers, by prefix, in the vocabulary of the tensor names above
+ARCHITECTURE_ALIASES = [
+    ('stable-diffusion-xl', 'sdxl'),
+    ('sdxl', 'sdxl'),
+    ('stable-diffusion-v3', 'sd3'),
+    ('sd3', 'sd3'),
+    ('stable-diffusion-v2', 'sd2'),
+    ('sd_v2', 'sd2'),
+    ('sd2', 'sd2'),
+    ('stable-diffusion-v1', 'sd1'),
+    ('sd_v1', 'sd1'),
+    ('sd1', 'sd1'),
+    ('flux', 'flux'),
+    ('t5', 't5'),
+    ('clip', 'clip'),
+]
+
+GGML_TYPES = {0: 'F32', 1: 'F16', 2: 'Q4_0', 3: 'Q4_1', 6: 'Q5_0', 7: 'Q5_1', 8: 'Q8_0', 9: 'Q8_1', 10: 'Q2_K',
+              11: 'Q3_K', 12: 'Q4_K', 13: 'Q5_K', 14: 'Q6_K', 15: 'Q8_K', 16: 'IQ2_XXS', 17: 'IQ2_XS',
+              18: 'IQ3_XXS', 19: 'IQ1_S', 20: 'IQ4_NL', 21: 'IQ3_S', 22: 'IQ2_S', 23: 'IQ4_XS', 24: 'I8',
+              25: 'I16', 26: 'I32', 27: 'I64', 28: 'F64', 29: 'IQ1_M', 30: 'BF16'}
+# GGUF value types with a fixed size, as struct formats
+GGUF_SCALARS = {0: '<B', 1: '<b', 2: '<H', 3: '<h', 4: '<I', 5: '<i', 6: '<f', 7: '<?', 10: '<Q', 11: '<q', 12: '<d'}
+GGUF_STRING, GGUF_ARRAY = 8, 9
+
+
+def read_header(path: Path) -> dict:
+    """
+    Architecture, precision and parameter count of a model file, read from its header only. Returns an
+    empty dict for formats without a header or headers that cannot be read.
+    """
+    try:
+        with keep_atime(path):
+            match path.suffix.lower():
+                case '.safetensors' | '.sft':
+                    return safetensors_header(path)
+                case '.gguf':
+                    return gguf_header(path)
+    except (OSError, ValueError, struct.error, KeyError, TypeError, AttributeError) as e:
+        # a malformed header costs the model its details, never the scan
+        logger.warning(f'ModelHeaders.read_header: cannot read the header of {path}: {e!r:.200}')
+    return {}
+
+
+def safetensors_header(path: Path) -> dict:
+    """
+    An 8-byte little-endian length, then that many bytes of JSON: tensor names with dtype, shape and
+    offsets, and an optional __metadata__ dict of strings.
+    """
+    with path.open('rb') as f:
+        (length,) = struct.unpack('<Q', f.read(8))
+        if length > MAX_SAFETENSORS_HEADER:
+            # not a safetensors file, whatever its name says; common enough not to warn about
+            logger.debug(f'ModelHeaders.safetensors_header: {path} has no safetensors header')
+            return {}
+        header = json.loads(f.read(length))
+    if not isinstance(header, dict):
+        raise ValueError('the header is not a JSON object')
+    metadata = header.pop('__metadata__', None)
+    dtypes = Counter()
+    parameters = 0
+    for tensor in header.values():
+        shape = tensor['shape']
+        if not isinstance(shape, list) or not all(isinstance(n, int) for n in shape):
+            raise ValueError(f'tensor shape {shape!r:.50}')
+        count = prod(shape)
+        dtypes[str(tensor['dtype'])] += count
+        parameters += count
+    architecture = metadata_architecture(metadata if isinstance(metadata, dict) else {})
+    by_tensors = tensor_architecture(header.keys())
+    if not architecture:
+        architecture = by_tensors
+    elif by_tensors.endswith('-lora') and not architecture.endswith('-lora'):
+        # trainers record the base model of a LoRA
+        architecture += '-lora'
+    return {'architecture': architecture,
+            'precision': dtypes.most_common(1)[0][0] if dtypes else '',
+            'parameters': parameters}
+
+
+def metadata_architecture(metadata: dict) -> str:
+    for key in ('modelspec.architecture', 'ss_base_model_version'):
+        if metadata.get(key):
+            return normalize_architecture(str(metadata[key]))
+    return ''
+
+
+def normalize_architecture(name: str) -> str:
+    """
+    An architecture name from a header in the vocabulary used for tensor names, e.g. 'sdxl_base_v1-0' or
+    'stable-diffusion-xl-v1-base' as 'sdxl' and 'flux-1-dev/lora' as 'flux-lora'. Unknown names are kept,
+    in lower case.
+    """
+    base, _, variant = name.strip().lower().partition('/')
+    for prefix, architecture in ARCHITECTURE_ALIASES:
+        if base.startswith(prefix):
+            return f'{architecture}-lora' if variant == 'lora' else architecture
+    return name.strip().lower()
+
+
+def tensor_architecture(names) -> str:
+    names = list(names)
+    for prefix, architecture in SAFETENSORS_ARCHITECTURES:
+        if any(name.startswith(prefix) for name in names):
+            return architecture
+    return ''
+
+
+def gguf_header(path: Path) -> dict:
+    """
+    Magic, version, tensor and key/value counts, the key/values and then the tensor infos (name, shape,
+    type, offset); the tensor data follows. The file is mapped, so only the pages parsed are read.
+    """
+    with path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:4] != b'GGUF':
+            raise ValueError('not a GGUF file')
+        reader = GGUFReader(data, 4)
+        version = reader.scalar('<I')
+        count = '<I' if version == 1 else '<Q'
+        tensor_count = reader.scalar(count)
+        kv_count = reader.scalar(count)
+        values = {}
+        for _ in range(kv_count):
+            key = reader.string(count)
+            values[key] = reader.value(reader.scalar('<I'), count)
+        types = Counter()
+        parameters = 0
+        for _ in range(tensor_count):
+            reader.string(count)
+            dims = [reader.scalar(count) for _ in range(reader.scalar('<I'))]
+            tensor_type = reader.scalar('<I')
+            reader.scalar('<Q')
+            elements = prod(dims)
+            types[GGML_TYPES.get(tensor_type, str(tensor_type))] += elements
+            parameters += elements
+    return {'architecture': normalize_architecture(str(values.get('general.architecture', ''))),
+            'precision': types.most_common(1)[0][0] if types else '',
+            'parameters': parameters}
+
+
+class GGUFReader:
+    def __init__(self, data, offset: int) -> None:
+        self.data = data
+        self.offset = offset
+
+    def scalar(self, fmt: str):
+        (value,) = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return value
+
+    def string(self, count: str) -> str:
+        length = self.scalar(count)
+        value = bytes(self.data[self.offset:self.offset + length]).decode('utf-8', errors='replace')
+        self.offset += length
+        return value
+
+    def value(self, value_type: int, count: str):
+        if value_type in GGUF_SCALARS:
+            return self.scalar(GGUF_SCALARS[value_type])
+        if value_type == GGUF_STRING:
+            return self.string(count)
+        if value_type == GGUF_ARRAY:
+            item_type = self.scalar('<I')
+            length = self.scalar(count)
+            if item_type in GGUF_SCALARS:
+                # arrays (token tables and the like) are skipped, not decoded
+                self.offset += length * struct.calcsize(GGUF_SCALARS[item_type])
+            else:
+                for _ in range(length):
+                    self.value(item_type, count)
+            return None
+        raise ValueError(f'unknown GGUF value type {value_type}')
@@ -15,9 +15,27 @@ class ArchivistError(StrEnum):
     MODEL_MISSING = 'Missing model file'
     INCOMPLETE = 'Incomplete model'
     DUPLICATE_MODEL = 'Duplicate model hash'
+    DUPLICATE_WORKFLOW = 'Duplicate workflow id'
     DUPLICATE_ARCHIVE = 'Duplicate archive location'
     MULTIPLE_PATHS_PER_TYPE = 'Multiple extra paths per type are not supported'
     INCONSISTENT_FILENAME = 'Model files have different names'
+    UNKNOWN_COLLECTION = 'No such collection'
+    DESTINATION_EXISTS = 'Destination file already exists'
+    UNKNOWN_WORKFLOW = 'No such workflow'
+    INSUFFICIENT_SPACE = 'Not enough free space at destination'
+    SCAN_CANCELLED = 'Scan cancelled'
+    UNKNOWN_IO_PROFILE = 'No such I/O profile'
+    UNKNOWN_INSTALLATION = 'No such ComfyUI installation'
+    DUPLICATE_INSTALLATION = 'Duplicate ComfyUI installation'
+    THUMBNAILS_UNAVAILABLE = 'Thumbnails are not available'
+    UNKNOWN_THUMBNAIL_SIZE = 'No such thumbnail size'
+    UNKNOWN_DIGEST = 'No such digest algorithm'
+    INVALID_SNAPSHOT = 'Not a catalog snapshot'
+    CATALOG_NOT_EMPTY = 'Catalog snapshots can only be imported into an empty catalog'
+
+
+# the installation under folders.comfy; further ones are listed in folders.installations
+DEFAULT_INSTALLATION = 'default'
 
 
 class ArchivistException(Exception):
@@ -42,3 +60,21 @@ class Taggable(StrEnum):
     MODEL = 'model'
     WORKFLOW = 'workflow'
     COLLECTION = 'collection'
+
+
+class ChangeKind(StrEnum):
+    """
+    What happened to a model, as recorded in the change log.
+    """
+    ADDED = 'added'
+    REMOVED = 'removed'
+    STATE = 'state'         # is_active and/or is_archived flipped
+    FILES = 'files'         # components added, removed or moved
+    TAGS = 'tags'
+
+
+class SizeGroup(StrEnum):
+    MODEL = 'model'
+    TYPE = 'type'
+    ROOT = 'root'
+    COLLECTION = 'collection'
@@ -0,0 +1,35 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: policy.py
+# purpose: Usage-aware archiving policy
+# ---------------------------------------------------------------------------
+
+from typing import Iterable
+
+
+def select_for_archiving(usage: dict[str, int], type_budgets: dict[str, int], active_budget: int,
+                         candidates: Iterable[tuple[str, str, int]]) -> list[str]:
+    """
+    Pick the models to archive so that active usage falls within budget. Usage is the number of active
+    bytes per model type, candidates are (hash, type, active bytes) in least-recently-used order. A
+    candidate is taken if its type is over its own budget or the total is over the overall budget;
+    the candidates are consumed only until every budget is met.
+    """
+    type_excess = {model_type: usage.get(model_type, 0) - budget
+                   for model_type, budget in type_budgets.items()
+                   if budget > 0 and usage.get(model_type, 0) > budget}
+    total_excess = sum(usage.values()) - active_budget if active_budget > 0 else 0
+
+    selected = []
+    for model_hash, model_type, size in candidates:
+        if total_excess <= 0 and not type_excess:
+            break
+        if total_excess <= 0 and model_type not in type_excess:
+            continue
+        selected.append(model_hash)
+        total_excess -= size
+        if model_type in type_excess:
+            type_excess[model_type] -= size
+            if type_excess[model_type] <= 0:
+                del type_excess[model_type]
+    return selected
@@ -0,0 +1,127 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: progress.py
+# purpose: Scan progress counters and run control
+# ---------------------------------------------------------------------------
+
+import time
+import threading
+from pathlib import Path
+from .object_types import ArchivistException, ArchivistError
+
+
+class ScanProgress:
+    """
+    Counters updated by the scan workers and read by status requests. All updates go through one lock;
+    they happen per directory, per file and per hashed chunk, so contention is negligible next to the I/O.
+    Workers also call checkpoint() at the same points, which is where a scan is paused or cancelled.
+    """
+
+    def __init__(self, expected_files: int = 0) -> None:
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.finished: float | None = None
+        self.expected_files = expected_files
+        self.directories = 0
+        self.files = 0
+        self.bytes_hashed = 0
+        self.hash_seconds = 0.0
+        self.rows_written = 0
+        self.models = 0
+        self.workflows = 0
+        self.workers: dict[str, dict] = {}
+        self.completed: list[str] = []
+        self.running = threading.Event()
+        self.running.set()
+        self.cancelled = threading.Event()
+
+    def checkpoint(self) -> None:
+        """
+        Block while the scan is paused; raise if it has been cancelled.
+        """
+        if not self.running.is_set():
+            self.running.wait()
+        if self.cancelled.is_set():
+            raise ArchivistException(ArchivistError.SCAN_CANCELLED, threading.current_thread().name)
+
+    def pause(self) -> None:
+        self.running.clear()
+
+    def resume(self) -> None:
+        self.running.set()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        self.running.set()
+
+    def directory_done(self, path: Path) -> None:
+        with self.lock:
+            self.completed.append(str(path))
+
+    def pop_completed(self) -> list[str]:
+        with self.lock:
+            completed, self.completed = self.completed, []
+            return completed
+
+    def current_file(self) -> str | None:
+        with self.lock:
+            worker = self.workers.get(threading.current_thread().name, {})
+            return worker.get('file') if worker.get('state') == 'hashing' else None
+
+    def worker(self, state: str, **details) -> None:
+        with self.lock:
+            self.workers[threading.current_thread().name] = {'state': state, **details}
+
+    def worker_done(self) -> None:
+        with self.lock:
+            self.workers.pop(threading.current_thread().name, None)
+
+    def directory(self, path: Path) -> None:
+        with self.lock:
+            self.directories += 1
+            worker = self.workers.setdefault(threading.current_thread().name, {'state': 'scanning'})
+            worker['directory'] = str(path)
+
+    def file(self, count: int = 1) -> None:
+        with self.lock:
+            self.files += count
+
+    def hashed(self, size: int, seconds: float) -> None:
+        with self.lock:
+            self.bytes_hashed += size
+            self.hash_seconds += seconds
+
+    def saved(self, rows: int, workflow: bool = False, count: int = 1) -> None:
+        """
+        Count count models (or workflows) saved, together making up rows rows.
+        """
+        with self.lock:
+            self.rows_written += rows
+            if workflow:
+                self.workflows += count
+            else:
+                self.models += count
+
+    def finish(self) -> None:
+        with self.lock:
+            self.finished = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            elapsed = (self.finished or time.monotonic()) - self.started
+            eta = None
+            if self.finished is None and 0 < self.files < self.expected_files:
+                eta = elapsed * (self.expected_files - self.files) / self.files
+            return {'paused': not self.running.is_set(),
+                    'cancelled': self.cancelled.is_set(),
+                    'elapsed': elapsed,
+                    'eta': eta,
+                    'directories': self.directories,
+                    'files': self.files,
+                    'expected_files': self.expected_files,
+                    'bytes_hashed': self.bytes_hashed,
+                    'hash_throughput': self.bytes_hashed / self.hash_seconds if self.hash_seconds > 0 else 0.0,
+                    'rows_written': self.rows_written,
+                    'models': self.models,
+                    'workflows': self.workflows,
+                    'workers': {name: dict(state) for name, state in self.workers.items()}}
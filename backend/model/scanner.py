@@ -7,111 +7,573 @@
 from ..db.tables import Model, Tag, Component, Workflow
 
 import uuid
+import json
+import queue
 import logging
+from dataclasses import dataclass, field
 from enum import StrEnum
-from typing import List
-from threading import Thread, Lock, Barrier
+from typing import List, Iterable, Callable
+from threading import Thread, Lock, Barrier, Event
 from pathlib import Path
-from ..config import config
+from sqlalchemy.exc import IntegrityError
+from ..config import get_config
 from ..db.repository import repo
-from ..model.file_handler import scan_models, scan_workflows
+from ..db.generations import generations
+from ..model.file_handler import scan_models, scan_workflows, ScannedModel
+from .object_types import ComponentFileType, ArchivistException, ArchivistError, DEFAULT_INSTALLATION
+from .duplicates import partial_hash
+from .progress import ScanProgress
+from .sidecars import SidecarStore, sidecar_writers
 
 logger = logging.getLogger('model_archivist')
 
 
+@dataclass
+class ScanScope:
+    """
+    Limits a scan to some model types and/or paths. A path may be a root above the type folders, a type
+    folder (active or archive) or a subfolder of one. Types in priority are scanned first. Stale rows are
+    only cleaned up within the scope.
+    """
+    types: set[str] | None = None
+    paths: list[Path] | None = None
+    priority: list[str] = field(default_factory=list)
+    workflows: bool = True
+
+    def tasks(self, models: dict) -> list[tuple[str, Path, Path, Path | None]]:
+        """
+        Expand the scope into (type, active folder, archive folder, subpath) scan tasks, highest priority first.
+        """
+        tasks = []
+        for name, locations in models.items():
+            if self.types is not None and name not in self.types:
+                continue
+            for active, archive in locations:
+                if self.paths is None:
+                    tasks.append((name, active, archive, None))
+                    continue
+                for path in self.paths:
+                    if path == active or path == archive or active.is_relative_to(path) or archive.is_relative_to(path):
+                        tasks.append((name, active, archive, None))
+                        break
+                    if path.is_relative_to(active):
+                        tasks.append((name, active, archive, path.relative_to(active)))
+                    elif path.is_relative_to(archive):
+                        tasks.append((name, active, archive, path.relative_to(archive)))
+        return sorted(tasks, key=lambda t: self.rank(t[0]))
+
+    def is_full(self) -> bool:
+        return self.types is None and self.paths is None and self.workflows
+
+    def rank(self, type_name: str) -> int:
+        return self.priority.index(type_name) if type_name in self.priority else len(self.priority)
+
+    def to_json(self) -> str:
+        return json.dumps({'types': sorted(self.types) if self.types is not None else None,
+                           'paths': [str(p) for p in self.paths] if self.paths is not None else None,
+                           'priority': self.priority,
+                           'workflows': self.workflows})
+
+    @staticmethod
+    def from_json(text: str) -> 'ScanScope':
+        if not text:
+            return ScanScope()
+        data = json.loads(text)
+        return ScanScope(types=set(data['types']) if data['types'] is not None else None,
+                         paths=[Path(p) for p in data['paths']] if data['paths'] is not None else None,
+                         priority=data['priority'],
+                         workflows=data['workflows'])
+
+
+@dataclass
+class DirectoryDone:
+    """
+    Sent by a scan's walker once all models of a directory have been handed over, with the errors met there.
+    """
+    path: Path
+    errors: list[str]
+
+
 class ScanStatus(StrEnum):
     INACTIVE = 'inactive'
     RUNNING = 'scanning'
+    PAUSED = 'paused'
+    CANCELLING = 'cancelling'
+    CANCELLED = 'cancelled'
     CLEANUP = 'completed'
     ERROR = 'error'
 
 
 class Scanner:
+    """
+    Scans the folders of one ComfyUI installation. Each installation has its own scanner, with its own
+    locks, so scans of different installations run side by side.
+    """
 
-    def __init__(self):
+    def __init__(self, installation: str = DEFAULT_INSTALLATION):
+        self.installation = installation
         self.id: str | None = None
 
         self.status: ScanStatus = ScanStatus.INACTIVE
-        self.models_scanned: int | None = None
-        self.workflows_scanned: int | None = None
-        self.hashes_calculated: int | None = None
+        self.progress: ScanProgress | None = None
+        self.sidecars: SidecarStore | None = None
         self.errors: List[str] = []
+        self.completed: set[str] = set()
+        self.in_flight: List[str] = []
+        # files whose hashing was cut off by an earlier run of a resumed scan, still to be hashed again
+        self.interrupted: set[str] = set()
+        self.resumed = False
+        self.failed = False
+        self.scope: ScanScope = ScanScope()
+        self.tasks: List[tuple[str, Path, Path, Path | None]] = []
+        self.pending: List[tuple[str, Path, Path, Path | None]] = []
+
+        self.on_complete: Callable[[str], None] | None = None
 
         self.status_lock = Lock()
         self.repo_lock = Lock()
 
-    def start(self, models: dict, workflows: dict, rehash: bool = False) -> str | None:
+    def start(self, models: dict, workflows: Iterable[tuple[Path, Path]] | None,
+              rehash: bool = False, resume_id: str | None = None, scope: ScanScope | None = None) -> str | None:
+        """
+        Start a scan in the background, or resume an unfinished one, skipping the directories it has
+        already completed; a resumed scan keeps its original scope. Returns the scan id, None if a scan is
+        running or there is nothing to resume.
+        """
         with self.status_lock:
             status = self.status
 
         if status != ScanStatus.INACTIVE:
             return None
 
+        completed = set()
+        interrupted = set()
+        resumed = resume_id is not None
+        if resumed:
+            found = repo.get_scan_run(resume_id)
+            if found is None or found[0].status == ScanStatus.CLEANUP or found[0].installation != self.installation:
+                return None
+            run, completed = found
+            interrupted = set(json.loads(run.in_flight)) if run.in_flight else set()
+            rehash = run.rehash
+            scope = ScanScope.from_json(run.scope)
+        else:
+            resume_id = str(uuid.uuid1())
+            scope = scope or ScanScope()
+            repo.start_scan_run(resume_id, ScanStatus.RUNNING, rehash, scope.to_json(), self.installation)
+        tasks = scope.tasks(models)
+
         with self.status_lock:
             self.status = ScanStatus.RUNNING
-            self.id = str(uuid.uuid1())
+            self.id = resume_id
+            self.resumed = resumed
+            self.completed = completed
+            self.in_flight = []
+            self.interrupted = interrupted
+            self.failed = False
+            self.errors = []
+            self.progress = ScanProgress(expected_files=repo.count_components())
+            self.sidecars = SidecarStore(repo.load_sidecar_cache)
+            self.scope = scope
+            self.tasks = tasks
+            self.pending = list(tasks)
 
-        model_args = [(name, active, archive, rehash)
-                      for name, locations in models.items()
-                      for active, archive in locations]
-        total_threads = len(model_args) + (1 if workflows is None else 2)
+        # a job writing catalog tags to sidecars finishes first, and none starts until the scan has ended
+        sidecar_writers.scan_started()
+        # API readers see the catalog as it is now until the scan has finished
+        generations.hold()
+        workers = min(get_config().options.scan_workers, len(tasks))
+        workflow_args = list(workflows) if workflows is not None and scope.workflows else []
+        total_threads = workers + len(workflow_args) + 1
         barrier = Barrier(total_threads)
 
-        for arg in model_args:
-            Thread(target=self.scan_models, args=(barrier, *arg)).start()
-        if workflows is not None:
-            Thread(target=self.scan_workflows, args=(barrier, workflows[0], workflows[1])).start()
+        for i in range(workers):
+            Thread(target=self.scan_models, args=(barrier, f'models-{i}', rehash)).start()
+        for active, archive in workflow_args:
+            Thread(target=self.scan_workflows, args=(barrier, active, archive)).start()
         Thread(target=self.cleanup, args=(barrier,)).start()
-        for name, active, archive, rehash in model_args:
-            self.scan_models(barrier, name, active, archive, rehash)
-        self.cleanup(barrier)
 
         return self.id
 
-    def scan_models(self, barrier: Barrier, type_name: str, active: Path, archive: Path, rehash: bool):
-        logger.info(f'Scanner.scan_models: {self.id} starting scan for {type_name} in {active} and {archive}')
-        for model_dict in scan_models(active, archive, config.model_extensions, rehash):
-            archive_count = sum(1 if is_archive else 0 for fn, ft, is_archive in model_dict['files'])
-            logger.info(f'Scanner: located model {model_dict["name"]}')
-            model = Model(hash=model_dict['hash'],
-                          name=model_dict['name'],
-                          relative_path=model_dict['relative_path'],
-                          type=type_name,
-                          active_type_dir=str(active),
-                          archive_type_dir=str(archive),
-                          is_archived=archive_count > 0,
-                          is_active=archive_count < len(model_dict['files']),
-                          last_scan_id=self.id,
-                          components=[Component(file_name=str(file_path.name),
-                                                file_dir=str(file_path.parent),
-                                                component_type=file_type,
-                                                is_archive=is_archive,
-                                                last_scan_id=self.id)
-                                      for file_path, file_type, is_archive in model_dict['files']],
-                          scan_errors='')
+    def get_status(self, scan_id: str) -> dict | None:
+        """
+        Progress of the current or most recent scan, None if the id does not match it.
+        """
+        with self.status_lock:
+            if scan_id != self.id or self.progress is None:
+                return None
+            status = {'id': self.id, 'installation': self.installation, 'status': self.status,
+                      'errors': list(self.errors),
+                      'in_flight': list(self.in_flight)}
+        status.update(self.progress.snapshot())
+        return status
+
+    def pause(self, scan_id: str) -> bool:
+        with self.status_lock:
+            if scan_id != self.id or self.status != ScanStatus.RUNNING:
+                return False
+            self.status = ScanStatus.PAUSED
+            self.progress.pause()
+        logger.info(f'Scanner.pause: {scan_id} paused')
+        return True
+
+    def resume(self, scan_id: str) -> bool:
+        with self.status_lock:
+            if scan_id != self.id or self.status != ScanStatus.PAUSED:
+                return False
+            self.status = ScanStatus.RUNNING
+            self.progress.resume()
+        logger.info(f'Scanner.resume: {scan_id} resumed')
+        return True
+
+    def cancel(self, scan_id: str) -> bool:
+        """
+        Stop the workers at their next checkpoint. What has been saved so far stays, and only the directories
+        already completed are cleaned; the scan can later be resumed with start(..., resume_id=scan_id).
+        """
+        with self.status_lock:
+            if scan_id != self.id or self.status not in (ScanStatus.RUNNING, ScanStatus.PAUSED):
+                return False
+            self.status = ScanStatus.CANCELLING
+            self.progress.cancel()
+        logger.info(f'Scanner.cancel: {scan_id} cancelling')
+        return True
+
+    def run_worker(self, barrier: Barrier, name: str, work: Callable[[], None]) -> None:
+        """
+        Run one scan worker. Whatever happens, its sidecar writes and completed directories are saved and
+        it reaches the barrier, so that the cleanup thread always runs.
+        """
+        try:
+            work()
+        except ArchivistException as e:
+            if e.code != ArchivistError.SCAN_CANCELLED:
+                raise
+            logger.info(f'Scanner: {self.id} {name} stopped')
+        except Exception as e:  # noqa
+            logger.exception(f'Scanner: {self.id} {name} failed')
+            with self.status_lock:
+                self.failed = True
+                self.errors.append(f'{name}: {e}')
+        finally:
+            self.sidecars.flush()
+            self.save_checkpoints()
+            self.progress.worker('waiting', type=name)
+            barrier.wait()
+
+    def save_checkpoints(self) -> None:
+        with self.repo_lock:
+            repo.add_checkpoints(self.id, self.progress.pop_completed())
+
+    def save_sidecar_cache(self) -> None:
+        changed = self.sidecars.take_changed()
+        if changed:
             with self.repo_lock:
-                repo.save_model(model, model_dict['tags'])
+                repo.save_sidecar_cache(changed)
+
+    def prioritise(self, scan_id: str, types: list[str]) -> bool:
+        """
+        Move the folders of the given types to the front of the queue of a running scan.
+        """
+        with self.status_lock:
+            if scan_id != self.id or self.status not in (ScanStatus.RUNNING, ScanStatus.PAUSED):
+                return False
+            self.scope.priority = list(types)
+            self.pending.sort(key=lambda t: self.scope.rank(t[0]))
+        return True
+
+    def scan_models(self, barrier: Barrier, name: str, rehash: bool):
+        self.run_worker(barrier, name, lambda: self.scan_model_tasks(rehash))
+
+    def scan_model_tasks(self, rehash: bool):
+        while True:
+            with self.status_lock:
+                if not self.pending:
+                    return
+                type_name, active, archive, subpath = self.pending.pop(0)
+            self.scan_model_folder(type_name, active, archive, subpath, rehash)
+
+    def scan_model_folder(self, type_name: str, active: Path, archive: Path, subpath: Path | None, rehash: bool):
+        """
+        Scan one type folder as a pipeline: a walker thread hashes the models and hands them over through a
+        bounded queue, while this thread turns them into rows and saves them in batches. Memory stays flat
+        however large the folder, and hashing goes on while a batch is written. A directory is checkpointed
+        once the batch holding its last model has been saved.
+        """
+        logger.info(f'Scanner.scan_models: {self.id} starting scan for {type_name} in {active} and {archive}')
+        self.progress.worker('scanning', type=type_name)
+        batch_size = max(1, get_config().options.scan_batch)
+        found = queue.Queue(maxsize=2 * batch_size)
+        stop = Event()
+        Thread(target=self.walk_models, args=(found, stop, active, archive, subpath, rehash), daemon=True).start()
+        batch = []
+        done = []
+        try:
+            while (item := found.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                if isinstance(item, DirectoryDone):
+                    with self.status_lock:
+                        self.errors.extend(item.errors)
+                    done.append(item.path)
+                elif isinstance(item, ScannedModel):
+                    logger.info(f'Scanner: located model {item.name}')
+                    batch.append(item)
+                if len(batch) >= batch_size or (done and not batch):
+                    self.save_batch(batch, done, type_name, active, archive)
+            self.save_batch(batch, done, type_name, active, archive)
+        finally:
+            stop.set()
         logger.info(f'Scanner.scan_models: {self.id} ending scan for {type_name} in {active} and {archive}')
-        barrier.wait()
+
+    def walk_models(self, found: queue.Queue, stop: Event, active: Path, archive: Path, subpath: Path | None,
+                    rehash: bool) -> None:
+        """
+        The walker of scan_model_folder: feeds the queue with models, DirectoryDone markers and finally None,
+        or with the exception that ended the walk. Gives up once the consumer has stopped.
+        """
+        errors = []
+
+        def hand_over(item) -> None:
+            while not stop.is_set():
+                try:
+                    found.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+            raise ArchivistException(ArchivistError.SCAN_CANCELLED, f'{self.id} {active}')
+
+        def directory_done(path: Path) -> None:
+            hand_over(DirectoryDone(path, list(errors)))
+            errors.clear()
+
+        try:
+            for record in scan_models(active, archive, get_config().models.extensions, rehash, self.progress,
+                                      self.sidecars, self.completed, subpath, self.known_digests,
+                                      get_config().options.digests, directory_done, errors, self.interrupted):
+                hand_over(record)
+            hand_over(None)
+        except BaseException as e:
+            # hashing runs on this thread, so this is where a file cut off halfway is known
+            in_flight = self.progress.current_file()
+            if in_flight is not None:
+                with self.status_lock:
+                    self.in_flight.append(in_flight)
+            if not stop.is_set():
+                found.put(e)
+        finally:
+            self.progress.worker_done()
+
+    def make_model(self, record: ScannedModel, type_name: str, active: Path,
+                   archive: Path) -> tuple[Model, list[str], dict[str, str]]:
+        archive_count = sum(1 if is_archive else 0 for fn, ft, is_archive in record.files)
+        components, last_used = self.make_components(record.files, ComponentFileType.MODEL)
+        model = Model(hash=record.hash,
+                      name=record.name,
+                      relative_path=record.relative_path,
+                      type=type_name,
+                      active_type_dir=str(active),
+                      archive_type_dir=str(archive),
+                      is_archived=archive_count > 0,
+                      is_active=archive_count < len(record.files),
+                      last_scan_id=self.id,
+                      last_used=last_used,
+                      architecture=record.header.get('architecture', ''),
+                      precision=record.header.get('precision', ''),
+                      parameters=record.header.get('parameters', 0),
+                      components=components)
+        return model, record.tags, record.digests
+
+    def save_batch(self, batch: list[ScannedModel], done: list[Path], type_name: str, active: Path,
+                   archive: Path) -> None:
+        """
+        Save a batch of models, then checkpoint the directories completed by it; both lists are emptied.
+        """
+        if batch:
+            models = [self.make_model(record, type_name, active, archive) for record in batch]
+            # counted before saving, which detaches the models
+            rows = sum(1 + len(model.components) for model, _, _ in models)
+            sidecar_tags = get_config().options.update_json_metadata
+            with self.repo_lock:
+                try:
+                    errors = repo.save_models(models, self.resumed, self.installation, sidecar_tags)
+                except IntegrityError:
+                    # a scan of another installation has just added one of the models; save them one by one
+                    errors = []
+                    for record in batch:
+                        model, tags, digests = self.make_model(record, type_name, active, archive)
+                        try:
+                            repo.save_model(model, tags, self.resumed, self.installation, digests, sidecar_tags)
+                        except ArchivistException as e:
+                            logger.warning(f'Scanner.scan_models: {e}')
+                            errors.append(str(e))
+            self.progress.saved(rows, count=len(batch))
+            self.save_sidecar_cache()
+            generations.bound_wal()
+            self.progress.worker('scanning', type=type_name)
+            with self.status_lock:
+                self.errors.extend(errors)
+            batch.clear()
+        for path in done:
+            self.progress.directory_done(path)
+        done.clear()
+        self.save_checkpoints()
+
+    def known_digests(self, model_file: Path) -> dict[str, str] | None:
+        """
+        The digests of a catalogued model file whose recorded digests can be trusted without reading it: one
+        with the same name, size and mtime as recorded, either the file itself (after a catalog import, say) or
+        a copy made with its timestamps kept, typically in another installation. A copy must also be unchanged
+        since it was recorded and match in its first and last megabytes, a check against a copy overwritten
+        in place; the partial hash is never enough on its own. Spares hashing the same model once per
+        installation.
+        """
+        stat = model_file.stat()
+        size = stat.st_size
+        for model_hash, known_file, mtime_ns in repo.find_model_files(model_file.name, size):
+            if mtime_ns == 0 or mtime_ns != stat.st_mtime_ns:
+                continue
+            if known_file == model_file:
+                return repo.get_model_digests(model_hash)
+            try:
+                known = known_file.stat()
+                if known.st_size == size and known.st_mtime_ns == mtime_ns and \
+                        partial_hash(known_file, size) == partial_hash(model_file, size):
+                    logger.info(f'Scanner.known_digests: {model_file} is a copy of {known_file}')
+                    return repo.get_model_digests(model_hash)
+            except OSError:
+                continue
+        return None
 
     def scan_workflows(self, barrier: Barrier, active: Path, archive: Path):
-        logger.info(f'{self.id} starting workflow scan')
-        for workflow_dict in scan_workflows(active, archive):
-            pass
+        self.run_worker(barrier, 'workflows', lambda: self.scan_workflow_folder(active, archive))
 
+    def scan_workflow_folder(self, active: Path, archive: Path):
+        logger.info(f'{self.id} starting workflow scan')
+        self.progress.worker('scanning', type='workflows')
+        for workflow_dict in scan_workflows(active, archive, get_config().models.extensions,
+                                            progress=self.progress, completed=self.completed):
+            archive_count = sum(1 if is_archive else 0 for fn, ft, is_archive in workflow_dict['files'])
+            logger.info(f'Scanner: located workflow {workflow_dict["name"]}')
+            components, last_used = self.make_components(workflow_dict['files'], ComponentFileType.WORKFLOW)
+            workflow = Workflow(id=workflow_dict['id'],
+                                name=workflow_dict['name'],
+                                purpose='',
+                                relative_path=workflow_dict['relative_path'],
+                                is_archived=archive_count > 0,
+                                is_active=archive_count < len(workflow_dict['files']),
+                                last_scan_id=self.id,
+                                scan_errors='',
+                                last_used=last_used,
+                                components=components)
+            with self.repo_lock:
+                repo.save_workflow(workflow, workflow_dict['tags'], workflow_dict['models'], self.resumed)
+            self.progress.saved(1 + len(components) + len(workflow_dict['models']), workflow=True)
+            self.save_checkpoints()
         logger.info(f'{self.id} ending workflow scan')
-        barrier.wait()
+
+    def make_components(self, files: list, main_type: ComponentFileType) -> tuple[list[Component], float]:
+        """
+        Turn the files found by the file handler into components. Also returns the last access time of
+        the main file(s), which is our best guess at when the model or workflow was last used; the scan's own
+        reads put it back (see keep_atime).
+        """
+        components = []
+        last_used = 0.0
+        for file_path, file_type, is_archive in files:
+            mtime_ns = 0
+            try:
+                stat = file_path.stat()
+                size = stat.st_size
+                mtime_ns = stat.st_mtime_ns
+                if file_type == main_type:
+                    last_used = max(last_used, stat.st_atime)
+            except FileNotFoundError:
+                # a sidecar still waiting in the write queue
+                if file_type != ComponentFileType.METADATA:
+                    raise
+                size = 0
+            components.append(Component(file_name=str(file_path.name),
+                                        file_dir=str(file_path.parent),
+                                        component_type=file_type,
+                                        is_archive=is_archive,
+                                        file_size=size,
+                                        file_mtime_ns=mtime_ns,
+                                        installation='' if is_archive else self.installation,
+                                        last_scan_id=self.id))
+        return components, last_used
+
+    def completed_scope(self, directories: set[str]) -> list[tuple[str, str, str]]:
+        """
+        The (type, active type folder, relative path) of each completed model directory of the scan's tasks.
+        """
+        scope = []
+        for directory in map(Path, directories):
+            for type_name, active, archive, subpath in self.tasks:
+                if directory.is_relative_to(active):
+                    scope.append((type_name, str(active), str(directory.relative_to(active))))
+                    break
+        return scope
 
     def cleanup(self, barrier: Barrier):
         barrier.wait()
+        try:
+            completed = self.wrap_up()
+        finally:
+            # readers move on to the database itself: all of a completed scan, or what a cancelled or failed
+            # one has saved, updated models included, with only its completed directories cleaned up
+            generations.release()
+            sidecar_writers.scan_ended()
+        if completed and self.on_complete is not None:
+            self.on_complete(self.id)
+
+    def wrap_up(self) -> bool:
+        """
+        Save the scan's state and remove what it did not find: everywhere if it went through, otherwise only in
+        the directories it completed. Returns whether it went through.
+        """
+        self.sidecars.flush()
+        self.save_sidecar_cache()
+        if self.progress.cancelled.is_set() or self.failed:
+            # only the directories the scan has been through can be cleaned: elsewhere, rows not seen yet
+            # would be deleted
+            final_status = ScanStatus.CANCELLED if self.progress.cancelled.is_set() else ScanStatus.ERROR
+            with self.repo_lock:
+                found = repo.get_scan_run(self.id)
+                scope = self.completed_scope(found[1] if found is not None else set())
+                for start in range(0, len(scope), 200):
+                    repo.clean_repository(self.id, scope[start:start + 200], False, self.installation,
+                                          recursive=False)
+                # files cut off in an earlier run and not reached in this one stay to be hashed again
+                repo.finish_scan_run(self.id, final_status, self.in_flight + sorted(self.interrupted),
+                                     keep_checkpoints=True)
+            self.progress.worker(str(final_status))
+            self.progress.finish()
+            with self.status_lock:
+                self.status = ScanStatus.INACTIVE
+            logger.info(f'{self.id} {final_status}, can be resumed')
+            return False
         with self.status_lock:
             self.status = ScanStatus.CLEANUP
         logger.info(f'{self.id} starting cleanup')
+        self.progress.worker('cleanup')
         with self.repo_lock:
-            repo.clean_repository(self.id)
+            # workflows belong to the default installation; other installations leave them alone
+            workflows = self.scope.workflows and self.installation == DEFAULT_INSTALLATION
+            if self.scope.is_full():
+                repo.clean_repository(self.id, workflows=workflows, installation=self.installation)
+            else:
+                repo.clean_repository(self.id, [(t, str(active), str(sub) if sub is not None else None)
+                                                for t, active, archive, sub in self.tasks],
+                                      workflows, self.installation)
+            repo.resolve_workflow_references()
+            repo.finish_scan_run(self.id, ScanStatus.CLEANUP, [], keep_checkpoints=False)
+            repo.compact_changes(get_config().options.change_log_keep)
+        self.progress.worker('done')
+        self.progress.finish()
         with self.status_lock:
             self.status = ScanStatus.INACTIVE
         logger.info(f'{self.id} done')
-
+        return True
 
 scanner = Scanner()
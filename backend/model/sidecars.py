@@ -0,0 +1,175 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: sidecars.py
+# purpose: Cached reads and batched atomic writes of metadata sidecars
+# ---------------------------------------------------------------------------
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable
+from pathlib import Path
+from contextlib import contextmanager
+from .metrics import metrics
+
+logger = logging.getLogger('model_archivist')
+
+
+def write_json_atomic(path: Path, data: dict) -> None:
+    """
+    Write to a temporary file in the same folder and rename it over the target, so that readers (and a
+    crash) see either the old or the new sidecar, never a partial one.
+    """
+    temp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        with temp.open('w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+
+
+class SidecarStore:
+    """
+    Sidecar contents cached by path and keyed on the sidecar's mtime and size: a sidecar whose stat
+    signature matches the cache is not read again. The cache is looked up a directory at a time, through
+    load (the scanner's is Repository.load_sidecar_cache), and only the directories used last are kept,
+    so that memory does not grow with the library. Entries read or written since the last take_changed
+    are handed out by it to be saved. Writes are queued and flushed in batches.
+    """
+
+    def __init__(self, load: Callable[[str], dict[str, tuple[int, int, dict]]] | None = None,
+                 batch_size: int = 64, max_directories: int = 16) -> None:
+        self.load = load
+        self.directories: OrderedDict[str, dict[str, tuple[int, int, dict]]] = OrderedDict()
+        self.max_directories = max_directories
+        self.changed: dict[str, tuple[int, int, dict]] = {}
+        self.pending: dict[Path, dict] = {}
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, path: Path) -> dict | None:
+        """
+        Sidecar contents, None if there is no sidecar.
+        """
+        key = str(path)
+        with self.lock:
+            if path in self.pending:
+                return dict(self.pending[path])
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        cached = self.entries(str(path.parent)).get(key)
+        with self.lock:
+            if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                self.hits += 1
+                return dict(cached[2])
+            self.misses += 1
+        with metrics.timer('archivist_sidecar_read_seconds', 'Time to read one metadata sidecar'):
+            data = json.loads(path.read_text(encoding='utf-8'))
+        self.remember(key, stat, data)
+        return dict(data)
+
+    def entries(self, directory: str) -> dict[str, tuple[int, int, dict]]:
+        """
+        The cached sidecars of a directory, loaded on first use.
+        """
+        with self.lock:
+            entries = self.directories.get(directory)
+            if entries is not None:
+                self.directories.move_to_end(directory)
+                return entries
+        loaded = self.load(directory) if self.load is not None else {}
+        with self.lock:
+            entries = self.directories.setdefault(directory, loaded)
+            self.directories.move_to_end(directory)
+            while len(self.directories) > self.max_directories:
+                self.directories.popitem(last=False)
+            return entries
+
+    def take_changed(self) -> dict[str, tuple[int, int, dict]]:
+        """
+        The entries read or written since the last call, to be saved.
+        """
+        with self.lock:
+            changed, self.changed = self.changed, {}
+        return changed
+
+    def write(self, path: Path, data: dict) -> None:
+        with self.lock:
+            self.pending[path] = dict(data)
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return
+        with metrics.timer('archivist_sidecar_flush_seconds', 'Time to write one batch of metadata sidecars'):
+            for path, data in batch.items():
+                try:
+                    write_json_atomic(path, data)
+                    self.remember(str(path), path.stat(), data)
+                except OSError as exc:
+                    logger.warning(f'SidecarStore.flush: cannot write {path}: {exc}')
+        metrics.counter('archivist_sidecar_writes_total', 'Metadata sidecars written').inc(len(batch))
+
+    def remember(self, key: str, stat: os.stat_result, data: dict) -> None:
+        entry = (stat.st_mtime_ns, stat.st_size, data)
+        entries = self.entries(str(Path(key).parent))
+        with self.lock:
+            entries[key] = entry
+            self.changed[key] = entry
+
+
+class SidecarWriters:
+    """
+    Keeps the sidecar writes of scans and of the jobs writing catalog tags to sidecars apart. Scans run side
+    by side, but a job waits until none is running, and scans starting while a job runs or waits wait for it:
+    otherwise a scan could write back a sidecar it read before the job wrote it.
+    """
+
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.scans = 0
+        self.jobs = 0
+        self.writing = False
+
+    def scan_started(self) -> None:
+        with self.condition:
+            while self.jobs:
+                self.condition.wait()
+            self.scans += 1
+
+    def scan_ended(self) -> None:
+        with self.condition:
+            self.scans = max(0, self.scans - 1)
+            self.condition.notify_all()
+
+    @contextmanager
+    def job(self):
+        with self.condition:
+            self.jobs += 1
+            while self.scans or self.writing:
+                self.condition.wait()
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.jobs -= 1
+                self.writing = False
+                self.condition.notify_all()
+
+
+sidecar_writers = SidecarWriters()
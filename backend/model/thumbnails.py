@@ -0,0 +1,187 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: thumbnails.py
+# purpose: Content-addressed cache of example image thumbnails
+# ---------------------------------------------------------------------------
+
+import os
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future
+from .metrics import metrics
+from .object_types import ArchivistException, ArchivistError
+
+logger = logging.getLogger('model_archivist')
+
+IMAGE_SUFFIXES = {'.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp'}
+
+
+def content_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open('rb') as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def render_thumbnails(source: Path, targets: dict[int, Path]) -> None:
+    """
+    Decode the image once and write a WebP thumbnail per size, each no larger than size pixels on its
+    longer side. Pillow is an optional dependency, imported only here.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ArchivistException(ArchivistError.THUMBNAILS_UNAVAILABLE, 'install the thumbnails extra (Pillow)')
+    with Image.open(source) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for size in sorted(targets, reverse=True):
+            image.thumbnail((size, size))
+            image.save(targets[size], format='WEBP', quality=80, method=4)
+
+
+def file_stat(path: Path) -> os.stat_result | None:
+    try:
+        return path.stat()
+    except FileNotFoundError:
+        return None
+
+
+def file_size(path: Path) -> int:
+    stat = file_stat(path)
+    return stat.st_size if stat is not None else 0
+
+
+def touch(path: Path) -> bool:
+    """
+    Mark a thumbnail as just used: its mtime doubles as the last use, for eviction. False if it is not there.
+    Called under the cache lock, so that eviction cannot remove the file between the check and the touch.
+    """
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class ThumbnailCache:
+    """
+    Thumbnails of example images, stored under the SHA-256 of the source image's contents, so that a URL
+    naming a digest always denotes the same bytes and can be cached by the browser for good. Thumbnails
+    are rendered in a small pool, all sizes of an image at once; the cache is kept under max_bytes by
+    evicting the least recently served files.
+    """
+
+    def __init__(self) -> None:
+        self.root: Path | None = None
+        self.sizes: list[int] = []
+        self.max_bytes = 0
+        self.executor: ThreadPoolExecutor | None = None
+        self.lock = threading.Lock()
+        # (path, mtime_ns, size) -> digest, so that unchanged sources are not hashed again
+        self.digests: dict[tuple[str, int, int], str] = {}
+        self.sources: dict[str, Path] = {}
+        self.pending: dict[str, Future] = {}
+        self.used_bytes = 0
+
+    def attach(self, root: Path, sizes: list[int], max_bytes: int, workers: int = 2) -> None:
+        self.root = root
+        self.sizes = sorted(sizes)
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='archivist-thumbnail')
+        root.mkdir(parents=True, exist_ok=True)
+        self.used_bytes = sum(f.stat().st_size for f in root.glob('*/*.webp'))
+
+    def path(self, digest: str, size: int) -> Path:
+        return self.root / digest[:2] / f'{digest}_{size}.webp'
+
+    def register(self, source: Path) -> str:
+        """
+        The content digest of an example image, remembered as the source for thumbnails of that digest.
+        """
+        stat = source.stat()
+        key = (str(source), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            digest = self.digests.get(key)
+        if digest is None:
+            digest = content_digest(source)
+            with self.lock:
+                self.digests[key] = digest
+        with self.lock:
+            self.sources[digest] = source
+        return digest
+
+    def prefetch(self, digest: str) -> Future | None:
+        """
+        Queue the thumbnails of a registered image unless they exist or are being rendered already.
+        """
+        if all(self.path(digest, size).is_file() for size in self.sizes):
+            return None
+        with self.lock:
+            future = self.pending.get(digest)
+            if future is None:
+                source = self.sources.get(digest)
+                if source is None:
+                    return None
+                future = self.executor.submit(self.render, digest, source)
+                self.pending[digest] = future
+            return future
+
+    def render(self, digest: str, source: Path) -> None:
+        """
+        Render the thumbnails into temporary files, then move them in under the lock, counting only the
+        growth of the cache: a thumbnail rendered again replaces the old file rather than adding to it.
+        """
+        targets = {size: self.path(digest, size) for size in self.sizes}
+        temps = {size: t.with_name(f'.{t.name}.{threading.get_ident()}.tmp') for size, t in targets.items()}
+        try:
+            targets[self.sizes[0]].parent.mkdir(parents=True, exist_ok=True)
+            with metrics.timer('archivist_thumbnail_seconds', 'Time to render the thumbnails of one image'):
+                render_thumbnails(source, temps)
+            with self.lock:
+                for size, temp in temps.items():
+                    self.used_bytes += temp.stat().st_size - file_size(targets[size])
+                    os.replace(temp, targets[size])
+            self.evict()
+        finally:
+            for temp in temps.values():
+                temp.unlink(missing_ok=True)
+            with self.lock:
+                self.pending.pop(digest, None)
+
+    def get(self, digest: str, size: int) -> Path | None:
+        """
+        The thumbnail file, rendering it first if need be; None if the digest is unknown. Waits for the
+        render, so it is meant to be called off the event loop.
+        """
+        if size not in self.sizes:
+            raise ArchivistException(ArchivistError.UNKNOWN_THUMBNAIL_SIZE, str(size))
+        path = self.path(digest, size)
+        with self.lock:
+            if touch(path):
+                return path
+        future = self.prefetch(digest)
+        if future is not None:
+            future.result()
+        with self.lock:
+            return path if touch(path) else None
+
+    def evict(self) -> None:
+        with self.lock:
+            if self.used_bytes <= self.max_bytes:
+                return
+            files = sorted((stat.st_mtime_ns, stat.st_size, f) for f in self.root.glob('*/*.webp')
+                           if (stat := file_stat(f)) is not None)
+            for mtime, size, f in files:
+                if self.used_bytes <= self.max_bytes * 0.9:
+                    break
+                f.unlink(missing_ok=True)
+                self.used_bytes -= size
+            logger.info(f'ThumbnailCache.evict: {self.used_bytes} bytes left')
+
+
+thumbnails = ThumbnailCache()
@@ -0,0 +1,17 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: executor.py
+# purpose: Run blocking repository and file system calls off the event loop
+# ---------------------------------------------------------------------------
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Bounded, so that a burst of requests queues up here instead of piling threads onto SQLite and the disks.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='archivist-io')
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
@@ -5,15 +5,17 @@
 # ---------------------------------------------------------------------------
 
 
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import Response
 import uvicorn
 import webbrowser
 
 from backend.config import config
-from .routers import models, health, admin, tags
+from backend.model.metrics import metrics
+from .static_files import SPAStaticFiles
+from .routers import models, health, admin, tags, collections, workflows, installations, thumbnails, changes
+from .routers import metrics as metrics_router
 
 app = FastAPI(title='Model Archivist API', version='0.1.0')
 
@@ -29,18 +31,27 @@ app.include_router(models.router)
 app.include_router(tags.router)
 app.include_router(health.router)
 app.include_router(admin.router)
-
-
-class SPAStaticFiles(StaticFiles):
-    async def get_response(self, path: str, scope):
-        response: Response = await super().get_response(path, scope)
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        return response
-
-
-app.mount('/', app=StaticFiles(directory=config.html_root, html=True), name='static')
+app.include_router(collections.router)
+app.include_router(workflows.router)
+app.include_router(installations.router)
+app.include_router(thumbnails.router)
+app.include_router(changes.router)
+app.include_router(metrics_router.router)
+
+
+@app.middleware('http')
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # label by route template rather than by URL, so that hashes and ids do not each get a series
+    route = request.scope.get('route')
+    path = getattr(route, 'path', None) or 'static'
+    metrics.histogram('archivist_http_request_seconds', 'Time to handle an HTTP request').observe(
+        time.perf_counter() - started, method=request.method, path=path, status=response.status_code)
+    return response
+
+
+app.mount('/', app=SPAStaticFiles(directory=config.html_root, html=True), name='static')
 
 
 def start_server():
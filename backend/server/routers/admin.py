@@ -4,8 +4,18 @@
 # purpose: Admin endpoint
 # ---------------------------------------------------------------------------
 
-from fastapi import APIRouter, HTTPException
+import json
+import asyncio
+import tempfile
+from pathlib import Path
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from backend.model.archivist import archivist
+from backend.model.jobs import jobs
+from backend.model.io_profiles import io_profiles
+from backend.model.scanner import ScanStatus, ScanScope
+from backend.model.object_types import ArchivistException, DEFAULT_INSTALLATION
+from backend.server.executor import run_blocking
 
 router = APIRouter()
 
@@ -16,16 +26,151 @@ def admin() -> dict[str, str]:
 
 
 @router.post('/admin/scan')
-def admin() -> str:
-    scan_id = archivist.start_scan()
+async def admin(types: list[str] | None = Query(default=None), paths: list[str] | None = Query(default=None),
+          priority: list[str] | None = Query(default=None), workflows: bool = True, rehash: bool = False,
+          installation: str = DEFAULT_INSTALLATION) -> str:
+    scope = ScanScope(types=set(types) if types else None,
+                      paths=[Path(p).resolve() for p in paths] if paths else None,
+                      priority=priority or [],
+                      workflows=workflows)
+    try:
+        scan_id = await run_blocking(archivist.scan, rehash, scope, installation)
+    except ArchivistException as e:
+        raise HTTPException(404, str(e))
     if scan_id is None:
         raise HTTPException(400, 'Scan already running')
     return scan_id
 
 
 @router.get('/admin/scan/{scanId}')
-def admin(scanId: int) -> int:
+def admin(scanId: str) -> dict:
     progress = archivist.status(scanId)
     if progress is None:
         raise HTTPException(400, 'No scan running')
     return progress
+
+
+@router.post('/admin/scan/{scanId}/priority')
+def prioritise_scan(scanId: str, types: list[str] = Query()) -> str:
+    if not archivist.prioritise_scan(scanId, types):
+        raise HTTPException(400, 'Scan is not running')
+    return scanId
+
+
+@router.post('/admin/scan/{scanId}/pause')
+def pause_scan(scanId: str) -> str:
+    if not archivist.pause_scan(scanId):
+        raise HTTPException(400, 'Scan is not running')
+    return scanId
+
+
+@router.post('/admin/scan/{scanId}/cancel')
+def cancel_scan(scanId: str) -> str:
+    if not archivist.cancel_scan(scanId):
+        raise HTTPException(400, 'Scan is not running')
+    return scanId
+
+
+@router.post('/admin/scan/{scanId}/resume')
+async def resume_scan(scanId: str) -> str:
+    if not await run_blocking(archivist.resume_scan, scanId):
+        raise HTTPException(400, 'Scan cannot be resumed')
+    return scanId
+
+
+@router.get('/admin/scan/{scanId}/events')
+async def scan_events(scanId: str, interval: float = 0.5) -> StreamingResponse:
+    """
+    Server-sent events with the scan progress, one every interval seconds until the scan ends.
+    """
+    if archivist.status(scanId) is None:
+        raise HTTPException(400, 'No scan running')
+
+    async def events():
+        while True:
+            progress = archivist.status(scanId)
+            if progress is None:
+                break
+            yield f'event: progress\ndata: {json.dumps(progress)}\n\n'
+            if progress['status'] == ScanStatus.INACTIVE:
+                yield f'event: done\ndata: {json.dumps(progress)}\n\n'
+                break
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@router.get('/admin/policy')
+async def propose_archiving(installation: str = DEFAULT_INSTALLATION) -> dict:
+    try:
+        return await run_blocking(archivist.apply_policy, True, installation)
+    except ArchivistException as e:
+        raise HTTPException(404, str(e))
+
+
+@router.post('/admin/policy')
+def apply_archiving(installation: str = DEFAULT_INSTALLATION) -> dict:
+    try:
+        archivist.get_scanner(installation)
+    except ArchivistException as e:
+        raise HTTPException(404, str(e))
+    return {'job': jobs.submit('apply_policy', archivist.apply_policy, False, installation)}
+
+
+@router.post('/admin/duplicates')
+def find_duplicates(action: str | None = None) -> dict:
+    """
+    Look for duplicate model files in a background job; with an action, also remove them.
+    """
+    if action is None:
+        return {'job': jobs.submit('find_duplicates', archivist.find_duplicates)}
+    if action not in ('hardlink', 'delete'):
+        raise HTTPException(400, f'Unknown action {action}')
+    return {'job': jobs.submit('remove_duplicates', archivist.find_duplicates, action)}
+
+
+@router.get('/admin/catalog')
+def export_catalog() -> StreamingResponse:
+    return StreamingResponse(archivist.catalog_lines(), media_type='application/x-ndjson',
+                             headers={'Content-Disposition': 'attachment; filename="catalog.jsonl"'})
+
+
+@router.post('/admin/catalog')
+async def import_catalog(request: Request) -> dict:
+    """
+    Restore a catalog snapshot in a background job. The upload is spooled to a temporary file as it arrives,
+    never held in memory as a whole, and the job reads it back line by line. The spool file is created,
+    written and closed in the executor, off the event loop.
+    """
+    spool = await run_blocking(tempfile.NamedTemporaryFile, prefix='archivist-catalog-', suffix='.jsonl',
+                               delete=False)
+    path = Path(spool.name)
+    try:
+        try:
+            async for chunk in request.stream():
+                await run_blocking(spool.write, chunk)
+        finally:
+            await run_blocking(spool.close)
+    except BaseException:
+        await run_blocking(path.unlink, missing_ok=True)
+        raise
+    return {'job': jobs.submit('import_catalog', archivist.import_catalog_file, path, True)}
+
+
+@router.get('/admin/io')
+def get_io_profiles() -> list[dict]:
+    return io_profiles.describe()
+
+
+@router.get('/admin/jobs')
+def list_jobs() -> list[dict]:
+    return jobs.list()
+
+
+@router.get('/admin/jobs/{job_id}')
+def get_job(job_id: str) -> dict:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f'No job {job_id}')
+    return job
@@ -0,0 +1,25 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: changes.py
+# purpose: REST interface for the catalog change feed
+# ---------------------------------------------------------------------------
+
+from backend.model.archivist import archivist
+from backend.server.executor import run_blocking
+
+from fastapi import APIRouter, HTTPException
+
+router = APIRouter()
+
+# entries per answer; a client that gets 'more' asks again from 'last'
+MAX_CHANGES = 5000
+
+
+@router.get('/changes')
+async def get_changes(since: int = 0, limit: int = 1000) -> dict:
+    """
+    Model changes after a sequence number, with the current state of the models concerned.
+    """
+    if since < 0 or limit < 1:
+        raise HTTPException(status_code=400, detail='Expected since >= 0 and limit >= 1')
+    return await run_blocking(archivist.get_changes, since, min(limit, MAX_CHANGES))
@@ -0,0 +1,29 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: collections.py
+# purpose: REST interface for collections
+# ---------------------------------------------------------------------------
+
+from backend.model.archivist import archivist
+from backend.model.jobs import jobs
+from backend.model.object_types import ArchivistException, ArchivistError, DEFAULT_INSTALLATION
+from backend.server.executor import run_blocking
+
+from fastapi import APIRouter, HTTPException
+
+router = APIRouter()
+
+
+@router.post('/collections/{collection_id}/activate')
+async def activate_collection(collection_id: int, exclusive: bool = False, dry_run: bool = False,
+                              installation: str = DEFAULT_INSTALLATION) -> dict:
+    if not dry_run:
+        job_id = jobs.submit('activate_collection', archivist.activate_collection, collection_id, exclusive, False,
+                             installation)
+        return {'job': job_id}
+    try:
+        return await run_blocking(archivist.activate_collection, collection_id, exclusive, True, installation)
+    except ArchivistException as e:
+        if e.code == ArchivistError.UNKNOWN_COLLECTION:
+            raise HTTPException(status_code=404, detail=str(e))
+        raise HTTPException(status_code=409, detail=str(e))
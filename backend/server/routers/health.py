@@ -10,5 +10,5 @@ router = APIRouter()
 
 
 @router.get('/health')
-def health() -> dict[str, str]:
+async def health() -> dict[str, str]:
     return {'status': 'ok'}
@@ -0,0 +1,26 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: installations.py
+# purpose: REST interface for ComfyUI installations
+# ---------------------------------------------------------------------------
+
+from backend.model.archivist import archivist
+from backend.model.object_types import ArchivistException
+from backend.server.executor import run_blocking
+
+from fastapi import APIRouter, HTTPException
+
+router = APIRouter()
+
+
+@router.get('/installations')
+async def get_installations() -> list[dict]:
+    return archivist.get_installations()
+
+
+@router.get('/installations/{installation}/models')
+async def get_installation_models(installation: str) -> list[dict]:
+    try:
+        return await run_blocking(archivist.get_installation_models, installation)
+    except ArchivistException as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -0,0 +1,16 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: metrics.py
+# purpose: Prometheus metrics endpoint
+# ---------------------------------------------------------------------------
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from backend.model.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.expose(), media_type='text/plain; version=0.0.4; charset=utf-8')
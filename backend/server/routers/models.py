@@ -4,16 +4,97 @@
 # purpose: REST interface for models
 # ---------------------------------------------------------------------------
 
+import string
+
 from backend.model.archivist import archivist
+from backend.model.jobs import jobs
+from backend.model.object_types import SizeGroup, ArchivistException, DEFAULT_INSTALLATION
+from backend.server.executor import run_blocking
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Response, Body
 
 router = APIRouter()
 
+# shorter prefixes match too much of a large catalog to identify anything
+MIN_DIGEST_PREFIX = 6
+
 
 @router.get('/models')
-async def get_models(rescan: bool = False) -> list[dict]:
+async def get_models(response: Response, rescan: bool = False, architecture: str | None = None,
+                     precision: str | None = None) -> list[dict]:
     if rescan:
-        archivist.scan_models()
-    models = archivist.get_models()
-    return models
+        # the scan runs in the background; the caller gets the current catalog and the id to follow the scan
+        scan_id = await run_blocking(archivist.scan)
+        if scan_id is not None:
+            response.headers['X-Scan-Id'] = scan_id
+    # read first: changes made while the models are read are then sent again by /changes, which is harmless
+    response.headers['X-Change-Seq'] = str(await run_blocking(archivist.last_change))
+    return await run_blocking(archivist.get_models, architecture=architecture, precision=precision)
+
+
+@router.get('/models/{model_hash}/workflows')
+async def get_model_workflows(model_hash: str) -> list[dict]:
+    return await run_blocking(archivist.get_model_workflows, model_hash)
+
+
+@router.get('/models/{model_hash}/examples')
+async def get_model_examples(model_hash: str) -> list[dict]:
+    return await run_blocking(archivist.get_model_examples, model_hash)
+
+
+@router.get('/models/by-digest/{digest}')
+async def find_by_digest(digest: str, algorithm: str | None = None) -> list[dict]:
+    """
+    Models whose SHA-256, AutoV2, BLAKE2b, CRC32 or other stored digest is, or starts with, the given hex.
+    """
+    if len(digest) < MIN_DIGEST_PREFIX or any(c not in string.hexdigits for c in digest):
+        raise HTTPException(status_code=400, detail=f'Expected at least {MIN_DIGEST_PREFIX} hex digits')
+    try:
+        return await run_blocking(archivist.find_by_digest, digest, algorithm)
+    except ArchivistException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get('/models/sizes')
+async def get_sizes(group: str = 'type') -> list[dict]:
+    try:
+        size_group = SizeGroup(group)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f'Cannot group sizes by {group}')
+    return await run_blocking(archivist.get_sizes, size_group)
+
+
+@router.post('/models/tags')
+async def retag_models(add: list[str] = Body(default=[]), remove: list[str] = Body(default=[]),
+                       replace: bool = Body(default=False), hashes: list[str] | None = Body(default=None),
+                       tag: str | None = Body(default=None),
+                       model_type: str | None = Body(default=None, alias='type')) -> dict:
+    """
+    Add and/or remove tags on the models with the given hashes, or on those with a tag and/or of a type.
+    With replace, the models keep only the added tags. Sidecars are updated by the job in the answer.
+    """
+    if hashes is None and tag is None and model_type is None:
+        raise HTTPException(status_code=400, detail='Select models by hashes, tag or type')
+    if not add and not remove and not replace:
+        raise HTTPException(status_code=400, detail='Nothing to add or remove')
+    return await run_blocking(archivist.retag_models, add, remove, replace, hashes, tag, model_type)
+
+
+@router.post('/models/activate')
+async def activate_models(hashes: list[str], dry_run: bool = False, installation: str = DEFAULT_INSTALLATION) -> dict:
+    if not dry_run:
+        return {'job': jobs.submit('activate', archivist.move_models, hashes, False, False, installation)}
+    try:
+        return await run_blocking(archivist.move_models, hashes, False, True, installation)
+    except ArchivistException as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post('/models/archive')
+async def archive_models(hashes: list[str], dry_run: bool = False, installation: str = DEFAULT_INSTALLATION) -> dict:
+    if not dry_run:
+        return {'job': jobs.submit('archive', archivist.move_models, hashes, True, False, installation)}
+    try:
+        return await run_blocking(archivist.move_models, hashes, True, True, installation)
+    except ArchivistException as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -6,6 +6,7 @@
 
 from backend.db.repository import repo
 from backend.model.object_types import Taggable
+from backend.server.executor import run_blocking
 
 from fastapi import APIRouter, HTTPException
 
@@ -26,5 +27,5 @@ async def get_tags(target: str = 'all', offset: int = 0, limit: int = 0) -> list
             target_types = {Taggable.MODEL, Taggable.WORKFLOW, Taggable.COLLECTION}
         case _:
             raise HTTPException(status_code=400, detail=f'{target} is not a taggable object')
-    tags = repo.get_tags(target_types, offset, limit)
+    tags = await run_blocking(repo.get_tags, target_types, offset, limit)
     return tags
@@ -0,0 +1,30 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: thumbnails.py
+# purpose: Thumbnails of example images
+# ---------------------------------------------------------------------------
+
+from backend.model.thumbnails import thumbnails
+from backend.model.object_types import ArchivistException, ArchivistError
+from backend.server.executor import run_blocking
+
+from fastapi import APIRouter, HTTPException, Path
+from fastapi.responses import FileResponse
+
+router = APIRouter()
+
+
+@router.get('/thumbnails/{digest}/{size}')
+async def get_thumbnail(size: int, digest: str = Path(pattern='^[0-9a-f]{64}$')) -> FileResponse:
+    """
+    A thumbnail by content digest. The same URL always means the same image, so it may be cached forever.
+    """
+    try:
+        path = await run_blocking(thumbnails.get, digest, size)
+    except ArchivistException as e:
+        status = 501 if e.code == ArchivistError.THUMBNAILS_UNAVAILABLE else 400
+        raise HTTPException(status_code=status, detail=str(e))
+    if path is None:
+        raise HTTPException(status_code=404, detail=f'No image {digest}')
+    return FileResponse(path, media_type='image/webp',
+                        headers={'Cache-Control': 'public, max-age=31536000, immutable'})
@@ -0,0 +1,29 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: workflows.py
+# purpose: REST interface for workflows
+# ---------------------------------------------------------------------------
+
+from backend.model.archivist import archivist
+from backend.model.jobs import jobs
+from backend.model.object_types import ArchivistException
+from backend.server.executor import run_blocking
+
+from fastapi import APIRouter, HTTPException
+
+router = APIRouter()
+
+
+@router.get('/workflows/{workflow_id}/models')
+async def get_workflow_models(workflow_id: str) -> dict:
+    return await run_blocking(archivist.get_workflow_models, workflow_id)
+
+
+@router.post('/workflows/{workflow_id}/activate')
+async def activate_workflow(workflow_id: str, dry_run: bool = False) -> dict:
+    if not dry_run:
+        return {'job': jobs.submit('activate_workflow', archivist.activate_workflow, workflow_id, False)}
+    try:
+        return await run_blocking(archivist.activate_workflow, workflow_id, True)
+    except ArchivistException as e:
+        raise HTTPException(status_code=409, detail=str(e))
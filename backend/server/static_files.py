@@ -0,0 +1,82 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: static_files.py
+# purpose: Serving the SvelteKit build
+# ---------------------------------------------------------------------------
+
+import os
+import stat
+import mimetypes
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+IMMUTABLE_PREFIX = '_app/immutable/'
+# preferred first; the files are written next to the originals by the adapter's precompress option
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepted_encodings(scope) -> set[str]:
+    accepted = set()
+    for item in Headers(scope=scope).get('accept-encoding', '').split(','):
+        name, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class SPAStaticFiles(StaticFiles):
+    """
+    The GUI build. Files under _app/immutable have content hashes in their names and are cached forever;
+    everything else, index.html in particular, is revalidated on every load, which costs a 304 when nothing
+    changed. Where the build has a .br or .gz next to a file and the client accepts it, that is sent
+    instead, so nothing is compressed at request time. Paths without a file extension are client-side
+    routes and get index.html.
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        served = path
+        response = await self.precompressed_response(path, scope)
+        if response is None:
+            try:
+                response = await super().get_response(path, scope)
+            except HTTPException as e:
+                if e.status_code != 404 or os.path.splitext(path)[1]:
+                    raise
+                served = 'index.html'
+                response = await super().get_response(served, scope)
+        response.headers['Cache-Control'] = self.cache_control(served)
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    async def precompressed_response(self, path: str, scope) -> Response | None:
+        if scope['method'] not in ('GET', 'HEAD'):
+            return None
+        accepted = accepted_encodings(scope)
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding not in accepted:
+                continue
+            try:
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            except (OSError, ValueError):
+                continue
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            response = self.file_response(full_path, stat_result, scope)
+            if response.status_code == 200:
+                media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                if media_type.startswith('text/'):
+                    media_type += '; charset=utf-8'
+                response.headers['Content-Encoding'] = encoding
+                response.headers['Content-Type'] = media_type
+            return response
+        return None
+
+    @staticmethod
+    def cache_control(path: str) -> str:
+        if path.startswith(IMMUTABLE_PREFIX):
+            return 'public, max-age=31536000, immutable'
+        return 'no-cache'
@@ -0,0 +1,100 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: library.py
+# purpose: Synthetic ComfyUI library generator for benchmarks
+# ---------------------------------------------------------------------------
+
+import json
+import random
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, field
+
+TYPES = ['checkpoints', 'loras', 'vae', 'controlnet', 'embeddings', 'upscale_models', 'text_encoders']
+
+
+@dataclass
+class LibrarySpec:
+    models: int = 2000
+    model_size: int = 64 << 20          # apparent size; files are sparse
+    types: list[str] = field(default_factory=lambda: list(TYPES))
+    sidecar_ratio: float = 0.9          # share of models that already have a .metadata.json
+    archive_ratio: float = 0.5          # share of models placed in the archive tree
+    extra_ratio: float = 0.1            # share of models placed in the extra_model_paths folders
+    extras_per_model: int = 1           # preview images etc. next to the model
+    example_ratio: float = 0.2          # share of models with an examples/<hash> folder
+    subfolders: int = 4                 # subfolders per type folder
+    seed: int = 1
+
+
+def write_sparse(path: Path, size: int, marker: bytes) -> None:
+    """
+    Write a unique marker and extend the file to size without allocating the rest.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('wb') as f:
+        f.write(marker)
+        f.truncate(max(size, len(marker)))
+
+
+def generate_library(root: Path, spec: LibrarySpec) -> dict:
+    """
+    Build a ComfyUI tree under root:
+        ComfyUI/models/<type>/[sub_n/]model_i.safetensors (+ .metadata.json, .preview.png)
+        ComfyUI/models/examples/<hash>/example_k.png
+        archive/<type>/...
+        extra/<type>/... with extra_model_paths.yaml and extra_archive/
+    Sidecars carry a made-up but unique sha256, so scans that trust sidecars do not read the models;
+    models without a sidecar get hashed on the first scan. Returns a summary of what was created.
+    """
+    rng = random.Random(spec.seed)
+    models_root = root / 'ComfyUI' / 'models'
+    archive_root = root / 'archive'
+    extra_root = root / 'extra'
+    extra_archive = root / 'extra_archive'
+    for t in spec.types:
+        for base in (models_root, archive_root, extra_root, extra_archive):
+            (base / t).mkdir(parents=True, exist_ok=True)
+
+    summary = {'models': 0, 'sidecars': 0, 'extras': 0, 'examples': 0, 'archived': 0, 'in_extra': 0}
+    for i in range(spec.models):
+        model_type = spec.types[i % len(spec.types)]
+        placement = rng.random()
+        if placement < spec.extra_ratio:
+            base = extra_root
+            summary['in_extra'] += 1
+        elif placement < spec.extra_ratio + spec.archive_ratio:
+            base = archive_root
+            summary['archived'] += 1
+        else:
+            base = models_root
+        sub = rng.randrange(spec.subfolders + 1)
+        folder = base / model_type / (f'sub_{sub}' if sub < spec.subfolders else '')
+        stem = f'model_{i:06d}'
+        marker = f'synthetic model {i} {spec.seed}'.encode()
+        write_sparse(folder / f'{stem}.safetensors', spec.model_size, marker)
+        summary['models'] += 1
+
+        fake_hash = hashlib.sha256(marker).hexdigest()
+        if rng.random() < spec.sidecar_ratio:
+            sidecar = {'model_name': stem, 'tags': [f'tag_{rng.randrange(50)}', model_type], 'sha256': fake_hash}
+            (folder / f'{stem}.metadata.json').write_text(json.dumps(sidecar), encoding='utf-8')
+            summary['sidecars'] += 1
+        for k in range(spec.extras_per_model):
+            (folder / f'{stem}.preview{k or ""}.png').write_bytes(b'\x89PNG\r\n\x1a\n' + marker)
+            summary['extras'] += 1
+        if rng.random() < spec.example_ratio:
+            examples = base / 'examples' / fake_hash
+            examples.mkdir(parents=True, exist_ok=True)
+            (examples / 'example_0.png').write_bytes(b'\x89PNG\r\n\x1a\n' + marker)
+            summary['examples'] += 1
+
+    yaml_file = root / 'extra_model_paths.yaml'
+    lines = ['comfyui:', f'    base_path: {extra_root}']
+    lines += [f'    {t}: {t}' for t in spec.types]
+    yaml_file.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    summary.update({'models_root': str(models_root), 'archive_root': str(archive_root),
+                    'extra_root': str(extra_root), 'extra_archive': str(extra_archive),
+                    'extra_model_paths': str(yaml_file)})
+    return summary
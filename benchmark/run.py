@@ -0,0 +1,240 @@
+# ---------------------------------------------------------------------------
+# system: ModelArchivist
+# file: run.py
+# purpose: Benchmarks for the scan, hash, database and API paths
+# ---------------------------------------------------------------------------
+"""
+Run from the repository root:
+    python -m benchmark.run --models 5000 --output bench.json [--baseline old.json]
+"""
+
+import argparse
+import json
+import time
+import tempfile
+import platform
+import subprocess
+import sys
+import tracemalloc
+from pathlib import Path
+from dataclasses import asdict, replace
+
+from backend.model.file_handler import scan_models, compute_sha256
+from .library import LibrarySpec, generate_library
+
+EXTENSIONS = ['.safetensors', '.sft', '.ckpt', '.pt', '.pth', '.gguf']
+
+
+class Bench:
+    def __init__(self) -> None:
+        self.results = {}
+
+    def measure(self, name: str, fn, unit: str = 'items') -> object:
+        """
+        Run fn once; fn returns (number of items processed, value). Records elapsed time and rate.
+        """
+        started = time.perf_counter()
+        items, value = fn()
+        elapsed = time.perf_counter() - started
+        self.results[name] = {'seconds': elapsed, unit: items,
+                              f'{unit}_per_second': items / elapsed if elapsed > 0 else None}
+        print(f'{name:28} {elapsed:9.3f} s  {items:>12} {unit}')
+        return value
+
+    def skip(self, name: str, reason: str) -> None:
+        self.results[name] = {'skipped': reason}
+        print(f'{name:28} skipped: {reason}')
+
+
+def scan_all(library: dict, types: list[str]) -> tuple[int, list]:
+    found = []
+    for t in types:
+        found += [(t, m) for m in scan_models(Path(library['models_root']) / t, Path(library['archive_root']) / t,
+                                              EXTENSIONS, False)]
+        found += [(t, m) for m in scan_models(Path(library['extra_root']) / t, Path(library['extra_archive']) / t,
+                                              EXTENSIONS, False)]
+    return len(found), found
+
+
+def stream_scan(library: dict, types: list[str]) -> tuple[int, int]:
+    """
+    Scan without keeping the models found, as the scanner does; returns the models seen and the peak of
+    memory allocated meanwhile.
+    """
+    count = 0
+    tracemalloc.start()
+    try:
+        for t in types:
+            for root, archive in (('models_root', 'archive_root'), ('extra_root', 'extra_archive')):
+                for _ in scan_models(Path(library[root]) / t, Path(library[archive]) / t, EXTENSIONS, False):
+                    count += 1
+        return count, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_memory(bench: Bench, root: Path, spec: LibrarySpec) -> None:
+    """
+    Peak memory of a streaming scan of a library and of one four times its size; the peak should hardly grow.
+    Small files with sidecars throughout, so that what is measured is the walk and not the hashing.
+    """
+    for name, models in (('scan_memory_quarter', max(1, spec.models // 4)), ('scan_memory_full', spec.models)):
+        small = replace(spec, models=models, model_size=4096, sidecar_ratio=1.0)
+        library = generate_library(root / name, small)
+        peak = bench.measure(name, lambda: stream_scan(library, small.types))
+        bench.results[name]['peak_bytes'] = peak
+        print(f'{"":28} peak {peak / (1 << 20):9.2f} MiB')
+
+
+def hash_files(library: dict, count: int, size: int) -> tuple[int, None]:
+    files = sorted(Path(library['models_root']).rglob('*.safetensors'))[:count]
+    for f in files:
+        compute_sha256(f)
+    return len(files) * size, None
+
+
+def make_models(found: list, scan_id: str) -> list:
+    from backend.db.tables import Model, Component
+    models = []
+    for type_name, record in found:
+        archive_count = sum(1 if is_archive else 0 for fn, ft, is_archive in record.files)
+        models.append((Model(hash=record.hash,
+                             name=record.name,
+                             relative_path=record.relative_path,
+                             type=type_name,
+                             active_type_dir='',
+                             archive_type_dir='',
+                             is_archived=archive_count > 0,
+                             is_active=archive_count < len(record.files),
+                             last_scan_id=scan_id,
+                             components=[Component(file_name=str(file_path.name),
+                                                   file_dir=str(file_path.parent),
+                                                   component_type=file_type,
+                                                   is_archive=is_archive,
+                                                   last_scan_id=scan_id)
+                                         for file_path, file_type, is_archive in record.files]),
+                       record.tags, record.digests))
+    return models
+
+
+def run_database(bench: Bench, found: list, db_path: Path) -> None:
+    try:
+        from backend.db.repository import repo
+    except ImportError as e:
+        bench.skip('save_model', str(e))
+        return
+    repo.attach(db_path)
+
+    def save(scan_id):
+        def fn():
+            for model, tags, digests in make_models(found, scan_id):
+                repo.save_model(model, tags, digests=digests)
+            return len(found), None
+        return fn
+
+    def save_batched(scan_id, batch_size=200):
+        def fn():
+            models = make_models(found, scan_id)
+            for i in range(0, len(models), batch_size):
+                repo.save_models(models[i:i + batch_size])
+            return len(found), None
+        return fn
+
+    bench.measure('save_model_insert', save('bench-1'))
+    bench.measure('save_model_update', save('bench-2'))
+    bench.measure('save_models_batched', save_batched('bench-3'))
+    # every row now carries the last scan id, so the clean removes nothing and the reads below see all models
+    bench.measure('clean_repository', lambda: (len(found), repo.clean_repository('bench-3')))
+    bench.measure('get_models', lambda: (len(list(repo.get_models(True))), None))
+
+    try:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from backend.server.routers import tags
+    except ImportError as e:
+        bench.skip('api_tags', str(e))
+        return
+    app = FastAPI()
+    app.include_router(tags.router)
+    client = TestClient(app)
+
+    def get_tags():
+        response = client.get('/tags', params={'target': 'models'})
+        response.raise_for_status()
+        return len(response.json()), None
+
+    bench.measure('api_tags', get_tags)
+
+
+def run_startup(bench: Bench, library: dict, root: Path) -> None:
+    """
+    Cold start: the imports of the entry point up to the configuration, then resolving the folders without
+    and with the snapshot.
+    """
+    def import_config():
+        subprocess.run([sys.executable, '-c', 'import backend.config'], check=True)
+        return 1, None
+
+    bench.measure('import_config', import_config)
+    from backend.config import Configuration, ConfigFolders, ModelOptions, WebConfig, ConfigOptions
+    cfg_file = root / 'config.toml'
+    cfg_file.write_text('', encoding='utf-8')
+    comfy_root = Path(library['models_root']).parent
+
+    def resolve(use_snapshot):
+        def fn():
+            folders = ConfigFolders(comfy=str(comfy_root), archive=library['archive_root'], database='',
+                                    extra_models=[], workflows=[])
+            cfg = Configuration(folders=folders, models=ModelOptions(extensions=EXTENSIONS, types={}),
+                                web=WebConfig(base_url='', port=0), options=ConfigOptions())
+            cfg.resolve_paths(root, root, cfg_file, use_snapshot)
+            return len(cfg.model_folders), None
+        return fn
+
+    bench.measure('resolve_paths_fresh', resolve(False))
+    bench.measure('resolve_paths_snapshot', resolve(True))
+
+
+def compare(results: dict, baseline: dict) -> None:
+    print('\nchange against baseline (time):')
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name, {})
+        if 'seconds' in result and old.get('seconds'):
+            print(f'{name:28} {result["seconds"] / old["seconds"]:7.2f}x')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', type=int, default=2000, help='number of synthetic models')
+    parser.add_argument('--model-size', type=int, default=64 << 20, help='apparent size of each model file')
+    parser.add_argument('--hash-files', type=int, default=3, help='number of files to hash')
+    parser.add_argument('--workdir', default=None, help='where to build the library, default a temp dir')
+    parser.add_argument('--output', default=None, help='JSON file for the results')
+    parser.add_argument('--baseline', default=None, help='JSON results to compare with')
+    args = parser.parse_args()
+
+    spec = LibrarySpec(models=args.models, model_size=args.model_size)
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        root = Path(tmp)
+        bench = Bench()
+        library = bench.measure('generate_library', lambda: (spec.models, generate_library(root, spec)))
+        bench.measure('scan_models_first', lambda: scan_all(library, spec.types))
+        found = bench.measure('scan_models_repeat', lambda: scan_all(library, spec.types))
+        run_memory(bench, root / 'memory', spec)
+        bench.measure('compute_sha256', lambda: hash_files(library, args.hash_files, spec.model_size), unit='bytes')
+        run_database(bench, found, root / 'bench.db')
+        run_startup(bench, library, root)
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'spec': asdict(spec),
+              'results': bench.results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    if args.baseline:
+        compare(bench.results, json.loads(Path(args.baseline).read_text(encoding='utf-8')))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,10 @@ export type ModelRecord = {
     name: string,
     type: string,
     active: boolean,
-    archived: boolean
+    archived: boolean,
+    architecture: string,
+    precision: string,
+    parameters: number
 };
 
 export interface GetTagsOptions {
@@ -67,3 +70,137 @@ export async function getTags(target: str, offset?: number, limit?: number): Pro
     }
     return await res.json();
 }
+
+export type ScanProgress = {
+    id: string,
+    status: string,
+    errors: string[],
+    elapsed: number,
+    eta: number | null,
+    directories: number,
+    files: number,
+    expected_files: number,
+    bytes_hashed: number,
+    hash_throughput: number,
+    rows_written: number,
+    models: number,
+    workflows: number,
+    workers: Record<string, Record<string, string>>
+};
+
+export async function startScan(): Promise<string> {
+    const url = new URL('/admin/scan', base_url);
+    const res = await fetch(url, { method: "POST" });
+    if (!res.ok) {
+        throw new Error(`POST /admin/scan failed: ${res.status} ${res.statusText}`);
+    }
+    return await res.json();
+}
+
+export function subscribeScanProgress(scanId: string, onProgress: (p: ScanProgress) => void,
+                                      onDone?: (p: ScanProgress) => void): EventSource {
+    const url = new URL(`/admin/scan/${scanId}/events`, base_url);
+    const source = new EventSource(url);
+    source.addEventListener("progress", (e) => onProgress(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener("done", (e) => {
+        source.close();
+        if (onDone) {
+            onDone(JSON.parse((e as MessageEvent).data));
+        }
+    });
+    return source;
+}
+
+export type ModelExample = {
+    name: string,
+    digest: string,
+    sizes: number[]
+};
+
+export async function getModelExamples(hash: string): Promise<ModelExample[]> {
+    const url = new URL(`/models/${hash}/examples`, base_url);
+    const res = await fetch(url);
+    if (!res.ok) {
+        throw new Error(`GET /models/${hash}/examples failed: ${res.status} ${res.statusText}`);
+    }
+    return await res.json();
+}
+
+/* The smallest rendered size that covers the requested one; these URLs are immutable. */
+export function thumbnailUrl(example: ModelExample, size: number): string {
+    const rendered = example.sizes.find((s) => s >= size) ?? example.sizes[example.sizes.length - 1];
+    return new URL(`/thumbnails/${example.digest}/${rendered}`, base_url).toString();
+}
+
+export type DigestMatch = {
+    hash: string,
+    name: string,
+    type: string,
+    algorithm: string,
+    digest: string
+};
+
+export async function findByDigest(digest: string, algorithm?: string): Promise<DigestMatch[]> {
+    const url = new URL(`/models/by-digest/${digest}`, base_url);
+    if (algorithm) {
+        url.searchParams.set("algorithm", algorithm);
+    }
+    const res = await fetch(url);
+    if (!res.ok) {
+        throw new Error(`GET /models/by-digest/${digest} failed: ${res.status} ${res.statusText}`);
+    }
+    return await res.json();
+}
+
+export type TagSelection = {
+    hashes?: string[],
+    tag?: string,
+    type?: string
+};
+
+export type RetagResult = {
+    models: number,
+    job: string | null
+};
+
+export async function retagModels(selection: TagSelection, add: string[], remove: string[],
+                                  replace = false): Promise<RetagResult> {
+    const url = new URL('/models/tags', base_url);
+    const res = await fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ ...selection, add, remove, replace })
+    });
+    if (!res.ok) {
+        throw new Error(`POST /models/tags failed: ${res.status} ${res.statusText}`);
+    }
+    return await res.json();
+}
+
+export type ModelChange = {
+    seq: number,
+    hash: string,
+    kind: 'added' | 'removed' | 'state' | 'files' | 'tags',
+    detail: Record<string, string[]> | null
+};
+
+export type ChangeFeed = {
+    complete: boolean,
+    last: number,
+    more: boolean,
+    changes: ModelChange[],
+    models: ModelRecord[]
+};
+
+export async function getChanges(since: number, limit?: number): Promise<ChangeFeed> {
+    const url = new URL('/changes', base_url);
+    url.searchParams.set("since", String(since));
+    if (limit) {
+        url.searchParams.set("limit", String(limit));
+    }
+    const res = await fetch(url);
+    if (!res.ok) {
+        throw new Error(`GET /changes failed: ${res.status} ${res.statusText}`);
+    }
+    return await res.json();
+}
@@ -14,7 +14,7 @@ const config = {
             pages: 'build',
             assets: 'build',
             fallback: 'index.html',
-            precompress: false,
+            precompress: true,   // .br and .gz next to each file, served by SPAStaticFiles
             strict: true
         })
     }
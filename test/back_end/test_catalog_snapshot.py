@@ -0,0 +1,42 @@
+from backend.db.repository import repo
+from backend.db.tables import Model, Component, Collection
+from backend.model.catalog_snapshot import snapshot_lines, import_catalog
+from backend.model.object_types import ComponentFileType
+from sqlmodel import Session, select
+import os
+
+
+def scanned_model(folder, name: str) -> Model:
+    path = folder / f'{name}.safetensors'
+    path.write_bytes(name.encode() * 100)
+    stat = path.stat()
+    component = Component(file_name=path.name, file_dir=str(folder), component_type=ComponentFileType.MODEL,
+                          is_archive=False, file_size=stat.st_size, file_mtime_ns=stat.st_mtime_ns,
+                          installation='default', last_scan_id='s1')
+    return Model(hash=name * 8, name=name, type='loras', relative_path='.', active_type_dir=str(folder),
+                 archive_type_dir='/archive', is_active=True, is_archived=False, last_scan_id='s1',
+                 components=[component])
+
+
+class TestCatalogSnapshot:
+    def test_round_trip(self, tmp_path):
+        repo.attach(tmp_path / 'old.db')
+        repo.save_model(scanned_model(tmp_path, 'a'), ['style'], digests={'autov2': 'aaaaaaaaaa'})
+        repo.save_model(scanned_model(tmp_path, 'b'), [])
+        with Session(repo.engine) as session:
+            collection = Collection(name='c', purpose='', is_active=False)
+            collection.models = list(session.exec(select(Model)).all())
+            session.add(collection)
+            session.commit()
+        lines = list(snapshot_lines(repo))
+
+        # b has changed since it was hashed, so its hash cannot be trusted
+        os.utime(tmp_path / 'b.safetensors', ns=(0, 0))
+        repo.attach(tmp_path / 'new.db')
+        report = import_catalog(repo, lines)
+        assert report['models'] == 1 and report['changed'] == 1
+        assert repo.get_model_digests('a' * 8)['autov2'] == 'aaaaaaaaaa'
+        with Session(repo.engine) as session:
+            model = session.get(Model, 'a' * 8)
+            assert model.is_active and [tag.tag for tag in model.tags] == ['style']
+            assert [m.hash for m in session.get(Collection, 1).models] == ['a' * 8]
@@ -0,0 +1,69 @@
+import pytest
+from sqlmodel import Session
+
+from backend.db.repository import repo
+from backend.db.tables import Model, Component, Collection, CollectionCollectionLink, ModelCollectionLink
+from backend.model.file_handler import check_destinations
+from backend.model.object_types import ComponentFileType, ArchivistException, ArchivistError
+
+
+def model(hash: str, active: bool, installation: str = 'default') -> Model:
+    component = Component(file_name=f'{hash}.safetensors', file_dir='/a/loras' if active else '/archive/loras',
+                          component_type=ComponentFileType.MODEL, is_archive=not active, file_size=10,
+                          installation=installation if active else '', last_scan_id='s1')
+    return Model(hash=hash, name=hash, type='loras', relative_path='.', active_type_dir='/a/loras',
+                 archive_type_dir='/archive/loras', is_active=active, is_archived=not active, last_scan_id='s1',
+                 components=[component])
+
+
+class TestCollections:
+    @pytest.fixture
+    def collections(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+        repo.save_model(model('inner', False), [])
+        repo.save_model(model('outer', True), [])
+        repo.save_model(model('stray', True), [])
+        repo.save_model(model('kept', True), [])
+        repo.save_model(model('elsewhere', True, 'b'), [], installation='b')
+        with Session(repo.engine) as session:
+            outer = Collection(id=1, name='outer', purpose='', is_active=False)
+            inner = Collection(id=2, name='inner', purpose='', is_active=False)
+            kept = Collection(id=3, name='kept', purpose='', is_active=True)
+            session.add_all([outer, inner, kept])
+            session.add_all([CollectionCollectionLink(master_collection_id=1, child_collection_id=2),
+                             CollectionCollectionLink(master_collection_id=2, child_collection_id=1),
+                             ModelCollectionLink(model_id='outer', collection_id=1),
+                             ModelCollectionLink(model_id='inner', collection_id=2),
+                             ModelCollectionLink(model_id='elsewhere', collection_id=2),
+                             ModelCollectionLink(model_id='kept', collection_id=3)])
+            session.commit()
+
+    def test_plan(self, collections):
+        # inner is reached through the child collection, despite the cycle back to outer;
+        # elsewhere is only active in installation b, so it still has to be activated here
+        to_activate, to_archive = repo.get_collection_plan(1, exclusive=False)
+        assert sorted(m.hash for m in to_activate) == ['elsewhere', 'inner']
+        assert to_archive == []
+
+        # exclusive archives what no active collection needs, in this installation only
+        to_activate, to_archive = repo.get_collection_plan(1, exclusive=True)
+        assert sorted(m.hash for m in to_activate) == ['elsewhere', 'inner']
+        assert [m.hash for m in to_archive] == ['stray']
+
+        # from the child, the cycle brings in the parent's models; b's only active model is required
+        to_activate, to_archive = repo.get_collection_plan(2, exclusive=True, installation='b')
+        assert sorted(m.hash for m in to_activate) == ['inner', 'outer']
+        assert to_archive == []
+
+        with pytest.raises(ArchivistException) as error:
+            repo.get_collection_plan(9, exclusive=False)
+        assert error.value.code == ArchivistError.UNKNOWN_COLLECTION
+
+    def test_destinations_checked_first(self, tmp_path):
+        (tmp_path / 'a.safetensors').touch()
+        (tmp_path / 'taken.safetensors').touch()
+        moves = [(1, tmp_path / 'a.safetensors', tmp_path / 'free.safetensors', 0),
+                 (2, tmp_path / 'b.safetensors', tmp_path / 'taken.safetensors', 0)]
+        with pytest.raises(ArchivistException):
+            check_destinations(moves)
+        assert (tmp_path / 'a.safetensors').exists()
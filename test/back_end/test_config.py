@@ -0,0 +1,45 @@
+from pathlib import Path
+from backend.config import load_config, Configuration, ConfigFolders, ModelOptions, WebConfig, ConfigOptions
+
+
+def make_config(root: Path) -> Configuration:
+    folders = ConfigFolders(comfy=str(root / 'ComfyUI'), archive=str(root / 'archive'), database='',
+                            extra_models=[], workflows=[])
+    return Configuration(folders=folders, models=ModelOptions(extensions=['.safetensors'], types={}),
+                         web=WebConfig(base_url='', port=0), options=ConfigOptions())
+
+
+class TestConfigSnapshot:
+    def test_snapshot_reused_until_inputs_change(self, tmp_path):
+        (tmp_path / 'ComfyUI' / 'models' / 'loras').mkdir(parents=True)
+        (tmp_path / 'archive').mkdir()
+        cfg_file = tmp_path / 'config.toml'
+        cfg_file.write_text('')
+
+        first = make_config(tmp_path)
+        first.resolve_paths(tmp_path, tmp_path, cfg_file)
+        assert set(first.model_folders) == {'loras'}
+        assert (tmp_path / 'archive' / 'loras').is_dir()
+
+        second = make_config(tmp_path)
+        second.resolve_folders = None  # would fail if called
+        second.resolve_paths(tmp_path, tmp_path, cfg_file)
+        assert second.model_folders == first.model_folders
+
+        (tmp_path / 'archive' / 'vae').mkdir()
+        third = make_config(tmp_path)
+        third.resolve_paths(tmp_path, tmp_path, cfg_file)
+        assert set(third.model_folders) == {'loras', 'vae'}
+
+    def test_user_folder_from_command_line(self, tmp_path):
+        (tmp_path / 'ComfyUI' / 'models' / 'loras').mkdir(parents=True)
+        (tmp_path / 'archive').mkdir()
+        (tmp_path / 'user').mkdir()
+        cfg_file = tmp_path / 'config.toml'
+        cfg_file.write_text(make_config(tmp_path).to_toml_string())
+
+        # argparse passes both as strings
+        cfg = load_config(str(cfg_file), str(tmp_path / 'user'))
+        assert cfg.user_root == tmp_path / 'user'
+        assert (tmp_path / 'user' / '.config.resolved.json').is_file()
+        assert set(cfg.model_folders) == {'loras'}
@@ -1,4 +1,11 @@
-from app.db.repository import repo
+from sqlmodel import Session, select
+from backend.db.repository import repo
+from backend.db.generations import generations
+from backend.db.tables import Model, Component, TagModelLink
+from backend.model.object_types import ComponentFileType, Taggable
+from pathlib import Path
+import json
+import threading
 
 
 class TestDB:
@@ -7,3 +14,127 @@ class TestDB:
         assert (not repo_path.is_file())
         repo.attach(repo_path, False)
         assert (repo_path.is_file())
+
+    def test_components_under_directory(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+        files = [('/lib/loras', 'a.safetensors'), ('/lib/loras/sub', 'b.safetensors'),
+                 ('/lib/loras-old', 'c.safetensors')]
+        components = [Component(file_name=name, file_dir=folder, component_type=ComponentFileType.MODEL,
+                                is_archive=False, file_size=1, last_scan_id='s1') for folder, name in files]
+        repo.save_model(Model(hash='h', name='m', type='loras', relative_path='.', active_type_dir='/lib/loras',
+                              archive_type_dir='/archive/loras', is_active=True, is_archived=False, last_scan_id='s1',
+                              components=components), [])
+        under = repo.get_components_under('/lib/loras')
+        assert sorted(c.file_name for c in under) == ['a.safetensors', 'b.safetensors']
+        assert [c.file_dir for c in repo.get_components_under('/lib/loras/sub/')] == ['/lib/loras/sub']
+
+    def test_batch_skips_duplicates(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+
+        def scanned(model_hash, scan_id):
+            component = Component(file_name=f'{model_hash}.safetensors', file_dir='/lib/loras',
+                                  component_type=ComponentFileType.MODEL, is_archive=False, file_size=1,
+                                  last_scan_id=scan_id)
+            return Model(hash=model_hash, name=model_hash, type='loras', relative_path='.', active_type_dir='/lib/loras',
+                         archive_type_dir='/archive/loras', is_active=True, is_archived=False, last_scan_id=scan_id,
+                         components=[component])
+
+        errors = repo.save_models([(scanned('a', 's1'), ['x'], None), (scanned('b', 's1'), ['x'], None),
+                                   (scanned('a', 's1'), [], None)])
+        assert len(errors) == 1
+        errors = repo.save_models([(scanned('a', 's2'), [], {'autov2': 'a' * 10}), (scanned('c', 's2'), [], None)])
+        assert errors == []
+        assert sorted(m.hash for m in repo.get_models(True)) == ['a', 'b', 'c']
+        assert len(repo.get_components_under('/lib/loras')) == 3
+
+    def test_retag_selection(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+
+        def scanned(name, model_type, scan_id):
+            sidecar = Component(file_name=f'{name}.metadata.json', file_dir='/lib', is_archive=False, file_size=1,
+                                component_type=ComponentFileType.METADATA, last_scan_id=scan_id)
+            return Model(hash=name, name=name, type=model_type, relative_path='.', active_type_dir='/lib',
+                         archive_type_dir='/archive', is_active=True, is_archived=False, last_scan_id=scan_id,
+                         components=[sidecar])
+
+        def tags_of(name):
+            with Session(repo.engine) as session:
+                return list(session.exec(select(TagModelLink.tag).where(TagModelLink.model_id == name)))
+
+        for name, model_type, tags in (('a', 'loras', ['old']), ('b', 'loras', []), ('c', 'vae', ['old'])):
+            repo.save_model(scanned(name, model_type, 's1'), tags)
+        assert repo.retag_models(['new', ' '], ['old'], tag='old', model_type='loras') == ['a']
+        assert sorted(repo.retag_models(['x'], [], replace=True, hashes=['b', 'c'])) == ['b', 'c']
+        # nothing changes, so nothing is logged
+        last = repo.last_change()
+        assert repo.retag_models(['x'], ['y'], hashes=['b', 'c']) == []
+        assert repo.retag_models(['x'], [], replace=True, hashes=['b']) == []
+        assert repo.last_change() == last
+        # until their sidecars are written, a scan keeps the catalog's tags over the sidecars' old ones
+        repo.save_model(scanned('a', 'loras', 's2'), ['old'])
+        assert tags_of('a') == ['new']
+        assert sorted(repo.take_sidecar_tags(['a', 'b', 'c'])) == [(Path('/lib/a.metadata.json'), ['new']),
+                                                                    (Path('/lib/b.metadata.json'), ['x']),
+                                                                    (Path('/lib/c.metadata.json'), ['x'])]
+        # from then on the sidecar is followed again, unless tags are not written through to sidecars
+        repo.save_model(scanned('a', 'loras', 's3'), ['edited'])
+        assert tags_of('a') == ['edited']
+        repo.save_model(scanned('a', 'loras', 's4'), ['other'], sidecar_tags=False)
+        assert tags_of('a') == ['edited']
+
+    def test_reads_keep_generation_during_scan(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+
+        def scanned(model_hash):
+            return Model(hash=model_hash, name=model_hash, type='loras', relative_path='.', active_type_dir='/lib',
+                         archive_type_dir='/archive', is_active=True, is_archived=False, last_scan_id='s1')
+
+        repo.save_model(scanned('a'), ['x'])
+        generations.hold()
+        repo.save_model(scanned('b'), ['y'])
+        assert [m.hash for m in repo.get_models(True)] == ['a']
+        assert repo.get_tags({Taggable.MODEL}, 0, 0) == ['x']
+
+        # a reader part way through does not hold up another one
+        models = repo.get_models(True)
+        next(models)
+        reader = threading.Thread(target=repo.get_tags, args=({Taggable.MODEL}, 0, 0))
+        reader.start()
+        reader.join(5)
+        assert not reader.is_alive()
+        models.close()
+
+        # a user's change is seen at once, with what the scan has saved so far
+        repo.retag_models(['z'], [], hashes=['a'])
+        assert [m.hash for m in repo.get_models(True)] == ['a', 'b']
+        repo.save_model(scanned('c'), [])
+        assert len(list(repo.get_models(True))) == 2
+        # as is everything, once the WAL is over its limit
+        generations.wal_limit = 0
+        generations.bound_wal()
+        generations.wal_limit = 256 << 20
+        assert len(list(repo.get_models(True))) == 3
+        generations.release()
+        assert [m.hash for m in repo.get_models(True)] == ['a', 'b', 'c']
+
+    def test_change_log(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+
+        def scanned(scan_id, *files):
+            components = [Component(file_name=name, file_dir='/lib', component_type=ComponentFileType.MODEL,
+                                    is_archive=False, file_size=1, last_scan_id=scan_id) for name in files]
+            return Model(hash='a', name='a', type='loras', relative_path='.', active_type_dir='/lib',
+                         archive_type_dir='/archive', is_active=True, is_archived=False, last_scan_id=scan_id,
+                         components=components)
+
+        repo.save_model(scanned('s1', 'a.safetensors'), [])
+        repo.save_model(scanned('s2', 'a.safetensors'), [])
+        repo.save_model(scanned('s3', 'a.safetensors', 'a.png'), ['x'])
+        repo.retag_models([], ['x'], hashes=['a'])
+        repo.clean_repository('s4')
+        changes, first, last = repo.get_changes(0, 100)
+        assert [(c.seq, c.kind) for c in changes] == [(1, 'added'), (2, 'tags'), (3, 'files'), (4, 'tags'),
+                                                      (5, 'removed')]
+        assert json.loads(changes[2].detail) == {'added': ['a.png'], 'removed': []}
+        assert repo.compact_changes(2) == 3
+        assert repo.get_changes(4, 100)[1:] == (4, 5)
@@ -0,0 +1,40 @@
+from backend.db.repository import repo
+from backend.db.tables import Model
+from backend.model.file_handler import compute_digests, ensure_metadata
+import hashlib
+import json
+import zlib
+
+
+class TestDigests:
+    def test_single_pass(self, tmp_path):
+        path = tmp_path / 'model.safetensors'
+        data = bytes(range(256)) * 50
+        path.write_bytes(data)
+        digests = compute_digests(path, ['sha256', 'autov2', 'blake2b', 'crc32'], chunk_size=1000)
+        sha256 = hashlib.sha256(data).hexdigest()
+        assert digests == {'sha256': sha256, 'autov2': sha256[:10], 'blake2b': hashlib.blake2b(data).hexdigest(),
+                           'crc32': f'{zlib.crc32(data):08x}'}
+
+    def test_only_missing_digests_are_read(self, tmp_path):
+        path = tmp_path / 'model.safetensors'
+        path.write_bytes(b'0' * 100)
+        sidecar = tmp_path / 'model.metadata.json'
+        sidecar.write_text(json.dumps({'sha256': 'f' * 64, 'model_name': 'model', 'tags': [], 'header': {}}))
+        data = ensure_metadata(path, sidecar, False, algorithms=['autov2'])
+        # derived from the stored SHA-256, and not written back
+        assert 'digests' not in data
+        data = ensure_metadata(path, sidecar, False, algorithms=['crc32'])
+        assert data['sha256'] == 'f' * 64
+        assert data['digests'] == {'crc32': f'{zlib.crc32(b"0" * 100):08x}'}
+
+    def test_lookup_by_prefix(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+        model = Model(hash='ab' * 32, name='m', type='loras', relative_path='.', active_type_dir='/a',
+                      archive_type_dir='/b', is_active=True, is_archived=False, last_scan_id='s1')
+        repo.save_model(model, [], digests={'autov2': 'ab' * 5, 'crc32': '1234ABCD'})
+        assert [m[1] for m in repo.find_by_digest('1234abcd')] == ['crc32']
+        # the AutoV2 is a prefix of the SHA-256: one match, on the full digest
+        assert [m[1] for m in repo.find_by_digest('ABABAB')] == ['sha256']
+        assert repo.find_by_digest('ababab', algorithm='crc32') == []
+        assert repo.get_model_digests('ab' * 32)['autov2'] == 'ab' * 5
@@ -0,0 +1,41 @@
+from backend.model.duplicates import iter_model_files, find_duplicates, redundant_copies, deduplicate
+
+EXTENSIONS = ['.safetensors']
+
+
+class TestDuplicates:
+    def make_library(self, root):
+        (root / 'active').mkdir()
+        (root / 'archive').mkdir()
+        (root / 'active' / 'a.safetensors').write_bytes(b'A' * 100 + b'x')
+        (root / 'archive' / 'a_copy.safetensors').write_bytes(b'A' * 100 + b'x')
+        (root / 'archive' / 'same_size.safetensors').write_bytes(b'A' * 100 + b'y')
+        (root / 'archive' / 'notes.txt').write_bytes(b'A' * 100 + b'x')
+
+    def test_staged_groups(self, tmp_path):
+        self.make_library(tmp_path)
+        files = iter_model_files([tmp_path / 'active', tmp_path / 'archive'], EXTENSIONS)
+        groups = find_duplicates(files, span=16)
+        assert len(groups) == 1
+        assert [f.name for f in groups[0]['files']] == ['a.safetensors', 'a_copy.safetensors']
+        assert groups[0]['hash'] is not None
+
+    def test_hardlink(self, tmp_path):
+        self.make_library(tmp_path)
+        roots = [tmp_path / 'active', tmp_path / 'archive']
+        groups = find_duplicates(iter_model_files(roots, EXTENSIONS), span=16)
+        assert deduplicate(groups, 'hardlink') == [str(tmp_path / 'archive' / 'a_copy.safetensors')]
+        assert find_duplicates(iter_model_files(roots, EXTENSIONS), span=16) == []
+
+    def test_active_and_archive_copy_kept(self, tmp_path):
+        self.make_library(tmp_path)
+        (tmp_path / 'archive' / 'a_again.safetensors').write_bytes(b'A' * 100 + b'x')
+        roots = [tmp_path / 'active', tmp_path / 'archive']
+        groups = find_duplicates(iter_model_files(roots, EXTENSIONS), span=16)
+
+        def place(path):
+            return path.parent.name
+
+        assert redundant_copies([g | {'files': g['files'][:2]} for g in groups], place) == []
+        groups = redundant_copies(groups, place)
+        assert sorted(f.name for f in groups[0]['files']) == ['a_again.safetensors', 'a_copy.safetensors']
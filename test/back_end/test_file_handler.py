@@ -0,0 +1,59 @@
+from backend.model.file_handler import check_capacity, compute_sha256
+from backend.model.progress import ScanProgress
+from backend.model.sidecars import SidecarStore
+import json
+
+
+class TestCapacity:
+    def test_rename_needs_no_space(self, tmp_path):
+        source = tmp_path / 'archive' / 'loras' / 'a.safetensors'
+        source.parent.mkdir(parents=True)
+        source.write_bytes(b'0' * 16)
+        moves = [(1, source, tmp_path / 'active' / 'loras' / 'a.safetensors', 16)]
+        assert check_capacity(moves) == []
+
+    def test_missing_source_is_counted(self, tmp_path):
+        moves = [(1, tmp_path / 'gone.safetensors', tmp_path / 'active' / 'gone.safetensors', 1 << 60)]
+        report = check_capacity(moves)
+        assert len(report) == 1
+        assert report[0]['required'] == 1 << 60
+        assert not report[0]['ok']
+
+
+class TestProgress:
+    def test_hashing_is_counted(self, tmp_path):
+        path = tmp_path / 'model.safetensors'
+        path.write_bytes(b'0' * 3000)
+        progress = ScanProgress(expected_files=4)
+        compute_sha256(path, chunk_size=1024, progress=progress)
+        progress.file(2)
+        snapshot = progress.snapshot()
+        assert snapshot['bytes_hashed'] == 3000
+        assert snapshot['files'] == 2
+        assert snapshot['eta'] is not None
+
+
+class TestSidecars:
+    def test_unchanged_sidecar_is_not_reread(self, tmp_path):
+        path = tmp_path / 'model.metadata.json'
+        path.write_text(json.dumps({'sha256': 'abc', 'tags': []}), encoding='utf-8')
+        store = SidecarStore()
+        assert store.read(path)['sha256'] == 'abc'
+        changed = store.take_changed()
+        again = SidecarStore(lambda directory: changed if directory == str(tmp_path) else {})
+        assert again.read(path)['sha256'] == 'abc'
+        assert (again.hits, again.misses) == (1, 0)
+        path.write_text(json.dumps({'sha256': 'abcdef', 'tags': []}), encoding='utf-8')
+        assert again.read(path)['sha256'] == 'abcdef'
+        assert again.misses == 1
+
+    def test_batched_writes(self, tmp_path):
+        store = SidecarStore(batch_size=2)
+        first, second = tmp_path / 'a.metadata.json', tmp_path / 'b.metadata.json'
+        store.write(first, {'sha256': '1'})
+        assert not first.exists()
+        assert store.read(first) == {'sha256': '1'}
+        store.write(second, {'sha256': '2'})
+        assert json.loads(first.read_text(encoding='utf-8')) == {'sha256': '1'}
+        assert json.loads(second.read_text(encoding='utf-8')) == {'sha256': '2'}
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['a.metadata.json', 'b.metadata.json']
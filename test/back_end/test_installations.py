@@ -0,0 +1,57 @@
+from backend.db.repository import repo
+from backend.db.tables import Model, Component
+from backend.model.object_types import ComponentFileType, SizeGroup
+
+
+def scanned(scan_id: str, installation: str, active_dir: str) -> Model:
+    components = [Component(file_name='m.safetensors', file_dir=active_dir, component_type=ComponentFileType.MODEL,
+                            is_archive=False, file_size=10, installation=installation, last_scan_id=scan_id),
+                  Component(file_name='m.safetensors', file_dir='/archive/loras', component_type=ComponentFileType.MODEL,
+                            is_archive=True, file_size=10, installation='', last_scan_id=scan_id)]
+    return Model(hash='h', name='m', type='loras', relative_path='.', active_type_dir=active_dir,
+                 archive_type_dir='/archive/loras', is_active=True, is_archived=True, last_scan_id=scan_id,
+                 components=components)
+
+
+class TestInstallations:
+    def test_shared_model(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+        repo.save_model(scanned('a1', 'default', '/a/loras'), [])
+        repo.save_model(scanned('b1', 'b', '/b/loras'), [], installation='b')
+        model = repo.get_models_by_hash(['h'])[0]
+        assert model.active_type_dir == '/a/loras'
+        assert sorted(c.installation for c in model.components) == ['', 'b', 'default']
+        assert [m.hash for m in repo.get_installation_models('b')] == ['h']
+
+        # b no longer has the model, nor does the archive: only the default installation's copy is left
+        repo.clean_repository('b2', workflows=False, installation='b')
+        model = repo.get_models_by_hash(['h'])[0]
+        assert [c.installation for c in model.components] == ['default']
+        assert model.is_active and not model.is_archived
+        assert repo.get_installation_models('b') == []
+
+        repo.clean_repository('a2', workflows=False)
+        assert repo.get_models_by_hash(['h']) == []
+
+    def test_usage_per_installation(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+        repo.save_model(scanned('b1', 'b', '/b/loras'), [], installation='b')
+        # active only in b: it neither uses the default installation's budget nor can be archived from there
+        assert repo.get_active_usage() == {}
+        assert list(repo.iter_least_recently_used()) == []
+        assert repo.get_active_usage('b') == {'loras': 10}
+        assert list(repo.iter_least_recently_used('b')) == [('h', 'loras', 10)]
+
+    def test_sizes_per_root(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+        repo.save_model(scanned('a1', 'default', '/a/models/loras'), [])
+        repo.save_model(scanned('b1', 'b', '/b/models/loras'), [], installation='b')
+        vae = Component(file_name='v.safetensors', file_dir='/a/models/vae/sub', component_type=ComponentFileType.MODEL,
+                        is_archive=False, file_size=5, installation='default', last_scan_id='a1')
+        repo.save_model(Model(hash='v', name='v', type='vae', relative_path='sub', active_type_dir='/a/models/vae',
+                              archive_type_dir='/archive/vae', is_active=True, is_archived=False, last_scan_id='a1',
+                              components=[vae]), [])
+        # one total per root, whatever the type folders below it; the shared model counts in each installation
+        sizes = repo.get_sizes(SizeGroup.ROOT, {'default': ['/a/models'], 'b': ['/b/models'], '': ['/archive']})
+        assert sorted((s['installation'], s['key'], s['active'], s['archived']) for s in sizes) == [
+            ('', '/archive', 0, 10), ('b', '/b/models', 10, 0), ('default', '/a/models', 15, 0)]
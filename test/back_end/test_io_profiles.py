@@ -0,0 +1,56 @@
+import os
+import threading
+import pytest
+from backend.model.io_profiles import IOProfiles, PROFILES
+from backend.model.object_types import ArchivistException
+from backend.model.file_handler import compute_digests
+from backend.model.model_headers import read_header
+from backend.model.duplicates import partial_hash
+
+
+class TestIOProfiles:
+    def test_configured_profile(self, tmp_path):
+        profiles = IOProfiles()
+        profiles.configure({tmp_path: 'hdd'})
+        assert profiles.for_path(tmp_path / 'not' / 'there.safetensors') == PROFILES['hdd']
+        assert profiles.describe()[0]['source'] == 'config'
+        with pytest.raises(ArchivistException):
+            profiles.configure({tmp_path: 'floppy'})
+
+    def test_inode_order(self, tmp_path):
+        profiles = IOProfiles()
+        profiles.configure({tmp_path: 'hdd'})
+        files = [tmp_path / name for name in ('c', 'a', 'b')]
+        for f in files:
+            f.write_bytes(b'')
+        listing = [(f.name, f.stat().st_ino) for f in reversed(files)]
+        assert profiles.order(tmp_path, listing) == sorted(listing, key=lambda f: f[1])
+        profiles.configure({tmp_path: 'ssd'})
+        assert profiles.order(tmp_path, listing) == listing
+
+    def test_limit(self, tmp_path):
+        profiles = IOProfiles()
+        profiles.configure({tmp_path: 'hdd'})
+        inside = threading.Event()
+
+        def read():
+            with profiles.limit(tmp_path):
+                inside.set()
+
+        with profiles.limit(tmp_path, tmp_path / 'x'):
+            worker = threading.Thread(target=read)
+            worker.start()
+            worker.join(0.1)
+            assert not inside.is_set()
+        worker.join(1)
+        assert inside.is_set()
+
+    def test_reads_keep_access_time(self, tmp_path):
+        path = tmp_path / 'a.safetensors'
+        path.write_bytes(b'x' * 100)
+        # an access time older than the mtime, which even relatime updates on the next read
+        os.utime(path, ns=(10 ** 18, path.stat().st_mtime_ns))
+        compute_digests(path)
+        read_header(path)
+        partial_hash(path, 100)
+        assert path.stat().st_atime_ns == 10 ** 18
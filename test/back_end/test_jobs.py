@@ -0,0 +1,27 @@
+import time
+from backend.model.jobs import JobRunner
+
+
+def wait(runner: JobRunner, job_id: str) -> dict:
+    for _ in range(100):
+        job = runner.get(job_id)
+        if job['finished']:
+            return job
+        time.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+class TestJobs:
+    def test_result_and_failure(self):
+        runner = JobRunner(max_workers=1)
+        done = wait(runner, runner.submit('add', lambda a, b: a + b, 1, 2))
+        assert done['status'] == 'done' and done['result'] == 3
+        failed = wait(runner, runner.submit('fail', lambda: 1 / 0))
+        assert failed['status'] == 'failed' and 'division' in failed['error']
+
+    def test_forget_old(self):
+        runner = JobRunner(max_workers=1, keep=2)
+        ids = [runner.submit('noop', lambda: None) for _ in range(3)]
+        wait(runner, ids[-1])
+        runner.submit('noop', lambda: None)
+        assert ids[0] not in {job['id'] for job in runner.list()}
@@ -0,0 +1,12 @@
+from benchmark.library import LibrarySpec, generate_library
+
+
+class TestLibrary:
+    def test_generate(self, tmp_path):
+        spec = LibrarySpec(models=40, model_size=1 << 20, types=['loras', 'vae'])
+        summary = generate_library(tmp_path, spec)
+        models = list(tmp_path.rglob('*.safetensors'))
+        assert len(models) == summary['models'] == 40
+        assert len(list(tmp_path.rglob('*.metadata.json'))) == summary['sidecars']
+        assert all(m.stat().st_size == 1 << 20 for m in models)
+        assert (tmp_path / 'extra_model_paths.yaml').is_file()
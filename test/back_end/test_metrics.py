@@ -0,0 +1,27 @@
+from backend.model.metrics import Metrics
+
+
+class TestMetrics:
+    def test_histogram_exposition(self):
+        registry = Metrics()
+        histogram = registry.histogram('test_seconds', 'Test timings')
+        histogram.observe(0.002, phase='walk')
+        histogram.observe(2.0, phase='walk')
+        text = registry.expose()
+        assert '# TYPE test_seconds histogram' in text
+        assert 'test_seconds_bucket{phase="walk",le="0.005"} 1' in text
+        assert 'test_seconds_bucket{phase="walk",le="+Inf"} 2' in text
+        assert 'test_seconds_count{phase="walk"} 2' in text
+
+    def test_timed_counter(self):
+        registry = Metrics()
+
+        @registry.timed('call_seconds')
+        def work():
+            registry.counter('calls_total').inc()
+            return 42
+
+        assert work() == 42
+        text = registry.expose()
+        assert 'calls_total 1' in text
+        assert 'call_seconds_count 1' in text
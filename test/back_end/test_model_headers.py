@@ -0,0 +1,47 @@
+import json
+import struct
+from backend.model.model_headers import read_header
+
+
+def gguf_string(text: str) -> bytes:
+    data = text.encode('utf-8')
+    return struct.pack('<Q', len(data)) + data
+
+
+class TestModelHeaders:
+    def test_safetensors(self, tmp_path):
+        header = {'__metadata__': {'ss_base_model_version': 'sdxl_base_v1-0'},
+                  'lora_unet_down.alpha': {'dtype': 'F32', 'shape': [], 'data_offsets': [0, 4]},
+                  'lora_unet_down.weight': {'dtype': 'F16', 'shape': [4, 8], 'data_offsets': [4, 68]}}
+        data = json.dumps(header).encode()
+        path = tmp_path / 'lora.safetensors'
+        path.write_bytes(struct.pack('<Q', len(data)) + data + b'\0' * 68)
+        assert read_header(path) == {'architecture': 'sdxl-lora', 'precision': 'F16', 'parameters': 33}
+
+    def test_safetensors_by_tensor_names(self, tmp_path):
+        header = {'model.diffusion_model.double_blocks.0.img_attn.qkv.weight': {'dtype': 'BF16', 'shape': [6, 2],
+                                                                               'data_offsets': [0, 24]}}
+        data = json.dumps(header).encode()
+        path = tmp_path / 'unet.sft'
+        path.write_bytes(struct.pack('<Q', len(data)) + data + b'\0' * 24)
+        assert read_header(path)['architecture'] == 'flux'
+
+    def test_gguf(self, tmp_path):
+        kv = (gguf_string('general.architecture') + struct.pack('<I', 8) + gguf_string('flux')
+              + gguf_string('tokenizer.scores') + struct.pack('<IIQ', 9, 6, 3) + struct.pack('<3f', 0, 1, 2)
+              + gguf_string('general.file_type') + struct.pack('<II', 4, 7))
+        tensors = (gguf_string('a') + struct.pack('<I', 2) + struct.pack('<QQ', 64, 32) + struct.pack('<IQ', 8, 0)
+                   + gguf_string('b') + struct.pack('<I', 1) + struct.pack('<Q', 64) + struct.pack('<IQ', 0, 0))
+        path = tmp_path / 'model.gguf'
+        path.write_bytes(b'GGUF' + struct.pack('<IQQ', 3, 2, 3) + kv + tensors)
+        assert read_header(path) == {'architecture': 'flux', 'precision': 'Q8_0', 'parameters': 64 * 32 + 64}
+
+    def test_unreadable(self, tmp_path):
+        path = tmp_path / 'broken.safetensors'
+        path.write_bytes(b'\xff' * 16)
+        assert read_header(path) == {}
+        assert read_header(tmp_path / 'model.ckpt') == {}
+        for header in ({'__metadata__': 'text', 'a': {'dtype': 'F16', 'shape': 'x'}}, {'a': 1}, [1]):
+            data = json.dumps(header).encode()
+            path.write_bytes(struct.pack('<Q', len(data)) + data)
+            assert read_header(path) == {}
@@ -0,0 +1,18 @@
+from backend.model.policy import select_for_archiving
+
+
+class TestPolicy:
+    def test_within_budget(self):
+        usage = {'loras': 100, 'checkpoints': 500}
+        candidates = iter([('a', 'loras', 50)])
+        assert select_for_archiving(usage, {'loras': 200}, 1000, candidates) == []
+
+    def test_type_budget(self):
+        usage = {'loras': 300, 'checkpoints': 500}
+        candidates = [('c1', 'checkpoints', 500), ('l1', 'loras', 60), ('l2', 'loras', 60), ('l3', 'loras', 60)]
+        assert select_for_archiving(usage, {'loras': 200}, 0, candidates) == ['l1', 'l2']
+
+    def test_overall_budget(self):
+        usage = {'loras': 300, 'checkpoints': 500}
+        candidates = [('l1', 'loras', 100), ('c1', 'checkpoints', 500), ('l2', 'loras', 100)]
+        assert select_for_archiving(usage, {}, 600, candidates) == ['l1', 'c1']
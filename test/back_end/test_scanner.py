@@ -0,0 +1,86 @@
+import time
+import hashlib
+from pathlib import Path
+
+import pytest
+
+import backend.config
+from backend.config import Configuration, ConfigFolders, ModelOptions, WebConfig, ConfigOptions
+from backend.db.repository import repo
+from backend.model.scanner import ScanScope, Scanner, ScanStatus
+from benchmark.library import LibrarySpec, generate_library
+
+MODELS = {'loras': {(Path('/comfy/models/loras'), Path('/archive/loras'))},
+          'vae': {(Path('/comfy/models/vae'), Path('/archive/vae'))},
+          'checkpoints': {(Path('/comfy/models/checkpoints'), Path('/archive/checkpoints'))}}
+
+
+class TestScanScope:
+    def test_full_scope(self):
+        assert len(ScanScope().tasks(MODELS)) == 3
+        assert ScanScope().is_full()
+
+    def test_types_and_priority(self):
+        tasks = ScanScope(types={'loras', 'vae'}, priority=['vae']).tasks(MODELS)
+        assert [t[0] for t in tasks] == ['vae', 'loras']
+
+    def test_paths(self):
+        scope = ScanScope(paths=[Path('/archive/loras/sdxl'), Path('/comfy/models/vae')])
+        tasks = {(t[0], t[3]) for t in scope.tasks(MODELS)}
+        assert tasks == {('loras', Path('sdxl')), ('vae', None)}
+        assert len(ScanScope(paths=[Path('/comfy')]).tasks(MODELS)) == 3
+
+    def test_round_trip(self):
+        scope = ScanScope(types={'loras'}, paths=[Path('/archive/loras')], priority=['loras'], workflows=False)
+        assert ScanScope.from_json(scope.to_json()) == scope
+
+
+def wait(scanner: Scanner, scan_id: str) -> None:
+    deadline = time.monotonic() + 30
+    while scanner.get_status(scan_id)['status'] != ScanStatus.INACTIVE:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+class TestScanRun:
+    @pytest.fixture
+    def models(self, tmp_path, monkeypatch):
+        folders = ConfigFolders(comfy=str(tmp_path), archive=str(tmp_path), database='', extra_models=[],
+                                workflows=[])
+        config = Configuration(folders=folders, models=ModelOptions(extensions=['.safetensors'], types={}),
+                               web=WebConfig(base_url='', port=0), options=ConfigOptions(scan_workers=1, scan_batch=5))
+        monkeypatch.setattr(backend.config, '_config', config)
+        library = generate_library(tmp_path / 'lib', LibrarySpec(models=20, model_size=1 << 20, types=['loras'],
+                                                                 sidecar_ratio=0, extra_ratio=0, example_ratio=0))
+        repo.attach(tmp_path / 'test_db.db')
+        return {'loras': {(Path(library['models_root']) / 'loras', Path(library['archive_root']) / 'loras')}}
+
+    def test_pause_cancel_resume(self, models):
+        scanner = Scanner()
+        scan_id = scanner.start(models, [])
+        assert scanner.pause(scan_id)
+        assert scanner.get_status(scan_id)['paused']
+        assert scanner.cancel(scan_id)
+        wait(scanner, scan_id)
+        assert repo.get_scan_run(scan_id)[0].status == ScanStatus.CANCELLED
+
+        assert scanner.start(models, [], resume_id=scan_id) == scan_id
+        wait(scanner, scan_id)
+        assert repo.get_scan_run(scan_id)[0].status == ScanStatus.CLEANUP
+        assert len(list(repo.get_models(True))) == 20
+        assert scanner.start(models, [], resume_id=scan_id) is None
+
+    def test_resume_rehashes_interrupted_file(self, models):
+        scanner = Scanner()
+        wait(scanner, scanner.start(models, []))
+        model_file = next(next(iter(models['loras']))[0].rglob('*.safetensors'))
+        # same size, new content; the sidecar still holds the old hash
+        with model_file.open('r+b') as f:
+            f.write(b'changed')
+        new_hash = hashlib.sha256(model_file.read_bytes()).hexdigest()
+
+        repo.start_scan_run('interrupted', ScanStatus.RUNNING, False, ScanScope().to_json())
+        repo.finish_scan_run('interrupted', ScanStatus.CANCELLED, [str(model_file)], keep_checkpoints=True)
+        wait(scanner, scanner.start(models, [], resume_id='interrupted'))
+        assert repo.get_models_by_hash([new_hash])
+        assert len(list(repo.get_models(True))) == 20
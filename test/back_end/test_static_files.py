@@ -0,0 +1,36 @@
+import gzip
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.server.static_files import SPAStaticFiles
+
+
+def make_client(build) -> TestClient:
+    (build / '_app' / 'immutable').mkdir(parents=True)
+    (build / 'index.html').write_text('<html></html>')
+    script = build / '_app' / 'immutable' / 'app.abc123.js'
+    script.write_text('console.log(1)')
+    (build / '_app' / 'immutable' / 'app.abc123.js.gz').write_bytes(gzip.compress(b'console.log(1)'))
+    app = FastAPI()
+    app.mount('/', app=SPAStaticFiles(directory=build, html=True), name='static')
+    return TestClient(app)
+
+
+class TestStaticFiles:
+    def test_immutable_and_precompressed(self, tmp_path):
+        client = make_client(tmp_path)
+        response = client.get('/_app/immutable/app.abc123.js', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['cache-control'] == 'public, max-age=31536000, immutable'
+        assert response.headers['content-encoding'] == 'gzip'
+        assert response.headers['content-type'].startswith('text/javascript')
+        assert response.text == 'console.log(1)'
+        plain = client.get('/_app/immutable/app.abc123.js', headers={'Accept-Encoding': 'identity'})
+        assert 'content-encoding' not in plain.headers
+
+    def test_index_revalidated(self, tmp_path):
+        client = make_client(tmp_path)
+        response = client.get('/')
+        assert response.headers['cache-control'] == 'no-cache'
+        again = client.get('/', headers={'If-None-Match': response.headers['etag']})
+        assert again.status_code == 304
+        assert client.get('/models/some-route').text == '<html></html>'
+        assert client.get('/missing.js').status_code == 404
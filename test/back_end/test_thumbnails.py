@@ -0,0 +1,37 @@
+import os
+import pytest
+from backend.model.thumbnails import ThumbnailCache
+
+
+class TestThumbnails:
+    def test_render_and_reuse(self, tmp_path):
+        image = pytest.importorskip('PIL.Image')
+        source = tmp_path / 'example.png'
+        image.new('RGB', (1000, 500), 'red').save(source)
+        cache = ThumbnailCache()
+        cache.attach(tmp_path / 'cache', [64, 256], max_bytes=1 << 20, workers=1)
+        digest = cache.register(source)
+        thumbnail = cache.get(digest, 256)
+        with image.open(thumbnail) as t:
+            assert t.size == (256, 128)
+        assert cache.path(digest, 64).is_file()
+        assert cache.get('0' * 64, 64) is None
+
+        # rendered again over the existing files, the cache does not grow
+        used = cache.used_bytes
+        cache.render(digest, source)
+        assert cache.used_bytes == used == sum(f.stat().st_size for f in (tmp_path / 'cache').glob('*/*.webp'))
+
+    def test_evict_least_recently_used(self, tmp_path):
+        cache = ThumbnailCache()
+        cache.attach(tmp_path, [64], max_bytes=250, workers=1)
+        for i, digest in enumerate(['aa' * 32, 'bb' * 32, 'cc' * 32]):
+            path = cache.path(digest, 64)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'x' * 100)
+            os.utime(path, ns=(i * 10**9, i * 10**9))
+            cache.used_bytes += 100
+        cache.evict()
+        assert not cache.path('aa' * 32, 64).exists()
+        assert cache.path('cc' * 32, 64).exists()
+        assert cache.used_bytes == 200
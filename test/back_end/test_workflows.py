@@ -0,0 +1,84 @@
+from sqlmodel import Session, select
+from backend.db.repository import repo
+from backend.db.tables import Model, Workflow, Component, Collection, WorkflowCollectionLink, WorkflowModelReference
+from backend.model.file_handler import workflow_model_references, read_workflow
+from backend.model.object_types import ComponentFileType
+import json
+
+EXTENSIONS = ['.safetensors', '.ckpt', '.gguf']
+
+
+class TestWorkflowReferences:
+    def test_loader_widgets(self):
+        data = {'nodes': [{'type': 'CheckpointLoaderSimple', 'widgets_values': ['sdxl\\base.safetensors']},
+                          {'type': 'LoraLoader', 'widgets_values': ['detail.safetensors', 0.8, 0.8]},
+                          {'type': 'KSampler', 'widgets_values': [42, 'fixed', 20, 7.0, 'euler']}]}
+        assert workflow_model_references(data, EXTENSIONS) == {'sdxl/base.safetensors': 'checkpoints',
+                                                               'detail.safetensors': 'loras'}
+
+    def test_subgraphs_and_declared_models(self):
+        data = {'nodes': [],
+                'definitions': {'subgraphs': [{'nodes': [
+                    {'widgets_values': {'unet_name': 'flux.gguf'},
+                     'properties': {'models': [{'name': 'ae.safetensors', 'directory': 'vae'}]}},
+                    {'type': 'SomeCustomNode', 'widgets_values': ['other.safetensors']}]}]}}
+        assert workflow_model_references(data, EXTENSIONS) == {'flux.gguf': 'diffusion_models',
+                                                               'ae.safetensors': 'vae', 'other.safetensors': None}
+
+    def test_not_a_workflow(self, tmp_path):
+        path = tmp_path / 'settings.json'
+        path.write_text(json.dumps({'theme': 'dark'}), encoding='utf-8')
+        assert read_workflow(path, EXTENSIONS) is None
+
+
+def workflow(scan_id: str, file_name: str) -> Workflow:
+    component = Component(file_name=file_name, file_dir='/w', component_type=ComponentFileType.WORKFLOW,
+                          is_archive=False, last_scan_id=scan_id)
+    return Workflow(id='w1', name='flow', purpose='', relative_path='.', is_archived=False, is_active=True,
+                    last_scan_id=scan_id, scan_errors='', components=[component])
+
+
+def model(hash: str, model_type: str, relative_path: str, file_name: str) -> Model:
+    component = Component(file_name=file_name, file_dir=f'/a/{model_type}/{relative_path}',
+                          component_type=ComponentFileType.MODEL, is_archive=False, last_scan_id='s1')
+    return Model(hash=hash, name=hash, type=model_type, relative_path=relative_path, active_type_dir=f'/a/{model_type}',
+                 archive_type_dir=f'/archive/{model_type}', is_active=True, is_archived=False, last_scan_id='s1',
+                 components=[component])
+
+
+class TestSaveWorkflow:
+    def test_rescan_keeps_collections(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+        repo.save_workflow(workflow('s1', 'flow.json'), ['portrait'], {'a.safetensors': None})
+        with Session(repo.engine) as session:
+            session.add(Collection(id=1, name='set', purpose='', is_active=False))
+            session.add(WorkflowCollectionLink(workflow_id='w1', collection_id=1))
+            session.commit()
+
+        repo.save_workflow(workflow('s2', 'renamed.json'), ['landscape'], {'b.safetensors': None})
+        with Session(repo.engine) as session:
+            saved = session.get(Workflow, 'w1')
+            assert saved.last_scan_id == 's2'
+            assert [c.name for c in saved.collections] == ['set']
+            assert [c.file_name for c in saved.components] == ['renamed.json']
+            assert [t.tag for t in saved.tags] == ['landscape']
+            assert session.exec(select(WorkflowModelReference.reference)).all() == ['b.safetensors']
+            assert len(session.exec(select(Component)).all()) == 1
+
+    def test_references_by_type_and_path(self, tmp_path):
+        repo.attach(tmp_path / 'test_db.db')
+        repo.save_model(model('lora', 'loras', '.', 'detail.safetensors'), [])
+        repo.save_model(model('vae', 'vae', '.', 'detail.safetensors'), [])
+        repo.save_model(model('sdxl', 'checkpoints', 'sdxl', 'base.safetensors'), [])
+        repo.save_model(model('sd15', 'checkpoints', '.', 'base.safetensors'), [])
+        repo.save_model(model('unet', 'unet', '.', 'flux.safetensors'), [])
+        repo.save_workflow(workflow('s1', 'flow.json'), [], {'detail.safetensors': 'loras',
+                                                             'sdxl/base.safetensors': 'checkpoints',
+                                                             'flux.safetensors': 'diffusion_models'})
+        repo.resolve_workflow_references()
+        assert sorted(m.hash for m in repo.get_workflow_models('w1')) == ['lora', 'sdxl', 'unet']
+
+        # without a type, the same name in two type folders matches neither
+        repo.save_workflow(workflow('s2', 'flow.json'), [], {'detail.safetensors': None})
+        repo.resolve_workflow_references()
+        assert repo.get_unresolved_references('w1') == ['detail.safetensors']